@@ -4,9 +4,33 @@
 #
 
 import streamlit as st
-from snowflake.snowpark.context import get_active_session
 import pandas as pd
+import os
+import re
+import sys
+import threading
 import time
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# Shared modules from the repository's src package (instrumentation, completion cache, batch runner, streaming)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.batch import BATCH_TABLE, BatchQBRRunner, TableStore, app_generator
+from src.completion_cache import CompletionCache
+from src.hybrid_search import HybridSearch
+from src.instrumentation import PrometheusExporter, instrumentation
+from src.portfolio import CUBE_QUERY, PortfolioCube
+from src.schema import COMPANY_SIZES, DEAL_STAGES, INDUSTRIES, QBR_QUARTERS
+from src.search_index import CompanySearchIndex
+from src.streaming import render_stream, stream_completion
+from src.validation import rules_for, validate
+from src.vector_index import build_index, embedding_matrix
+from src.warehouse import LocalWarehouse, SnowflakeWarehouse
+
+# Streaming completions need snowflake-ml-python; without it QBRs are shown once complete
+try:
+    from snowflake.cortex import Complete as CortexComplete
+except ImportError:
+    CortexComplete = None
 
 # Configuration Constants
 MODELS = [
@@ -21,12 +45,58 @@ VIEW_TYPES = ["Sales View", "Executive View", "Technical View", "Customer Succes
 
 CONTEXT_CHUNKS = [4, 6, 8, 10, 12]
 
-# Initialize Snowflake session
-try:
-    session = get_active_session()
-except:
-    st.error("Could not get active Snowflake session. Please check your connection.")
-    st.stop()
+# Query cache settings (seconds / entries)
+SYNC_CHECK_TTL = 60
+COMPANY_LIST_TTL = 3600
+COMPANY_DATA_TTL = 900
+COMPANY_DATA_MAX_ENTRIES = 5000
+CACHES = ["company_list", "company_data", "snowflake_context", "vector_index", "search_index", "portfolio_cube"]
+
+# Historical context filters: option label -> QBR_DATA column the similar accounts must share
+SIMILARITY_FILTERS = {"Same Industry": "INDUSTRY", "Same Size": "SIZE", "Same Quarter": "QBR_QUARTER"}
+
+# Portfolio tab breakdowns: label -> cube dimension
+PORTFOLIO_BREAKDOWNS = {
+    "Industry": "industry", "Size": "size", "Deal Stage": "deal_stage", "Quarter": "qbr_quarter", "Year": "qbr_year"
+}
+
+# Model of the QBR_EMBEDDINGS column (Transformation #2); search queries are embedded with it too
+EMBEDDING_MODEL = "e5-base-v2"
+
+# Completion cache table, shared by every user of the app
+COMPLETION_CACHE_TABLE = "QBR_COMPLETION_CACHE"
+COMPLETION_CACHE_TTL = 30 * 24 * 3600
+COMPLETION_CACHE_MAX_ENTRIES = 10000
+
+# Display clean-up of QBR documents and metric extraction for search results
+SPLIT_WORD_PATTERN = re.compile(r'([A-Za-z])\s*\n\s*([A-Za-z])\s*\n\s*([A-Za-z])')
+MISSING_SPACE_PATTERN = re.compile(r'\.([A-Za-z])')
+CAMEL_CASE_PATTERN = re.compile(r'([a-z])([A-Z])')
+SENTENCE_START_PATTERN = re.compile(r'\.([A-Z])')
+METRIC_PATTERNS = {
+    metric.title(): re.compile(rf"(?:the )?{metric.lower()}(?: is)? (\d+\.?\d*)")
+    for metric in ["health score", "contract value", "CSAT score", "active users"]
+}
+
+# Local dev mode: set QBR_LOCAL_DATA to a generated .csv or .parquet file to run without Snowflake
+LOCAL_DATA = os.environ.get("QBR_LOCAL_DATA")
+
+@st.cache_resource(show_spinner="Loading local QBR data...")
+def get_local_warehouse(data_path):
+    """SQLite copy of the generated data, with one connection pool shared by every rerun and session"""
+    return LocalWarehouse.from_file(data_path)
+
+# Initialize the warehouse: Snowflake through the active session, or the local database
+if LOCAL_DATA:
+    warehouse = get_local_warehouse(LOCAL_DATA)
+else:
+    try:
+        from snowflake.snowpark.context import get_active_session
+        warehouse = SnowflakeWarehouse(get_active_session())
+    except:
+        st.error("Could not get active Snowflake session. Please check your connection.")
+        st.stop()
+session = warehouse.session
 
 def build_prompt(company_data, similar_contexts, template_type, view_type):
     """Builds a prompt with RAG context using template modifications and view-specific emphasis."""
@@ -134,41 +204,233 @@ def build_prompt(company_data, similar_contexts, template_type, view_type):
 
     return prompt
 
+@st.cache_resource
+def cache_stats():
+    """Hit/miss counters of the query caches, shared by every session of this app process"""
+    return {name: {"calls": 0, "misses": 0} for name in CACHES}
+
+def record_cache_call(name):
+    cache_stats()[name]["calls"] += 1
+    instrumentation.count(f'app.cache.{name}.calls')
+
+def record_cache_miss(name):
+    cache_stats()[name]["misses"] += 1
+    instrumentation.count(f'app.cache.{name}.misses')
+
+@st.cache_data(ttl=SYNC_CHECK_TTL, show_spinner=False)
+def get_sync_marker():
+    """Last change to QBR_DATA; part of every cache key, so cached results expire when a new Fivetran sync lands"""
+    return warehouse.sync_marker()
+
+@st.cache_resource(ttl=COMPANY_LIST_TTL, max_entries=4, show_spinner=False)
+def query_company_list(sync_marker):
+    """Company names, shared (not copied) across sessions since the list only changes with a sync"""
+    record_cache_miss("company_list")
+    company_query = """
+    SELECT DISTINCT COMPANY_NAME
+    FROM QBR_DATA
+    ORDER BY COMPANY_NAME
+    """
+    with instrumentation.span('app.company_list'):
+        return tuple(warehouse.query(company_query)['COMPANY_NAME'])
+
+@st.cache_data(ttl=COMPANY_LIST_TTL, show_spinner=False)
+def query_company_segments(sync_marker):
+    """Industry and QBR period of every company, for selecting batch runs"""
+    return warehouse.query("SELECT COMPANY_NAME, INDUSTRY, QBR_QUARTER, QBR_YEAR FROM QBR_DATA")
+
+def get_company_list():
+    """Retrieve the company names for the company selector."""
+    record_cache_call("company_list")
+    return query_company_list(get_sync_marker())
+
+@st.cache_data(ttl=COMPANY_DATA_TTL, max_entries=COMPANY_DATA_MAX_ENTRIES, show_spinner=False)
+def query_company_data(company_name, sync_marker):
+    """Metrics of one company, cached per company and sync"""
+    record_cache_miss("company_data")
+    metrics_query = """
+    SELECT 
+        HEALTH_SCORE, 
+        CONTRACT_VALUE, 
+        CSAT_SCORE, 
+        ACTIVE_USERS,
+        FEATURE_ADOPTION_RATE,
+        TICKET_VOLUME,
+        RENEWAL_PROBABILITY,
+        QBR_QUARTER,
+        QBR_YEAR
+    FROM QBR_DATA
+    WHERE COMPANY_NAME = ?
+    """
+    with instrumentation.span('app.get_company_data'):
+        return warehouse.query(metrics_query, [company_name])
+
 def get_company_data(company_name):
     """Retrieve company data from Snowflake."""
+    record_cache_call("company_data")
     try:
-        metrics_query = """
-        SELECT 
-            HEALTH_SCORE, 
-            CONTRACT_VALUE, 
-            CSAT_SCORE, 
-            ACTIVE_USERS,
-            FEATURE_ADOPTION_RATE,
-            TICKET_VOLUME,
-            RENEWAL_PROBABILITY,
+        return query_company_data(company_name, get_sync_marker())
+    except Exception as e:
+        instrumentation.count('app.errors')
+        st.error(f"Error retrieving company data: {str(e)}")
+        return None
+
+@st.cache_data(ttl=COMPANY_LIST_TTL, show_spinner=False)
+def get_snowflake_context():
+    """Current database and schema, which do not change during the app's lifetime"""
+    record_cache_miss("snowflake_context")
+    return warehouse.context()
+
+@st.cache_resource(ttl=COMPANY_LIST_TTL, max_entries=2, show_spinner=False)
+def get_vector_index(sync_marker):
+    """In-memory index over the QBR_DATA_VECTORS embeddings, built once per sync and shared by every session"""
+    record_cache_miss("vector_index")
+    vectors_query = """
+    SELECT
+        v.COMPANY_NAME,
+        v.QBR_INFORMATION,
+        v.QBR_EMBEDDINGS,
+        d.INDUSTRY,
+        d.SIZE,
+        d.QBR_QUARTER
+    FROM QBR_DATA_VECTORS v
+    JOIN (
+        -- One row per company, its latest QBR, so accounts with several QBR_DATA rows do not fan out
+        SELECT
+            COMPANY_NAME,
+            INDUSTRY,
+            SIZE,
             QBR_QUARTER,
-            QBR_YEAR
+            ROW_NUMBER() OVER (
+                PARTITION BY COMPANY_NAME ORDER BY QBR_YEAR DESC, QBR_QUARTER DESC, CONTRACT_START_DATE DESC
+            ) AS RECENCY
         FROM QBR_DATA
-        WHERE COMPANY_NAME = ?
-        """
-        return session.sql(metrics_query, params=[company_name]).to_pandas()
+    ) d ON d.COMPANY_NAME = v.COMPANY_NAME AND d.RECENCY = 1
+    """
+    with instrumentation.span('app.vector_index.build'):
+        vectors = warehouse.query(vectors_query)
+        index = build_index(
+            list(vectors['COMPANY_NAME']),
+            embedding_matrix(vectors['QBR_EMBEDDINGS']),
+            {column: vectors[column] for column in SIMILARITY_FILTERS.values()}
+        )
+    return index, dict(zip(vectors['COMPANY_NAME'], vectors['QBR_INFORMATION']))
+
+def get_similar_contexts(company_name, top_k, same=()):
+    """QBR documents of the top_k accounts closest to company_name by embedding, optionally sharing its segments"""
+    record_cache_call("vector_index")
+    try:
+        index, documents = get_vector_index(get_sync_marker())
+        if company_name not in index.positions:
+            return None
+        row = index.positions[company_name]
+        filters = {SIMILARITY_FILTERS[label]: index.metadata[SIMILARITY_FILTERS[label]][row] for label in same}
+        with instrumentation.span('app.similar_contexts'):
+            neighbours = index.search(index.vector(company_name), top_k, filters=filters, exclude=[company_name])
     except Exception as e:
-        st.error(f"Error retrieving company data: {str(e)}")
+        instrumentation.count('app.errors')
+        st.error(f"Error retrieving historical context: {str(e)}")
+        return None
+    return '\n\n'.join(
+        f"Similar account {name} (similarity {score:.2f}): {documents[name]}" for name, score in neighbours
+    ) or None
+
+def invalidate_caches():
+    """Drop every cached query result, e.g. right after a Fivetran sync"""
+    for cached in (
+        get_sync_marker, query_company_list, query_company_data, get_snowflake_context, get_vector_index,
+        get_search_index, get_hybrid_search, get_portfolio_cube
+    ):
+        cached.clear()
+
+def cache_panel():
+    """Settings panel with the hit rates of the query caches and a manual invalidation button"""
+    stats = pd.DataFrame.from_dict(cache_stats(), orient="index")
+    stats["hits"] = stats["calls"] - stats["misses"]
+    stats["hit_rate"] = (stats["hits"] / stats["calls"].where(stats["calls"] > 0)).fillna(0).round(3)
+    st.dataframe(stats[["calls", "hits", "misses", "hit_rate"]])
+    st.caption(f"Last QBR_DATA sync: {get_sync_marker() or 'unknown'}")
+    if st.button("Clear Cached Data", help="Re-query Snowflake on the next interaction, e.g. after a Fivetran sync"):
+        invalidate_caches()
+        st.success("Cached query results cleared")
+
+@st.cache_resource
+def get_completion_cache():
+    """Table-backed cache of Cortex completions, or None when the table cannot be created"""
+    try:
+        return CompletionCache(
+            warehouse,
+            table=COMPLETION_CACHE_TABLE,
+            ttl=COMPLETION_CACHE_TTL,
+            max_entries=COMPLETION_CACHE_MAX_ENTRIES
+        )
+    except Exception as e:
+        st.warning(f"Completion cache unavailable: {str(e)}")
         return None
 
-def generate_qbr_content(company_data, similar_contexts, template_type, view_type, selected_model):
-    """Generate QBR content using Snowflake Cortex."""
+def cortex_complete(model, prompt):
+    """Run SNOWFLAKE.CORTEX.COMPLETE for one prompt."""
+    with instrumentation.span('app.cortex_complete', model=model):
+        return warehouse.complete(model, prompt)
+
+def completion_cache_panel():
+    """Settings panel with the size and hit counts of the completion cache"""
+    completion_cache = get_completion_cache()
+    if completion_cache is None:
+        st.info("Completion cache unavailable")
+        return
+    stats = completion_cache.stats()
+    cols = st.columns(4)
+    for col, (label, value) in zip(cols, [
+        ("Cached QBRs", f"{stats['entries']:,}"),
+        ("Stored", f"{stats['bytes'] / 2 ** 20:,.1f} MB"),
+        ("Hits", f"{stats['hits']:,}"),
+        ("Misses", f"{stats['misses']:,}")
+    ]):
+        with col:
+            st.metric(label, value)
+    if st.button("Clear Completion Cache"):
+        completion_cache.clear()
+        st.success("Completion cache cleared")
+
+def cortex_stream(model, prompt):
+    """Yield the completion in chunks as Cortex generates it."""
+    with instrumentation.span('app.cortex_stream', model=model):
+        yield from CortexComplete(model, prompt, session=session, stream=True)
+
+def generate_qbr_content(company_data, similar_contexts, template_type, view_type, selected_model, use_cache=True,
+                         complete=None, placeholder=None):
+    """Generate QBR content using Snowflake Cortex, reusing the cached completion of an identical prompt.
+
+    complete(model, prompt) replaces the direct Cortex call, e.g. with the rate-limited one of a batch run.
+    With a placeholder the completion is streamed into it as it is generated.
+    """
+    complete = complete or cortex_complete
+    if placeholder is not None:
+        blocking_complete = complete
+        complete = lambda model, prompt: render_stream(
+            stream_completion(model, prompt, cortex_stream if CortexComplete and session is not None else None, blocking_complete),
+            placeholder
+        )
     try:
-        prompt = build_prompt(company_data, similar_contexts, template_type, view_type)
-        cortex_query = """
-        SELECT SNOWFLAKE.CORTEX.COMPLETE(
-            ?,
-            ?
-        ) as response
-        """
-        response = session.sql(cortex_query, params=[selected_model, prompt]).collect()[0][0]
+        with instrumentation.span('app.build_prompt', template=template_type, view=view_type):
+            prompt = build_prompt(company_data, similar_contexts, template_type, view_type)
+        instrumentation.count('app.prompt_chars', len(prompt))
+        
+        completion_cache = get_completion_cache()
+        if completion_cache is None:
+            response, cached = complete(selected_model, prompt), False
+        else:
+            response, cached = completion_cache.get_or_complete(
+                selected_model, prompt, complete, bypass=not use_cache
+            )
+        if cached:
+            st.caption("Returned from the completion cache")
+        else:
+            instrumentation.count('app.qbrs_generated')
         return response
     except Exception as e:
+        instrumentation.count('app.errors')
         st.error(f"Error generating QBR content: {str(e)}")
         return None
 
@@ -204,53 +466,155 @@ def display_metrics_dashboard(metrics_df):
             delta=None
         )
 
-import streamlit as st
+def validate_company_data(company_data):
+    """Check the fetched company row against the validation rules its columns allow; True when it passes"""
+    rules = rules_for(company_data.columns)
+    report = validate(company_data, rules)
+    if report.ok:
+        st.success(f"Data validation passed ({len(rules)} checks)")
+        return True
+    st.warning(
+        "Data validation found issues; the QBR is generated from this data as is:\n\n" +
+        "\n".join(f"- {rule.description}: {report.samples[rule.name][0]}" for rule in report.failed())
+    )
+    return False
+
+def performance_panel():
+    """Settings panel with the span timings, counters and memory samples of this app process"""
+    enabled = st.checkbox(
+        "Enable instrumentation",
+        value=instrumentation.enabled,
+        help="Time the company list query, data retrieval, prompt building and Cortex calls"
+    )
+    if enabled and not instrumentation.enabled:
+        instrumentation.enable(PrometheusExporter())
+    elif not enabled and instrumentation.enabled:
+        instrumentation.disable()
+    if not instrumentation.enabled:
+        st.info("Instrumentation is disabled")
+        return
+    
+    summary = instrumentation.summary()
+    if summary:
+        st.dataframe(pd.DataFrame(summary)[['name', 'count', 'errors', 'total_seconds', 'mean_seconds', 'max_seconds']])
+    else:
+        st.info("No timings recorded yet")
+    
+    values = {**instrumentation.counters, **{f"{name} peak RSS (MB)": peak for name, peak in instrumentation.memory.items()}}
+    if values:
+        cols = st.columns(len(values))
+        for col, (name, value) in zip(cols, values.items()):
+            with col:
+                st.metric(name, f"{value:,}")
+    
+    for exporter in instrumentation.exporters:
+        if isinstance(exporter, PrometheusExporter):
+            with st.expander("Prometheus metrics"):
+                st.code(exporter.render(), language="text")
+    
+    if st.button("Reset Timings"):
+        instrumentation.reset()
+
+def batch_panel(template_type, view_type, selected_model, use_cache):
+    """Admin tab generating the QBRs of every company in a quarter or segment into the QBR_BATCH_QBRS table"""
+    st.write("Generate the QBRs of every matching company with the template, view and model selected in the sidebar. "
+             "Finished QBRs are saved as they complete; running the same batch again resumes where it stopped.")
+    
+    companies = query_company_segments(get_sync_marker())
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        quarters = st.multiselect("QBR Quarter", sorted(companies['QBR_QUARTER'].unique()))
+    with col2:
+        years = st.multiselect("QBR Year", sorted(companies['QBR_YEAR'].unique()))
+    with col3:
+        industries = st.multiselect("Industry", sorted(companies['INDUSTRY'].unique()))
+    col1, col2 = st.columns(2)
+    with col1:
+        workers = st.number_input("Concurrent QBRs", min_value=1, max_value=64, value=8)
+    with col2:
+        requests_per_minute = st.number_input("Cortex Calls per Minute", min_value=1, max_value=6000, value=120)
+    
+    selected = companies
+    for column, values in [('QBR_QUARTER', quarters), ('QBR_YEAR', years), ('INDUSTRY', industries)]:
+        if values:
+            selected = selected[selected[column].isin(values)]
+    selected = sorted(selected['COMPANY_NAME'])
+    st.write(f"**{len(selected):,}** companies selected")
+    if not selected or not st.button("Run Batch"):
+        return
+    
+    run_id = "-".join([template_type, view_type, selected_model] + [",".join(map(str, values)) for values in (quarters, years, industries)])
+    # Worker threads share this run's script context, so the cached queries and st.* calls they make reach the page
+    context = get_script_run_ctx()
+    runner = BatchQBRRunner(
+        app_generator(get_company_data, generate_qbr_content, template_type, view_type, selected_model, use_cache=use_cache),
+        TableStore(warehouse, run_id),
+        workers=int(workers),
+        requests_per_minute=requests_per_minute,
+        metadata={'template': template_type, 'view_type': view_type, 'model': selected_model},
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), context)
+    )
+    progress_bar = st.progress(0.0)
+    status = st.empty()
+    
+    def progress(stats):
+        finished = stats['skipped'] + stats['succeeded'] + stats['failed']
+        progress_bar.progress(finished / stats['total'])
+        status.write(f"{finished:,}/{stats['total']:,} QBRs, {stats['failed']:,} failed, "
+                     f"{stats['qbrs_per_hour']:,.0f} QBRs/hour")
+    
+    stats = runner.run(selected, cortex_complete, progress)
+    st.success(f"{stats['succeeded']:,} QBRs generated, {stats['skipped']:,} already done, {stats['failed']:,} failed. "
+               f"Results are in {BATCH_TABLE} (RUN_ID '{run_id}').")
+
+@st.cache_resource(ttl=COMPANY_LIST_TTL, max_entries=2, show_spinner=False)
+def get_search_index(sync_marker):
+    """Name and document search index over QBR_DATA_VECTORS, rebuilt once per sync and shared by every session"""
+    record_cache_miss("search_index")
+    documents_query = """
+    SELECT
+        COMPANY_NAME,
+        QBR_INFORMATION
+    FROM QBR_DATA_VECTORS
+    """
+    with instrumentation.span('app.search_index.build'):
+        documents = warehouse.query(documents_query)
+        return CompanySearchIndex(documents['COMPANY_NAME'], documents['QBR_INFORMATION'])
+
+@st.cache_resource(ttl=COMPANY_LIST_TTL, max_entries=2, show_spinner=False)
+def get_hybrid_search(sync_marker):
+    """Hybrid retrieval over the search and vector indexes of one sync, with its own query and result caches"""
+    index, _ = get_vector_index(sync_marker)
+    return HybridSearch(get_search_index(sync_marker), index, warehouse.embedder(EMBEDDING_MODEL))
+
+def search_similar_companies(query, top_k=3, model="claude-3-5-sonnet", use_llm=False, filters=None):
+    """Search companies by (fuzzy) name, QBR content and meaning; ask Cortex only when use_llm is set and nothing matches.
 
-def search_similar_companies(query, top_k=3, model="claude-3-5-sonnet"):
-    """Search for similar companies with improved accuracy and formatting."""
+    filters maps INDUSTRY, SIZE or QBR_QUARTER to the accepted values.
+    """
+    instrumentation.count('app.searches')
+    record_cache_call("search_index")
+    record_cache_call("vector_index")
     try:
-        # Direct SQL approach for exact name matching - this will be more accurate for exact searches
-        exact_match_query = """
-        SELECT 
-            COMPANY_NAME,
-            QBR_INFORMATION
-        FROM QBR_DATA_VECTORS
-        WHERE LOWER(COMPANY_NAME) LIKE LOWER(?)
-        LIMIT ?
-        """
+        sync_marker = get_sync_marker()
+        with instrumentation.span('app.search'):
+            _, documents = get_vector_index(sync_marker)
+            results = [
+                (company_name, documents[company_name], sources)
+                for company_name, _, sources in get_hybrid_search(sync_marker).search(query, top_k, filters)
+            ]
         
-        # Try with wildcards for partial matching
-        exact_results = session.sql(exact_match_query, params=[f"%{query}%", top_k]).to_pandas()
-        
-        # If no exact match, fall back to content search
-        if exact_results.empty:
-            content_query = """
-            SELECT 
-                COMPANY_NAME,
-                QBR_INFORMATION
-            FROM QBR_DATA_VECTORS
-            WHERE CONTAINS(QBR_INFORMATION, ?)
-            LIMIT ?
-            """
-            results = session.sql(content_query, params=[query, top_k]).to_pandas()
-        else:
-            results = exact_results
-        
-        if results.empty:
-            # If still no results, use Cortex as a last resort
+        if not results:
+            if not use_llm:
+                return None
+            
+            # Only on request, since Cortex answers from the prompt rather than the data
             search_prompt = f"""
             Based on the search query "{query}", search through a database of companies.
             Return information about companies that match this query.
             """
             
-            cortex_query = """
-            SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                ?,
-                ?
-            ) as response
-            """
-            
-            response = session.sql(cortex_query, params=[model, search_prompt]).collect()[0][0]
+            response = warehouse.complete(model, search_prompt)
             
             if not response:
                 return None
@@ -259,15 +623,12 @@ def search_similar_companies(query, top_k=3, model="claude-3-5-sonnet"):
         
         # Format the results with clean formatting
         formatted_results = []
-        for _, row in results.iterrows():
+        for company_name, clean_info, _ in results:
             # Clean up the QBR information - replace any strange character sequences
-            clean_info = row['QBR_INFORMATION']
-            # Remove any strange sequences of single characters
-            import re
-            clean_info = re.sub(r'([A-Za-z])\s*\n\s*([A-Za-z])\s*\n\s*([A-Za-z])', r'\1\2\3', clean_info)
-            clean_info = re.sub(r'\.([A-Za-z])', r'. \1', clean_info)  # Add space after periods
+            clean_info = SPLIT_WORD_PATTERN.sub(r'\1\2\3', clean_info)
+            clean_info = MISSING_SPACE_PATTERN.sub(r'. \1', clean_info)  # Add space after periods
             
-            formatted_results.append(f"**Company:** {row['COMPANY_NAME']}\n\n{clean_info}")
+            formatted_results.append(f"**Company:** {company_name}\n\n{clean_info}")
         
         return '\n\n---\n\n'.join(formatted_results)
         
@@ -275,6 +636,69 @@ def search_similar_companies(query, top_k=3, model="claude-3-5-sonnet"):
         st.error(f"Error during search: {str(e)}")
         return None
 
+@st.cache_resource(ttl=COMPANY_LIST_TTL, max_entries=2, show_spinner=False)
+def get_portfolio_cube(sync_marker):
+    """Portfolio rollup cube, aggregated by the warehouse once per sync and sliced in memory by every session"""
+    record_cache_miss("portfolio_cube")
+    with instrumentation.span('app.portfolio_cube.build'):
+        return PortfolioCube.from_aggregates(warehouse.query(CUBE_QUERY))
+
+def portfolio_panel():
+    """Manager view of the whole portfolio, sliced by industry, size, deal stage and fiscal quarter"""
+    record_cache_call("portfolio_cube")
+    try:
+        cube = get_portfolio_cube(get_sync_marker())
+    except Exception as e:
+        instrumentation.count('app.errors')
+        st.error(f"Error building the portfolio rollup: {str(e)}")
+        return
+    if not len(cube):
+        st.info("No QBR data available")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        industries = st.multiselect("Industry", INDUSTRIES, key="portfolio_industries")
+    with col2:
+        sizes = st.multiselect("Size", COMPANY_SIZES, key="portfolio_sizes")
+    with col3:
+        deal_stages = st.multiselect("Deal Stage", DEAL_STAGES, key="portfolio_deal_stages")
+    with col4:
+        quarters = st.multiselect("Quarter", QBR_QUARTERS, key="portfolio_quarters")
+    first_year, last_year = int(cube.years[0]), int(cube.years[-1])
+    years = st.slider("QBR Years", first_year, last_year, (first_year, last_year)) if first_year < last_year else (first_year, last_year)
+    breakdown = st.multiselect("Break Down By", list(PORTFOLIO_BREAKDOWNS), default=["Industry"])
+    
+    # An empty selection means every member
+    filters = {
+        "industry": industries or None, "size": sizes or None, "deal_stage": deal_stages or None,
+        "qbr_quarter": quarters or None, "qbr_year": tuple(years)
+    }
+    with instrumentation.span('app.portfolio'):
+        totals = cube.query(filters)
+        by = [PORTFOLIO_BREAKDOWNS[label] for label in breakdown]
+        rollup = cube.query(filters, by) if by else None
+    if totals.empty:
+        st.info("No accounts match the selection")
+        return
+    
+    totals = totals.iloc[0]
+    cols = st.columns(5)
+    for col, (label, value) in zip(cols, [
+        ("Accounts", f"{int(totals['accounts']):,}"),
+        ("Avg Health Score", f"{totals['avg_health_score']:.1f}"),
+        ("Total Contract Value", f"${totals['total_contract_value']:,.0f}"),
+        ("Upsell Opportunity", f"${totals['total_upsell_opportunity']:,.0f}"),
+        ("At Risk", f"{int(totals['at_risk_accounts']):,}")
+    ]):
+        with col:
+            st.metric(label, value)
+    
+    if rollup is not None:
+        st.dataframe(rollup, hide_index=True)
+        if len(by) == 1:
+            st.bar_chart(rollup.set_index(by[0])["total_contract_value"])
+
 def main():
     st.set_page_config(layout="wide", page_title="Enterprise QBR Generator")
     
@@ -298,15 +722,9 @@ def main():
         st.subheader("Business Settings")
         
         # Company Selection
-        company_query = """
-        SELECT DISTINCT COMPANY_NAME
-        FROM QBR_DATA
-        ORDER BY COMPANY_NAME
-        """
-        companies_df = session.sql(company_query).to_pandas()
         selected_company = st.selectbox(
             "Select Company",
-            options=[""] + companies_df['COMPANY_NAME'].tolist(),
+            options=("",) + get_company_list(),
             help="Type to search for a specific company"
         )
         
@@ -345,9 +763,27 @@ def main():
                 help="Use similar QBRs for enhanced insights"
             )
             
+            similarity_filters = st.multiselect(
+                "Historical Context From",
+                list(SIMILARITY_FILTERS),
+                help="Only use similar accounts that share these attributes with the selected company"
+            )
+            
+            stream_output = st.checkbox(
+                "Stream QBR Output",
+                value=True,
+                help="Show the QBR section by section as it is generated"
+            )
+            
+            use_completion_cache = st.checkbox(
+                "Reuse Cached QBRs",
+                value=True,
+                help="Return the stored QBR when company data, template, view and model are unchanged"
+            )
+            
             include_validation = st.checkbox(
                 "Enable Data Validation",
-                help="Add validation steps to the QBR process"
+                help="Check the company's data against the generator's value ranges before generating the QBR"
             )
 
         # Add spacing before branding text
@@ -377,7 +813,7 @@ def main():
         )
     
     # Main Content Area
-    tabs = st.tabs(["QBR Generation", "Historical QBRs", "Settings"])
+    tabs = st.tabs(["QBR Generation", "Portfolio", "Historical QBRs", "Batch QBRs", "Settings"])
     
     with tabs[0]:
         if selected_company:
@@ -388,28 +824,40 @@ def main():
                 
                 # QBR Generation Button
                 if st.button("Generate QBR"):
+                    if include_validation:
+                        validate_company_data(company_data)
                     with st.spinner("Generating QBR..."):
                         # Get similar contexts if enabled
                         similar_contexts = None
                         if use_historical:
                             similar_contexts = get_similar_contexts(
                                 selected_company,
-                                selected_chunks
+                                selected_chunks,
+                                similarity_filters
                             )
                         
-                        # Generate QBR content
+                        # Generate QBR content, rendered into the page as it streams in
+                        qbr_header = st.empty()
+                        qbr_placeholder = st.empty()
+                        if stream_output:
+                            qbr_header.header(f"Quarterly Business Review: {selected_company}")
                         qbr_content = generate_qbr_content(
                             company_data,
                             similar_contexts,
                             template_type,
                             view_type,
-                            selected_model
+                            selected_model,
+                            use_cache=use_completion_cache,
+                            placeholder=qbr_placeholder if stream_output else None
                         )
                         
-                        if qbr_content:
+                        instrumentation.sample_memory('app')
+                        if not qbr_content:
+                            qbr_header.empty()
+                        else:
                             # Display generated QBR
-                            st.header(f"Quarterly Business Review: {selected_company}")
-                            st.write(qbr_content)
+                            qbr_header.header(f"Quarterly Business Review: {selected_company}")
+                            qbr_placeholder.markdown(qbr_content)
                             
                             # Add download button
                             st.download_button(
@@ -429,6 +877,9 @@ def main():
                             })
     
     with tabs[1]:
+        portfolio_panel()
+    
+    with tabs[2]:
         if st.session_state.qbr_history:
             for qbr in reversed(st.session_state.qbr_history):
                 with st.expander(f"{qbr['company']} - {qbr['date'].strftime('%Y-%m-%d %H:%M')}"):
@@ -436,17 +887,18 @@ def main():
         else:
             st.info("No QBR history available")
     
-    with tabs[2]:
+    with tabs[3]:
+        batch_panel(template_type, view_type, selected_model, use_completion_cache)
+    
+    with tabs[4]:
         st.write("QBR Generation Settings")
         
         st.subheader("Snowflake Settings")
         # Get current session information
         try:
             # Get the current context information
-            context_query = "SELECT CURRENT_DATABASE(), CURRENT_SCHEMA()"
-            context_result = session.sql(context_query).collect()
-            current_db = context_result[0][0] if context_result else "Not available"
-            current_schema = context_result[0][1] if context_result else "Not available"
+            record_cache_call("snowflake_context")
+            current_db, current_schema = get_snowflake_context()
             
             st.write(f"**Database:** {current_db}")
             st.write(f"**Schema:** {current_schema}")
@@ -454,13 +906,36 @@ def main():
         except Exception as e:
             st.error(f"Error retrieving Snowflake context: {str(e)}")
         
+        st.subheader("Query Cache")
+        cache_panel()
+        
+        st.subheader("Completion Cache")
+        completion_cache_panel()
+        
+        st.subheader("Performance")
+        performance_panel()
+        
         # Add test search box
         st.subheader("Test Semantic Search")
         test_query = st.text_input("Enter a search query to test semantic search", 
                               placeholder="E.g., capital forge, factory focus, kohlleffel inc")
+        filter_columns = st.columns(3)
+        with filter_columns[0]:
+            search_industries = st.multiselect("Industry", INDUSTRIES, key="search_industries")
+        with filter_columns[1]:
+            search_sizes = st.multiselect("Size", COMPANY_SIZES, key="search_sizes")
+        with filter_columns[2]:
+            search_quarters = st.multiselect("Quarter", QBR_QUARTERS, key="search_quarters")
+        use_llm_search = st.checkbox(
+            "Ask Cortex when nothing matches",
+            help="Falls back to an LLM answer, which is not grounded in the QBR data"
+        )
         if test_query and st.button("Search"):
             with st.spinner("Searching similar companies..."):
-                similar_companies = search_similar_companies(test_query, top_k=3, model=selected_model)
+                similar_companies = search_similar_companies(
+                    test_query, top_k=3, model=selected_model, use_llm=use_llm_search,
+                    filters={"INDUSTRY": search_industries, "SIZE": search_sizes, "QBR_QUARTER": search_quarters}
+                )
                 if similar_companies:
                     st.success(f"Found companies matching '{test_query}'")
                     companies_list = similar_companies.split('\n\n---\n\n')
@@ -472,18 +947,17 @@ def main():
                         company_details = parts[1] if len(parts) > 1 else company
                         
                         # Clean up formatting issues
-                        import re
-                        company_details = re.sub(r'([a-z])([A-Z])', r'\1 \2', company_details)  # Add space between lowercase followed by uppercase
-                        company_details = re.sub(r'\.([A-Z])', r'. \1', company_details)  # Add space after period followed by uppercase
+                        company_details = CAMEL_CASE_PATTERN.sub(r'\1 \2', company_details)  # Add space between lowercase followed by uppercase
+                        company_details = SENTENCE_START_PATTERN.sub(r'. \1', company_details)  # Add space after period followed by uppercase
                         
                         # Extract key metrics for better display
                         metrics = {}
                         # Try to extract commonly used metrics
-                        for metric in ["health score", "contract value", "CSAT score", "active users"]:
-                            pattern = rf"(?:the )?{metric}(?: is)? (\d+\.?\d*)"
-                            match = re.search(pattern, company_details.lower())
+                        lowered_details = company_details.lower()
+                        for metric, pattern in METRIC_PATTERNS.items():
+                            match = pattern.search(lowered_details)
                             if match:
-                                metrics[metric.title()] = match.group(1)
+                                metrics[metric] = match.group(1)
                         
                         # Create an expander for each company
                         with st.expander(f"Company: {company_name}"):
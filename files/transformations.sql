@@ -50,6 +50,18 @@ CREATE OR REPLACE TABLE QBR_DATA_SINGLE_STRING AS
             snowflake.cortex.EMBED_TEXT_768('e5-base-v2', qbr_information) as QBR_EMBEDDINGS 
             FROM qbr_data_single_string;
 
+/** Transformation #2 (incremental) - For refreshes after the first run: only embeds new documents and documents whose text changed, and drops removed accounts **/
+      MERGE INTO qbr_data_vectors v
+            USING qbr_data_single_string s
+            ON v.company_name = s.company_name
+            WHEN MATCHED AND v.qbr_information <> s.qbr_information THEN UPDATE SET
+                qbr_information = s.qbr_information,
+                QBR_EMBEDDINGS = snowflake.cortex.EMBED_TEXT_768('e5-base-v2', s.qbr_information)
+            WHEN NOT MATCHED THEN INSERT (company_name, qbr_information, QBR_EMBEDDINGS)
+                VALUES (s.company_name, s.qbr_information, snowflake.cortex.EMBED_TEXT_768('e5-base-v2', s.qbr_information));
+      DELETE FROM qbr_data_vectors
+            WHERE company_name NOT IN (SELECT company_name FROM qbr_data_single_string);
+
 /** Select a control record to see the LLM-friendly "text" document table and the embeddings table **/
     SELECT *
     FROM qbr_data_vectors
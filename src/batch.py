@@ -0,0 +1,365 @@
+"""Bulk QBR generation for a whole portfolio.
+
+BatchQBRRunner fans the per-company work (get_company_data, build_prompt and
+generate_qbr_content from the Streamlit app) out over a bounded thread pool.
+Every CORTEX.COMPLETE call first takes a token from a shared TokenBucket, so
+the pool never exceeds the configured requests per minute, and transient
+failures (throttling, timeouts, dropped connections) are retried with
+exponential backoff and jitter; any other error fails the company at once.
+Finished QBRs are
+streamed to an output store as they complete (a JSON-lines file or a
+warehouse table); the store doubles as the checkpoint, so rerunning an
+interrupted batch only generates the companies that are still missing.
+
+    python3 src/batch.py --stub --num-records 5000 --workers 32 --requests-per-minute 6000
+    python3 src/batch.py --connection default --quarter Q4 --year 2024 --industry Finance
+
+--stub runs offline against StubSession and StubCompletionBackend, which
+answers after a configurable latency, to measure throughput without Snowflake.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+if __package__ in (None, ''):
+    # Allow running as a script (python3 src/batch.py) as well as a module
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .instrumentation import instrumentation
+
+BATCH_TABLE = 'QBR_BATCH_QBRS'
+
+# Messages of throttled, timed out or unavailable requests, e.g. a Cortex 429 surfaced as a SQL error
+TRANSIENT_MESSAGES = re.compile(
+    r'\b(429|503|504)\b|too many requests|rate limit|throttl|timed? ?out|temporarily unavailable|try again',
+    re.IGNORECASE
+)
+
+class TransientCompletionError(Exception):
+    """A completion failure worth retrying (throttling, timeouts)"""
+
+class TokenBucket:
+    """Thread-safe token bucket allowing rate requests per second with bursts of up to capacity"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+
+def is_transient(error):
+    """Whether a failed call is worth retrying; SQL, permission and other errors fail the same way again"""
+    if isinstance(error, (TransientCompletionError, TimeoutError, ConnectionError)):
+        return True
+    return TRANSIENT_MESSAGES.search(str(error)) is not None
+
+def call_with_retries(function, *args, max_retries=5, backoff=1.0, max_backoff=60.0):
+    """Call function, retrying transient failures with exponential backoff and jitter"""
+    for attempt in range(max_retries + 1):
+        try:
+            return function(*args)
+        except Exception as error:
+            if attempt == max_retries or not is_transient(error):
+                raise
+            instrumentation.count('batch.retries')
+            time.sleep(min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+class StubCompletionBackend:
+    """Offline stand-in for CORTEX.COMPLETE with configurable latency and failure rate"""
+
+    def __init__(self, latency=1.0, failure_rate=0.0, seed=42):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, model, prompt):
+        with self._lock:
+            latency = self.latency * self.random.uniform(0.5, 1.5)
+            failed = self.random.random() < self.failure_rate
+        time.sleep(latency)
+        if failed:
+            raise TransientCompletionError('Stub completion throttled')
+        return f"# Quarterly Business Review\n\nStub QBR from {model} for a {len(prompt):,} character prompt."
+
+class JSONLinesStore:
+    """Appends finished QBRs to a JSON-lines file; the companies already in it are skipped on resume"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+
+    def completed(self):
+        if not os.path.exists(self.path):
+            return set()
+        done = set()
+        with open(self.path, 'rb+') as f:
+            end = 0
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A line cut short by an interrupted run; dropped so the next record starts a line of its own
+                    f.truncate(end)
+                    break
+                end += len(line)
+                try:
+                    done.add(json.loads(line)['company_name'])
+                except (ValueError, KeyError):
+                    continue
+        return done
+
+    def write(self, record):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+class TableStore:
+    """Inserts finished QBRs into a warehouse table, one run_id per batch.
+
+    warehouse runs statements with execute(sql, params), e.g. a
+    warehouse.SnowflakeWarehouse or warehouse.LocalWarehouse.
+    """
+
+    def __init__(self, warehouse, run_id, table=BATCH_TABLE):
+        self.warehouse = warehouse
+        self.run_id = run_id
+        self.table = table
+        self.warehouse.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                RUN_ID VARCHAR,
+                COMPANY_NAME VARCHAR,
+                TEMPLATE VARCHAR,
+                VIEW_TYPE VARCHAR,
+                MODEL VARCHAR,
+                CONTENT TEXT,
+                GENERATED_AT FLOAT
+            )
+        """)
+
+    def completed(self):
+        rows = self.warehouse.execute(f"SELECT COMPANY_NAME FROM {self.table} WHERE RUN_ID = ?", [self.run_id])
+        return {row[0] for row in rows}
+
+    def write(self, record):
+        self.warehouse.execute(
+            f"INSERT INTO {self.table} (RUN_ID, COMPANY_NAME, TEMPLATE, VIEW_TYPE, MODEL, CONTENT, GENERATED_AT) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                self.run_id, record['company_name'], record['template'], record['view_type'],
+                record['model'], record['content'], record['generated_at']
+            ]
+        )
+
+class BatchQBRRunner:
+    """Generates QBRs for many companies concurrently, rate limited, retried and checkpointed.
+
+    generate(company, complete) returns the QBR text for one company (None on
+    failure) and must send its LLM calls through complete(model, prompt).
+    """
+
+    def __init__(self, generate, store, workers=8, requests_per_minute=600, max_retries=5, backoff=1.0,
+                 metadata=None, initializer=None):
+        self.generate = generate
+        self.store = store
+        self.workers = workers
+        self.bucket = TokenBucket(requests_per_minute / 60)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # Written with every QBR (template, view type, model)
+        self.metadata = metadata or {}
+        # Runs in each worker thread first, e.g. to attach a Streamlit script context
+        self.initializer = initializer
+
+    def limited(self, complete):
+        """complete() wrapped with the rate limit and retries"""
+        def rate_limited(model, prompt):
+            self.bucket.acquire()
+            with instrumentation.span('batch.complete'):
+                return complete(model, prompt)
+
+        def limited_complete(model, prompt):
+            return call_with_retries(
+                rate_limited, model, prompt, max_retries=self.max_retries, backoff=self.backoff
+            )
+        return limited_complete
+
+    def run(self, companies, complete, progress=None):
+        """Generate the QBRs of companies not yet in the store; progress(stats) is called after each one"""
+        selected = list(dict.fromkeys(companies))
+        done = self.store.completed()
+        todo = [company for company in selected if company not in done]
+        stats = {
+            'total': len(selected),
+            'skipped': len(selected) - len(todo),
+            'succeeded': 0,
+            'failed': 0,
+            'failed_companies': [],
+            'elapsed_seconds': 0.0,
+            'qbrs_per_hour': 0.0
+        }
+        limited_complete = self.limited(complete)
+        start = time.perf_counter()
+
+        def finish(futures):
+            for future in futures:
+                company, content = future.result()
+                if content:
+                    self.store.write({
+                        'company_name': company,
+                        **self.metadata,
+                        'content': content,
+                        'generated_at': time.time()
+                    })
+                    stats['succeeded'] += 1
+                else:
+                    stats['failed'] += 1
+                    stats['failed_companies'].append(company)
+                stats['elapsed_seconds'] = time.perf_counter() - start
+                stats['qbrs_per_hour'] = stats['succeeded'] / stats['elapsed_seconds'] * 3600
+                if progress:
+                    progress(stats)
+
+        def task(company):
+            try:
+                return company, self.generate(company, limited_complete)
+            except Exception:
+                instrumentation.count('batch.errors')
+                return company, None
+
+        with ThreadPoolExecutor(max_workers=self.workers, initializer=self.initializer) as executor:
+            # Keep a bounded number of companies in flight so memory stays flat
+            pending = set()
+            for company in todo:
+                pending.add(executor.submit(task, company))
+                if len(pending) >= 2 * self.workers:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    finish(finished)
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                finish(finished)
+
+        stats['elapsed_seconds'] = time.perf_counter() - start
+        return stats
+
+def app_generator(get_company_data, generate_qbr_content, template_type, view_type, model, use_cache=True):
+    """Per-company generate function built on the Streamlit app's get_company_data and generate_qbr_content"""
+    def generate(company, complete):
+        company_data = get_company_data(company)
+        if company_data is None or company_data.empty:
+            return None
+        return generate_qbr_content(
+            company_data, None, template_type, view_type, model, use_cache=use_cache, complete=complete
+        )
+    return generate
+
+def select_companies(session, quarters=None, years=None, industries=None, limit=None):
+    """Names of the companies in QBR_DATA matching the quarter, year and industry filters"""
+    companies = session.sql("SELECT COMPANY_NAME, INDUSTRY, QBR_QUARTER, QBR_YEAR FROM QBR_DATA").to_pandas()
+    for column, values in [('QBR_QUARTER', quarters), ('QBR_YEAR', years), ('INDUSTRY', industries)]:
+        if values:
+            companies = companies[companies[column].isin(values)]
+    names = sorted(companies['COMPANY_NAME'])
+    return names[:limit] if limit else names
+
+def connect(connection_name):
+    """Snowpark session for a named connection in the Snowflake connections.toml"""
+    from snowflake.snowpark import Session
+
+    return Session.builder.config('connection_name', connection_name).create()
+
+def main():
+    from .benchmark import load_app, stub_session
+    from .warehouse import SnowflakeWarehouse
+
+    parser = argparse.ArgumentParser(description='Generate QBRs for a whole portfolio')
+    parser.add_argument('--connection', default='default',
+                        help='Snowflake connection name from connections.toml (default: default)')
+    parser.add_argument('--stub', action='store_true',
+                        help='Run offline against generated data and a stub completion backend')
+    parser.add_argument('--num-records', type=int, default=750,
+                        help='Number of generated companies for --stub')
+    parser.add_argument('--stub-latency', type=float, default=1.0,
+                        help='Mean seconds per stub completion (default: 1.0)')
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0,
+                        help='Share of stub completions that fail and are retried')
+    parser.add_argument('--quarter', nargs='+', default=None, help='Only companies in these QBR quarters')
+    parser.add_argument('--year', type=int, nargs='+', default=None, help='Only companies in these QBR years')
+    parser.add_argument('--industry', nargs='+', default=None, help='Only companies in these industries')
+    parser.add_argument('--limit', type=int, default=None, help='Generate at most this many QBRs')
+    parser.add_argument('--template', default='Standard QBR', help='QBR template (default: Standard QBR)')
+    parser.add_argument('--view', default='Executive View', help='View type (default: Executive View)')
+    parser.add_argument('--model', default='claude-3-5-sonnet', help='Cortex model (default: claude-3-5-sonnet)')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent QBRs in flight (default: 16)')
+    parser.add_argument('--requests-per-minute', type=float, default=600,
+                        help='Rate limit for Cortex calls (default: 600)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries per Cortex call (default: 5)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the completion cache lookup')
+    parser.add_argument('--output', default=os.path.join('output', 'qbr_batch.jsonl'),
+                        help='JSON-lines output, also used to resume an interrupted run')
+    parser.add_argument('--table', action='store_true',
+                        help=f'Stream QBRs to the {BATCH_TABLE} table instead of --output')
+    parser.add_argument('--run-id', default=None,
+                        help='Run identifier for --table, used to resume (default: derived from the filters)')
+    args = parser.parse_args()
+
+    if args.stub:
+        session = stub_session(args.num_records, complete=StubCompletionBackend(args.stub_latency, args.stub_failure_rate))
+    else:
+        session = connect(args.connection)
+    app = load_app(session)
+
+    companies = select_companies(session, args.quarter, args.year, args.industry, args.limit)
+    if args.table:
+        run_id = args.run_id or '-'.join(
+            [args.template, args.view, args.model] + [str(value) for value in [args.quarter, args.year, args.industry]]
+        )
+        store = TableStore(SnowflakeWarehouse(session), run_id)
+    else:
+        store = JSONLinesStore(args.output)
+
+    runner = BatchQBRRunner(
+        app_generator(
+            app.get_company_data, app.generate_qbr_content, args.template, args.view, args.model,
+            use_cache=not args.no_cache
+        ),
+        store,
+        workers=args.workers,
+        requests_per_minute=args.requests_per_minute,
+        max_retries=args.max_retries,
+        metadata={'template': args.template, 'view_type': args.view, 'model': args.model}
+    )
+
+    def progress(stats):
+        finished = stats['succeeded'] + stats['failed']
+        if finished % 100 == 0 or finished + stats['skipped'] == stats['total']:
+            print(f"{finished + stats['skipped']:,}/{stats['total']:,} QBRs  "
+                  f"{stats['failed']:,} failed  {stats['qbrs_per_hour']:,.0f} QBRs/hour")
+
+    print(f"{len(companies):,} companies selected")
+    stats = runner.run(companies, app.cortex_complete, progress)
+    print(f"{stats['succeeded']:,} QBRs generated, {stats['skipped']:,} already done, "
+          f"{stats['failed']:,} failed in {stats['elapsed_seconds']:.1f} s")
+    if stats['failed']:
+        print("Rerun the same command to retry the failed companies")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""Benchmarks for the generator, the writers and the Streamlit app hot paths.
+
+Every case runs at each --scales size in a fresh worker process, so the peak
+resident memory it reports belongs to that case alone. Results are written as
+JSON; pass a previous results file as --baseline to fail (exit status 1) when
+throughput drops or peak memory grows by more than --threshold.
+
+The app cases load files/streamlit-code.py against StubSession, a local
+stand-in for the Snowpark session that serves generated data, so build_prompt
+and the result formatting in search_similar_companies run without Snowflake.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ''):
+    # Allow running as a script (python3 src/benchmark.py) as well as a module
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .data_generator import QBRDataGenerator
+from .documents import HashingEmbedder, render_documents
+from .hybrid_search import HybridSearch
+from .portfolio import PortfolioCube
+from .search_index import CompanySearchIndex
+from .schema import COMPANY_SIZES, DEAL_STAGES, INDUSTRIES, QBR_QUARTERS, apply_schema
+from .validation import validate
+from .vector_index import build_index, embedding_matrix
+from .warehouse import LocalWarehouse
+from .writers import write_csv
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'files', 'streamlit-code.py')
+
+DEFAULT_SCALES = [1000, 100000, 10000000]
+
+# Row-at-a-time cases take minutes and several GB beyond this many records
+MAX_ROW_RECORDS = 100000
+
+# Tables the app writes to; StubSession keeps them in an in-memory SQLite database
+STUB_SQLITE_TABLES = ('QBR_COMPLETION_CACHE', 'QBR_BATCH_QBRS')
+
+class StubSession:
+    """Answers the app's queries from in-memory frames instead of Snowflake.
+
+    CORTEX.COMPLETE calls go to complete(model, prompt) when given, streaming
+    completions (snowflake.cortex.Complete with stream=True) to stream(model, prompt).
+    EMBED_TEXT_768 and the QBR_EMBEDDINGS column are answered by a HashingEmbedder.
+    """
+
+    def __init__(self, qbr_data, qbr_vectors, complete=None, stream=None):
+        self.qbr_data = qbr_data
+        self.qbr_vectors = qbr_vectors
+        self.complete = complete
+        self.stream = stream
+        self.by_name = pd.Index(qbr_data['COMPANY_NAME'])
+        self.embeddings = None
+        self.last_altered = pd.Timestamp('2025-01-01 00:00:00')
+        self.database = sqlite3.connect(':memory:', check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def sql(self, query, params=None):
+        params = params or []
+        table = re.search(r'FROM\s+(\w+)', query)
+        if 'CORTEX.COMPLETE' in query:
+            return StubResult(rows=[(self.complete(*params) if self.complete else 'Stub completion',)])
+        if 'EMBED_TEXT_768' in query:
+            return StubResult(rows=[(vector,) for vector in HashingEmbedder()(params[1:])])
+        if any(name in query for name in STUB_SQLITE_TABLES):
+            with self._lock, self.database:
+                return StubResult(rows=self.database.execute(query, params).fetchall())
+        if 'GROUP BY' in query:
+            return StubResult(frame=PortfolioCube.from_frame(self.qbr_data).aggregates())
+        if 'INFORMATION_SCHEMA' in query:
+            return StubResult(rows=[(self.last_altered,)])
+        if table is None:
+            return StubResult(rows=[('STUB_DATABASE', 'STUB_SCHEMA')])
+        if 'QBR_EMBEDDINGS' in query:
+            return StubResult(frame=self.vector_frame())
+        if table.group(1) == 'QBR_DATA_VECTORS':
+            return StubResult(frame=self.qbr_vectors.head(params[-1] if params else None))
+        if params:
+            return StubResult(frame=self.qbr_data.iloc[self.by_name.get_indexer([params[0]])])
+        return StubResult(frame=self.qbr_data)
+
+    def vector_frame(self):
+        """QBR_DATA_VECTORS joined with the QBR_DATA segment columns, embeddings built on first use"""
+        if self.embeddings is None:
+            self.embeddings = HashingEmbedder()(self.qbr_vectors['QBR_INFORMATION'])
+        frame = self.qbr_vectors[['COMPANY_NAME', 'QBR_INFORMATION']].copy()
+        frame['QBR_EMBEDDINGS'] = list(self.embeddings)
+        for column in ['INDUSTRY', 'SIZE', 'QBR_QUARTER']:
+            frame[column] = self.qbr_data[column].to_numpy()
+        return frame
+
+class StubResult:
+    """The subset of a Snowpark DataFrame the app uses"""
+
+    def __init__(self, frame=None, rows=None):
+        self.frame = frame
+        self.rows = rows
+
+    def to_pandas(self):
+        return self.frame
+
+    def collect(self):
+        if self.rows is not None:
+            return self.rows
+        return list(self.frame.itertuples(index=False))
+
+def _stub_cortex_complete(model, prompt, session=None, stream=False):
+    """Stand-in for snowflake.cortex.Complete answering from a StubSession"""
+    if stream and session.stream is not None:
+        return session.stream(model, prompt)
+    response = session.sql("SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?)", params=[model, prompt]).collect()[0][0]
+    return iter([response]) if stream else response
+
+def load_app(session):
+    """Import the Streamlit app with get_active_session() returning session"""
+    context = types.ModuleType('snowflake.snowpark.context')
+    context.get_active_session = lambda: session
+    stubs = {
+        'snowflake': types.ModuleType('snowflake'),
+        'snowflake.snowpark': types.ModuleType('snowflake.snowpark'),
+        'snowflake.snowpark.context': context
+    }
+    if isinstance(session, StubSession):
+        cortex = stubs['snowflake.cortex'] = types.ModuleType('snowflake.cortex')
+        cortex.Complete = _stub_cortex_complete
+    saved = {name: sys.modules.get(name) for name in stubs}
+    sys.modules.update(stubs)
+    try:
+        spec = importlib.util.spec_from_file_location('qbr_app', APP_PATH)
+        app = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(app)
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+    return app
+
+def stub_session(num_records, seed=42, complete=None, stream=None):
+    """A StubSession over a generated dataset of num_records companies"""
+    df = QBRDataGenerator(num_records=num_records, seed=seed).generate_data_vectorized()
+    qbr_data = df.rename(columns=str.upper)
+    qbr_vectors = pd.DataFrame({'COMPANY_NAME': qbr_data['COMPANY_NAME'], 'QBR_INFORMATION': render_documents(df)})
+    return StubSession(qbr_data, qbr_vectors, complete, stream)
+
+# Each case has a setup (untimed) and a run (timed) step; run returns the number of rows processed
+
+def setup_generator(num_records):
+    return QBRDataGenerator(num_records=num_records)
+
+def setup_correlated_generator(num_records):
+    return QBRDataGenerator(num_records=num_records, correlated=True)
+
+def run_generate_data(generator):
+    return len(generator.generate_data())
+
+def run_generate_data_vectorized(generator):
+    return len(generator.generate_data_vectorized())
+
+def run_generate_company_data(generator):
+    return len(generator.generate_company_data())
+
+def run_generate_meddicc_data(generator):
+    for _ in range(generator.num_records):
+        generator.generate_meddicc_data()
+    return generator.num_records
+
+def setup_records(num_records):
+    """Row dicts like the ones generate_data() collects, with dates as strings"""
+    df = QBRDataGenerator(num_records=num_records).generate_data_vectorized()
+    for column in ['contract_start_date', 'contract_expiration_date']:
+        df[column] = df[column].dt.strftime('%Y-%m-%d')
+    return df.astype(object).to_dict('records')
+
+def run_dataframe_construction(records):
+    return len(apply_schema(pd.DataFrame(records)))
+
+def setup_csv_write(num_records):
+    df = QBRDataGenerator(num_records=num_records).generate_data_vectorized()
+    return df, tempfile.mkdtemp()
+
+def run_csv_write(state):
+    df, directory = state
+    path = os.path.join(directory, 'qbr_sample_data.csv')
+    try:
+        return write_csv([df], path)
+    finally:
+        os.remove(path)
+
+def setup_app(num_records):
+    session = stub_session(num_records)
+    return load_app(session), session
+
+def run_build_prompt(state):
+    app, session = state
+    metrics = session.qbr_data[[
+        'HEALTH_SCORE', 'CONTRACT_VALUE', 'CSAT_SCORE', 'ACTIVE_USERS', 'FEATURE_ADOPTION_RATE',
+        'TICKET_VOLUME', 'RENEWAL_PROBABILITY', 'QBR_QUARTER', 'QBR_YEAR'
+    ]]
+    contexts = session.qbr_vectors['QBR_INFORMATION']
+    for i in range(len(metrics)):
+        app.build_prompt(
+            metrics.iloc[i:i + 1],
+            contexts.iat[i],
+            app.QBR_TEMPLATES[i % len(app.QBR_TEMPLATES)],
+            app.VIEW_TYPES[i % len(app.VIEW_TYPES)]
+        )
+    return len(metrics)
+
+def run_search_formatting(state):
+    app, session = state
+    results = app.search_similar_companies('Inc', top_k=len(session.qbr_vectors))
+    return results.count('**Company:**')
+
+def setup_hybrid_search(num_records, queries=200):
+    """Hybrid search over stub data with the offline embedder, and misspelled names and content phrases to look up"""
+    vectors = stub_session(num_records).vector_frame()
+    index = build_index(
+        list(vectors['COMPANY_NAME']),
+        embedding_matrix(vectors['QBR_EMBEDDINGS']),
+        {column: vectors[column] for column in ['INDUSTRY', 'SIZE', 'QBR_QUARTER']}
+    )
+    search = HybridSearch(
+        CompanySearchIndex(vectors['COMPANY_NAME'], vectors['QBR_INFORMATION']), index, HashingEmbedder(), cache_size=0
+    )
+    rng = np.random.default_rng(0)
+    names = vectors['COMPANY_NAME'].to_numpy()[rng.integers(0, len(vectors), queries // 2)]
+    phrases = ['at risk healthcare account', 'low csat enterprise', 'champion engaged c-level', 'compliance risk retail']
+    return search, [name[:-1] for name in names] + [phrases[i % len(phrases)] + f' q{i % 4 + 1}' for i in range(queries // 2)]
+
+def run_hybrid_search(state):
+    """Counts queries rather than rows"""
+    search, queries = state
+    for query in queries:
+        search.search(query, k=10)
+    return len(queries)
+
+def setup_warehouse_lookups(num_records, lookups=1000):
+    """Local warehouse over generated data in a temporary directory, and company names to look up"""
+    df = QBRDataGenerator(num_records=num_records).generate_data_vectorized()
+    warehouse = LocalWarehouse(os.path.join(tempfile.mkdtemp(), 'qbr.sqlite'))
+    warehouse.load(df)
+    names = df['company_name'].to_numpy()[np.random.default_rng(0).integers(0, len(df), lookups)]
+    return warehouse, names
+
+def run_warehouse_lookups(state):
+    """Counts lookups rather than rows"""
+    warehouse, names = state
+    for name in names:
+        warehouse.query("SELECT * FROM QBR_DATA WHERE COMPANY_NAME = ?", [name])
+    return len(names)
+
+def setup_portfolio_queries(num_records, queries=200):
+    """Portfolio cube built batch by batch from generated data, and random slice-and-dice queries"""
+    cube = PortfolioCube()
+    for batch in QBRDataGenerator(num_records=num_records).iter_batches():
+        cube.add(batch)
+    rng = np.random.default_rng(0)
+    dimensions = ['industry', 'size', 'deal_stage', 'qbr_quarter']
+    members = {'industry': INDUSTRIES, 'size': COMPANY_SIZES, 'deal_stage': DEAL_STAGES, 'qbr_quarter': QBR_QUARTERS}
+    slices = []
+    for _ in range(queries):
+        filters = {
+            dimension: list(rng.choice(members[dimension], rng.integers(1, len(members[dimension]) + 1), replace=False))
+            for dimension in dimensions if rng.random() < 0.5
+        }
+        first, last = np.sort(rng.choice(cube.years, 2))
+        filters['qbr_year'] = (int(first), int(last))
+        slices.append((filters, list(rng.choice(dimensions, rng.integers(0, 3), replace=False))))
+    return cube, slices
+
+def run_portfolio_queries(state):
+    """Counts queries rather than rows"""
+    cube, slices = state
+    for filters, by in slices:
+        cube.query(filters, by)
+    return len(slices)
+
+def setup_validation(num_records, batch_size=1000000):
+    """Generated data in the batches the generator and the validation CLI stream"""
+    df = QBRDataGenerator(num_records=num_records).generate_data_vectorized()
+    return [df.iloc[start:start + batch_size] for start in range(0, len(df), batch_size)]
+
+def run_validation(batches):
+    return validate(batches).rows
+
+# name -> (setup, run, row at a time)
+BENCHMARKS = {
+    'generate_data': (setup_generator, run_generate_data, True),
+    'generate_data_vectorized': (setup_generator, run_generate_data_vectorized, False),
+    'generate_data_correlated': (setup_correlated_generator, run_generate_data_vectorized, False),
+    'generate_company_data': (setup_generator, run_generate_company_data, True),
+    'generate_meddicc_data': (setup_generator, run_generate_meddicc_data, True),
+    'dataframe_construction': (setup_records, run_dataframe_construction, True),
+    'csv_write': (setup_csv_write, run_csv_write, False),
+    'build_prompt': (setup_app, run_build_prompt, True),
+    'search_formatting': (setup_app, run_search_formatting, True),
+    'hybrid_search': (setup_hybrid_search, run_hybrid_search, True),
+    'warehouse_lookups': (setup_warehouse_lookups, run_warehouse_lookups, True),
+    'portfolio_queries': (setup_portfolio_queries, run_portfolio_queries, False),
+    'validation': (setup_validation, run_validation, False)
+}
+
+def _peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+def measure(name, num_records):
+    """Run one benchmark case in the current process"""
+    setup, run, _ = BENCHMARKS[name]
+    state = setup(num_records)
+    setup_rss = _peak_rss_mb()
+    start = time.perf_counter()
+    rows = run(state)
+    seconds = time.perf_counter() - start
+    peak_rss = _peak_rss_mb()
+    return {
+        'benchmark': name,
+        'num_records': num_records,
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(peak_rss, 1),
+        'memory_increase_mb': round(peak_rss - setup_rss, 1)
+    }
+
+def run_benchmarks(names, scales, max_row_records=MAX_ROW_RECORDS, repeat=1):
+    """Measure every case at every scale, each run in its own process; keeps the fastest of repeat runs"""
+    results = []
+    for name in names:
+        for num_records in scales:
+            if BENCHMARKS[name][2] and num_records > max_row_records:
+                results.append({
+                    'benchmark': name,
+                    'num_records': num_records,
+                    'skipped': f'row-at-a-time case above --max-row-records {max_row_records}'
+                })
+                continue
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    runs.append(executor.submit(measure, name, num_records).result())
+            result = min(runs, key=lambda result: result['seconds'])
+            print(f"{name:<26} {num_records:>12,} rows  {result['seconds']:>10.3f} s  "
+                  f"{result['rows_per_sec'] or 0:>14,.0f} rows/s  {result['peak_rss_mb']:>9,.1f} MB peak")
+            results.append(result)
+    return results
+
+def compare(results, baseline, threshold=0.2):
+    """Regressions of results against baseline: throughput below or peak memory above threshold"""
+    previous = {
+        (result['benchmark'], result['num_records']): result
+        for result in baseline['results'] if 'skipped' not in result
+    }
+    regressions = []
+    for result in results:
+        before = previous.get((result['benchmark'], result['num_records']))
+        if before is None or 'skipped' in result:
+            continue
+        label = f"{result['benchmark']} @ {result['num_records']:,}"
+        # rows_per_sec is None for runs too fast to time, which leaves nothing to compare
+        if None in (result['rows_per_sec'], before['rows_per_sec']):
+            pass
+        elif result['rows_per_sec'] < before['rows_per_sec'] * (1 - threshold):
+            regressions.append(f"{label}: {result['rows_per_sec']:,.0f} rows/s vs {before['rows_per_sec']:,.0f} rows/s")
+        if result['peak_rss_mb'] > before['peak_rss_mb'] * (1 + threshold):
+            regressions.append(f"{label}: {result['peak_rss_mb']:,.1f} MB peak vs {before['peak_rss_mb']:,.1f} MB peak")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark QBR data generation, serialization and app hot paths')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='Numbers of records to benchmark at (default: 1000 100000 10000000)')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help='Cases to run (default: all)')
+    parser.add_argument('--max-row-records', type=int, default=MAX_ROW_RECORDS,
+                        help='Skip row-at-a-time cases above this many records (default: 100000)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Run each case this many times and keep the fastest run')
+    parser.add_argument('--output', default=None,
+                        help='Results file (default: output/benchmarks/benchmark_<UTC timestamp>.json)')
+    parser.add_argument('--baseline', default=None,
+                        help='Earlier results file to compare against; exits with status 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed fractional drop in rows/sec or growth in peak memory (default: 0.2)')
+    args = parser.parse_args()
+
+    timestamp = datetime.now(timezone.utc)
+    results = run_benchmarks(args.benchmarks, args.scales, args.max_row_records, args.repeat)
+    report = {
+        'timestamp': timestamp.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+
+    output_file = args.output or os.path.join('output', 'benchmarks', f"benchmark_{timestamp:%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults have been saved to {output_file}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions beyond {args.threshold:.0%} of {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+if __name__ == "__main__":
+    main()
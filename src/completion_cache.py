@@ -0,0 +1,129 @@
+"""Persistent cache of LLM completions.
+
+Completions are keyed on a SHA-256 fingerprint of the model, the fully built
+prompt and the generation parameters, so an unchanged account, template, view
+and model never pays for a second CORTEX.COMPLETE call. Entries live in a SQL
+table reached through any backend with execute(query, params): a local SQLite
+file (SQLiteBackend), or the app's warehouse (src/warehouse.py), which runs the
+same statements in Snowflake or in its local SQLite file.
+
+Entries older than ttl seconds are treated as misses. After each insert the
+least recently used entries beyond max_entries or max_bytes are evicted.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .instrumentation import instrumentation
+
+DEFAULT_TABLE = 'QBR_COMPLETION_CACHE'
+
+def completion_key(model, prompt, params=None):
+    """Stable fingerprint of one completion request"""
+    payload = json.dumps({'model': model, 'prompt': prompt, 'params': params or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SQLiteBackend:
+    """Runs the cache statements against a local SQLite file"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def execute(self, query, params=()):
+        with self._lock, self.connection:
+            return self.connection.execute(query, params).fetchall()
+
+class CompletionCache:
+    """Completion store with TTL expiry and LRU eviction by entry count and total size"""
+
+    def __init__(self, backend, table=DEFAULT_TABLE, ttl=30 * 24 * 3600, max_entries=10000, max_bytes=256 * 2 ** 20):
+        self.backend = backend
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Counted from the batch runner's worker threads too
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.backend.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                KEY VARCHAR PRIMARY KEY,
+                MODEL VARCHAR,
+                RESPONSE TEXT,
+                SIZE INTEGER,
+                CREATED_AT FLOAT,
+                LAST_USED FLOAT,
+                HITS INTEGER
+            )
+        """)
+
+    def get(self, model, prompt, params=None):
+        """Cached completion for the request, or None"""
+        key = completion_key(model, prompt, params)
+        now = time.time()
+        rows = self.backend.execute(
+            f"SELECT RESPONSE FROM {self.table} WHERE KEY = ? AND CREATED_AT >= ?", (key, now - self.ttl)
+        )
+        if not rows:
+            with self._lock:
+                self.misses += 1
+            instrumentation.count('completion_cache.misses')
+            return None
+        self.backend.execute(f"UPDATE {self.table} SET LAST_USED = ?, HITS = HITS + 1 WHERE KEY = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        instrumentation.count('completion_cache.hits')
+        return rows[0][0]
+
+    def put(self, model, prompt, response, params=None):
+        """Store a completion and evict what no longer fits"""
+        key = completion_key(model, prompt, params)
+        now = time.time()
+        self.backend.execute(f"DELETE FROM {self.table} WHERE KEY = ?", (key,))
+        self.backend.execute(
+            f"INSERT INTO {self.table} (KEY, MODEL, RESPONSE, SIZE, CREATED_AT, LAST_USED, HITS) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (key, model, response, len(response.encode('utf-8')), now, now)
+        )
+        self.evict()
+
+    def get_or_complete(self, model, prompt, complete, params=None, bypass=False):
+        """Cached completion, or complete(model, prompt) stored for next time; bypass skips the lookup"""
+        response = None if bypass else self.get(model, prompt, params)
+        if response is not None:
+            return response, True
+        response = complete(model, prompt)
+        if response:
+            self.put(model, prompt, response, params)
+        return response, False
+
+    def evict(self):
+        """Drop expired entries and the least recently used ones beyond max_entries or max_bytes"""
+        self.backend.execute(f"DELETE FROM {self.table} WHERE CREATED_AT < ?", (time.time() - self.ttl,))
+        self.backend.execute(f"""
+            DELETE FROM {self.table} WHERE KEY IN (
+                SELECT KEY FROM (
+                    SELECT
+                        KEY,
+                        ROW_NUMBER() OVER (ORDER BY LAST_USED DESC) AS RECENCY,
+                        SUM(SIZE) OVER (
+                            ORDER BY LAST_USED DESC ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                        ) AS RUNNING_SIZE
+                    FROM {self.table}
+                ) WHERE RECENCY > ? OR RUNNING_SIZE > ?
+            )
+        """, (self.max_entries, self.max_bytes))
+
+    def clear(self):
+        self.backend.execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        """Entry count, stored bytes and this process's hit/miss counts"""
+        entries, size = self.backend.execute(f"SELECT COUNT(*), COALESCE(SUM(SIZE), 0) FROM {self.table}")[0]
+        return {'entries': entries, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
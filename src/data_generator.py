@@ -1,20 +1,60 @@
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
 
+if __package__ in (None, ''):
+    # Allow running as a script (python3 src/data_generator.py) as well as a module
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .schema import QBR_COLUMNS, QBR_SCHEMA, apply_schema, arrow_schema, contract_date_columns
+from .instrumentation import JSONLinesExporter, PrometheusExporter, instrumentation
+from .names import CompanyNameEngine
+from .portfolio import CUBE_FILE, PortfolioCube, fold
+from .spec import QBR_PLAN, QBR_SPEC, SamplingPlan, correlated_spec, load_correlation
+from .validation import RULES, Validator, print_report
+from .writers import WRITERS, output_path, write_batches
+
+# Fixed fields of the control records, the overrides of the spec; company ids
+# continue after the generated records and everything else is randomly generated
+CONTROL_RECORDS = QBR_SPEC['overrides']
+
+# Spec sections drawn per company up front, and per record after the contract dates
+COMPANY_SECTIONS = ['company']
+METRIC_SECTIONS = ['deal', 'usage', 'support', 'meddicc', 'calculated']
+
 class QBRDataGenerator:
-    def __init__(self, num_records=750):
+    def __init__(self, num_records=750, seed=42, block_size=100000, correlated=False, correlation=None):
         self.num_records = num_records
-        np.random.seed(42)
+        self.seed = seed
+        # Independent metrics by default; correlated ones are drawn through the
+        # spec's Gaussian copula, optionally with another correlation matrix
+        if correlated or correlation is not None:
+            self.plan = SamplingPlan(correlated_spec(correlation), QBR_SCHEMA)
+        else:
+            self.plan = QBR_PLAN
+        # The vectorized engine generates fixed-size blocks, each from its own
+        # stream spawned from the root seed, so the output does not depend on
+        # how many workers or what batch size are used
+        self.block_size = block_size
+        self.name_engine = CompanyNameEngine(seed)
+        np.random.seed(seed)
+        random.seed(seed)
         
     def generate_dates(self, start):
-        date_list = []
-        current = start
-        for _ in range(self.num_records):
-            current += timedelta(days=random.randint(0, 3))
-            date_list.append(current)
-        return date_list
+        with instrumentation.span('generator.dates'):
+            date_list = []
+            current = start
+            for _ in range(self.num_records):
+                current += timedelta(days=random.randint(0, 3))
+                date_list.append(current)
+            return date_list
     
     def generate_expiration_date(self, start_date):
         # Typically 1-year contract
@@ -23,215 +63,30 @@ class QBRDataGenerator:
     def generate_company_data(self):
         companies = []
         
-        # Industry-specific company name lists
-        tech_names = [
-            'Cloud Nexus', 'Digital Frontier', 'Quantum Systems', 'Cyber Logic', 
-            'Data Dynamics', 'Tech Matrix', 'AI Solutions', 'Silicon Bridge',
-            'Network Atlas', 'Binary Systems', 'Cloud Forge', 'Cyber Peak',
-            'Data Sphere', 'Edge Computing', 'Future Stack'
-        ]
-        
-        healthcare_names = [
-            'MediCare Plus', 'Health Dynamics', 'Care Solutions', 'Wellness Systems',
-            'Med Analytics', 'Health Innovations', 'Care Matrix', 'Vitality Group',
-            'Medical Dynamics', 'Health Metrics', 'Patient Care Pro', 'BioTech Solutions',
-            'Health Catalyst', 'Care Connect', 'Wellness Partners'
-        ]
-        
-        finance_names = [
-            'Capital Partners', 'Wealth Metrics', 'Finance Direct', 'Investment Logic',
-            'Asset Analytics', 'Wealth Dynamics', 'Capital Forge', 'Finance Focus',
-            'Investment Core', 'Wealth Systems', 'Capital Matrix', 'Finance Analytics',
-            'Asset Partners', 'Wealth Logic', 'Investment Direct'
-        ]
-        
-        manufacturing_names = [
-            'Industrial Systems', 'Manufacturing Plus', 'Production Pro', 'Factory Focus',
-            'Industrial Dynamics', 'Manufacturing Logic', 'Production Systems', 'Assembly Tech',
-            'Industrial Solutions', 'Manufacturing Core', 'Production Analytics', 'Factory Systems',
-            'Industrial Matrix', 'Manufacturing Edge', 'Production Dynamics'
-        ]
-        
-        retail_names = [
-            'Retail Solutions', 'Commerce Pro', 'Market Systems', 'Retail Dynamics',
-            'Commerce Logic', 'Market Focus', 'Retail Analytics', 'Commerce Direct',
-            'Market Plus', 'Retail Core', 'Commerce Systems', 'Market Dynamics',
-            'Retail Matrix', 'Commerce Analytics', 'Market Solutions'
-        ]
-        
-        # Create mapping of industries to their name lists
-        industry_names = {
-            'Technology': tech_names,
-            'Healthcare': healthcare_names,
-            'Finance': finance_names,
-            'Manufacturing': manufacturing_names,
-            'Retail': retail_names
-        }
-        
-        # Track used names per industry to avoid duplicates
-        used_names = {industry: [] for industry in industry_names.keys()}
-        
         for i in range(self.num_records):
-            # Select industry first
-            industry = random.choice(list(industry_names.keys()))
-            
-            # Get available names for this industry
-            available_names = [n for n in industry_names[industry] if n not in used_names[industry]]
-            
-            # If we've used all names, reset the used names for this industry
-            if not available_names:
-                used_names[industry] = []
-                available_names = industry_names[industry]
-            
-            # Select and mark name as used
-            company_name = random.choice(available_names)
-            used_names[industry].append(company_name)
-            
-            company = {
-                'company_id': f'COMP{i:04d}',
-                'company_name': company_name,
-                'industry': industry,
-                'size': random.choice(['Small', 'Medium', 'Enterprise']),
-                'contract_value': random.randint(10000, 100000)
-            }
-            companies.append(company)
+            # Names are unique per record index, no need to track used names
+            with instrumentation.span('generator.names'):
+                companies.append(self.plan.fill_row(random, i, {}, COMPANY_SECTIONS, self.name_engine))
             
         return companies
 
     def generate_meddicc_data(self):
         """Generate MEDDICC-related fields"""
-        return {
-            # Metrics
-            'success_metrics_defined': random.choice([True, False]),
-            'roi_calculated': random.choice([True, False]),
-            'estimated_roi_value': random.randint(50000, 500000) if random.random() > 0.3 else 0,
-            
-            # Economic Buyer
-            'economic_buyer_identified': random.choice([True, False]),
-            'executive_sponsor_engaged': random.choice([True, False]),
-            'decision_maker_level': random.choice(['C-Level', 'VP', 'Director', 'Manager']),
-            
-            # Decision Process
-            'decision_process_documented': random.choice([True, False]),
-            'next_steps_defined': random.choice([True, False]),
-            'decision_timeline_clear': random.choice([True, False]),
-            
-            # Decision Criteria
-            'technical_criteria_met': random.choice([True, False]),
-            'business_criteria_met': random.choice([True, False]),
-            'success_criteria_defined': random.choice([
-                'Cost Reduction', 'Revenue Growth', 'Efficiency Gains', 
-                'Risk Mitigation', 'Customer Satisfaction', 'Time Savings'
-            ]),
-            
-            # Identified Pain
-            'pain_points_documented': random.choice([
-                'Manual Processes', 'Data Accuracy', 'Reporting Delays',
-                'Customer Churn', 'Resource Constraints', 'Compliance Risk'
-            ]),
-            'pain_impact_level': random.choice(['High', 'Medium', 'Low']),
-            'urgency_level': random.choice(['High', 'Medium', 'Low']),
-            
-            # Champion
-            'champion_identified': random.choice([True, False]),
-            'champion_level': random.choice(['C-Level', 'VP', 'Director', 'Manager']),
-            'champion_engagement_score': random.randint(1, 5),
-            
-            # Competition
-            'competitive_situation': random.choice(['Single', 'Multiple', 'None']),
-            'competitive_position': random.choice(['Leader', 'Strong', 'Weak'])
-        }
+        with instrumentation.span('generator.meddicc'):
+            return self.plan.fill_row(random, None, {}, ['meddicc'])
 
     def add_control_records(self, data):
-        control_records = [
-            {
-                'company_id': 'COMP0750',
-                'company_name': 'Kohlleffel Inc',
-                'industry': 'Technology',
-                'size': 'Small',
-                'contract_value': 150000,
-                'contract_start_date': '2024-02-01',
-                'contract_expiration_date': '2025-01-31',
-                'qbr_quarter': 'Q4',
-                'qbr_year': 2024
-            },
-            {
-                'company_id': 'COMP0751',
-                'company_name': 'Hrncir Inc',
-                'industry': 'Technology',
-                'size': 'Small',
-                'contract_value': 160000,
-                'contract_start_date': '2024-02-01',
-                'contract_expiration_date': '2025-01-31',
-                'qbr_quarter': 'Q4',
-                'qbr_year': 2024
-            },
-            {
-                'company_id': 'COMP0752',
-                'company_name': 'Millman Inc',
-                'industry': 'Technology',
-                'size': 'Small',
-                'contract_value': 170000,
-                'contract_start_date': '2024-02-01',
-                'contract_expiration_date': '2025-01-31',
-                'qbr_quarter': 'Q4',
-                'qbr_year': 2024
-            },
-            {
-                'company_id': 'COMP0753',
-                'company_name': 'Tony Kelly Inc',
-                'industry': 'Technology',
-                'size': 'Small',
-                'contract_value': 180000,
-                'contract_start_date': '2024-02-01',
-                'contract_expiration_date': '2025-01-31',
-                'qbr_quarter': 'Q4',
-                'qbr_year': 2024
-            },
-            {
-                'company_id': 'COMP0754',
-                'company_name': 'Kai Lee Inc',
-                'industry': 'Technology',
-                'size': 'Small',
-                'contract_value': 190000,
-                'contract_start_date': '2024-02-01',
-                'contract_expiration_date': '2025-01-31',
-                'qbr_quarter': 'Q4',
-                'qbr_year': 2024
-            }
-        ]
-        
-        # Generate random data for all fields not specified above for all control records
-        for record in control_records:
-            record.update({
-                'deal_stage': random.choice(['Implementation', 'Live', 'At Risk', 'Stable']),
-                'renewal_probability': random.randint(60, 100),
-                'upsell_opportunity': random.choice([0, 5000, 10000, 15000, 20000]),
-                'active_users': random.randint(5, 100),
-                'feature_adoption_rate': round(random.uniform(0.4, 0.95), 2),
-                'custom_integrations': random.randint(0, 5),
-                'pending_feature_requests': random.randint(0, 10),
-                'ticket_volume': random.randint(5, 50),
-                'avg_resolution_time_hours': round(random.uniform(1, 48), 1),
-                'csat_score': round(random.uniform(3.5, 5.0), 1),
-                'sla_compliance_rate': round(random.uniform(0.8, 1.0), 2),
-            })
-            
-            # Add MEDDICC data
-            record.update(self.generate_meddicc_data())
-            
-            # Calculate health score
-            record['health_score'] = round(
-                (record['renewal_probability'] * 0.3 +
-                 record['feature_adoption_rate'] * 100 * 0.3 +
-                 record['sla_compliance_rate'] * 100 * 0.2 +
-                 (record['csat_score'] / 5 * 100) * 0.2),
-                1
-            )
+        control_records = []
+        for i, record in enumerate(CONTROL_RECORDS):
+            # The fixed fields are kept; the company id and everything else are drawn like any record's
+            control_records.append(self.plan.fill_row(random, self.num_records + i, dict(record)))
             
         return data + control_records
 
-    def generate_data(self):
+    def generate_data(self, vectorized=False):
+        if vectorized:
+            return self.generate_data_vectorized()
+        
         start_date = datetime(2023, 2, 1)  # Starting with fiscal year 2023
         dates = self.generate_dates(start_date)
         companies = self.generate_company_data()
@@ -256,49 +111,320 @@ class QBRDataGenerator:
             record['qbr_quarter'] = f'Q{fiscal_quarter}'
             record['qbr_year'] = fiscal_year
             
-            # Other metrics
-            record['deal_stage'] = random.choice(['Implementation', 'Live', 'At Risk', 'Stable'])
-            record['renewal_probability'] = random.randint(60, 100)
-            record['upsell_opportunity'] = random.choice([0, 5000, 10000, 15000, 20000])
-            
-            record['active_users'] = random.randint(5, 100)
-            record['feature_adoption_rate'] = round(random.uniform(0.4, 0.95), 2)
-            record['custom_integrations'] = random.randint(0, 5)
-            record['pending_feature_requests'] = random.randint(0, 10)
-            
-            record['ticket_volume'] = random.randint(5, 50)
-            record['avg_resolution_time_hours'] = round(random.uniform(1, 48), 1)
-            record['csat_score'] = round(random.uniform(3.5, 5.0), 1)
-            record['sla_compliance_rate'] = round(random.uniform(0.8, 1.0), 2)
-            
-            # Add MEDDICC data
+            # Deal, usage and support metrics, MEDDICC and the health score
+            self.plan.fill_row(random, i, record, ['deal', 'usage', 'support'])
             record.update(self.generate_meddicc_data())
-            
-            # Calculate health score
-            record['health_score'] = round(
-                (record['renewal_probability'] * 0.3 +
-                 record['feature_adoption_rate'] * 100 * 0.3 +
-                 record['sla_compliance_rate'] * 100 * 0.2 +
-                 (record['csat_score'] / 5 * 100) * 0.2),
-                1
-            )
+            self.plan.fill_row(random, i, record, ['calculated'])
             
             data.append(record)
             
         # Add control records
         data = self.add_control_records(data)
+        instrumentation.count('generator.rows', len(data))
         
-        return pd.DataFrame(data)
+        with instrumentation.span('generator.dataframe'):
+            return apply_schema(pd.DataFrame(data))
+
+    def generate_company_columns(self, rng, start_index, size):
+        """Generate the company fields for records start_index..start_index+size as arrays"""
+        index = np.arange(start_index, start_index + size)
+        return self.plan.sample(rng, index, COMPANY_SECTIONS, name_engine=self.name_engine)
+
+    def generate_date_columns(self, rng, start, size):
+        """Walk contract start dates forward 0-3 days per record and derive the fiscal QBR period"""
+        return contract_date_columns(np.datetime64(start, 'D') + np.cumsum(rng.integers(0, 4, size)))
+
+    def generate_metric_columns(self, rng, size, company=None):
+        """Generate the deal, usage, support, MEDDICC and health score fields as arrays, given the company fields"""
+        return self.plan.sample(rng, np.arange(size), METRIC_SECTIONS, given=company)
+
+    def block_streams(self, block_index):
+        """Return independent (dates, values) generators for one block of records"""
+        block_seed = np.random.SeedSequence(self.seed, spawn_key=(block_index,))
+        return [np.random.default_rng(seed) for seed in block_seed.spawn(2)]
+
+    def block_start_dates(self):
+        """Date each block's contract walk starts from, so blocks can be generated independently"""
+        start = np.datetime64('2023-02-01')  # Starting with fiscal year 2023
+        sizes = [
+            min(self.block_size, self.num_records - start_index)
+            for start_index in range(0, self.num_records, self.block_size)
+        ]
+        # Replay only the date increments of each block to find where the next one begins
+        totals = [
+            self.block_streams(block_index)[0].integers(0, 4, size).sum()
+            for block_index, size in enumerate(sizes)
+        ]
+        return start + np.concatenate([[0], np.cumsum(totals, dtype=np.int64)[:-1]])
+
+    def generate_block(self, block_index, start_date):
+        """Generate one block of records as a DataFrame"""
+        start_index = block_index * self.block_size
+        size = min(self.block_size, self.num_records - start_index)
+        date_rng, rng = self.block_streams(block_index)
+        
+        with instrumentation.span('generator.names'):
+            columns = self.generate_company_columns(rng, start_index, size)
+        with instrumentation.span('generator.dates'):
+            columns.update(self.generate_date_columns(date_rng, start_date, size))
+        with instrumentation.span('generator.metrics'):
+            columns.update(self.generate_metric_columns(rng, size, columns))
+        instrumentation.count('generator.rows', size)
+        with instrumentation.span('generator.dataframe'):
+            return pd.DataFrame(columns, columns=QBR_COLUMNS)
+
+    def generate_control_block(self):
+        """Generate the control records as a DataFrame"""
+        # Control records draw from the stream after the last block
+        _, rng = self.block_streams(-(-self.num_records // self.block_size))
+        
+        # Control records keep their fixed fields; the rest is drawn like any other record
+        index = np.arange(self.num_records, self.num_records + len(CONTROL_RECORDS))
+        control = self.plan.sample(rng, index, fixed=self.plan.override_columns(), name_engine=self.name_engine)
+        return apply_schema(pd.DataFrame(control))
+
+    def iter_blocks(self, workers=None):
+        """Yield the generated blocks in order, optionally spreading them over a process pool"""
+        start_dates = self.block_start_dates()
+        if not workers or workers == 1:
+            for block_index, start_date in enumerate(start_dates):
+                yield self.generate_block(block_index, start_date)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of blocks in flight so memory stays flat
+            pending = deque()
+            for block_index, start_date in enumerate(start_dates):
+                pending.append(executor.submit(self.generate_block, block_index, start_date))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def generate_data_vectorized(self, workers=None):
+        """Generate the dataset column-at-a-time with NumPy instead of one dict per record.
+
+        With workers > 1 the blocks are generated in parallel; the result is
+        identical for any number of workers.
+        """
+        blocks = list(self.iter_blocks(workers))
+        blocks.append(self.generate_control_block())
+        return pd.concat(blocks, ignore_index=True)
+
+    def iter_batches(self, batch_size=100000, arrow=False, workers=None):
+        """Yield the vectorized dataset as DataFrames of batch_size rows.
+
+        The contract date walk and the company id sequence carry over from one
+        batch to the next, so only about one batch is held in memory at a time.
+        The control records follow as a final batch. With arrow=True each batch
+        is yielded as a pyarrow.RecordBatch instead.
+        """
+        if arrow:
+            import pyarrow as pa
+        
+        def convert(batch):
+            batch = batch.reset_index(drop=True)
+            if not arrow:
+                return [batch]
+            # A batch that spans two blocks holds chunked Arrow string columns, which
+            # RecordBatch.from_pandas cannot take, so go through a Table and combine them
+            return pa.Table.from_pandas(batch, preserve_index=False).combine_chunks().to_batches()
+        
+        # Re-chunk the fixed-size blocks into batches of the requested size
+        pending = []
+        pending_rows = 0
+        for block in self.iter_blocks(workers):
+            pending.append(block)
+            pending_rows += len(block)
+            while pending_rows >= batch_size:
+                merged = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+                yield from convert(merged.iloc[:batch_size])
+                pending = [merged.iloc[batch_size:]]
+                pending_rows -= batch_size
+        if pending_rows:
+            yield from convert(pd.concat(pending, ignore_index=True))
+        
+        yield from convert(self.generate_control_block())
+
+def write_snapshot(generator, args, options):
+    """Write the initial full load, or the next quarter's delta once a snapshot state exists"""
+    from .snapshots import STATE_FILE, QBRSnapshotGenerator
+    
+    if os.path.exists(os.path.join(args.snapshot_dir, STATE_FILE)):
+        snapshots = QBRSnapshotGenerator.load(args.snapshot_dir)
+        df = snapshots.append_quarter()
+    else:
+        snapshots = QBRSnapshotGenerator.from_generator(generator, workers=args.workers)
+        df = snapshots.accounts
+    
+    name = f'qbr_sample_data_q{snapshots.quarter_index:03d}'
+    output_file = output_path('output', name, args.format, args.partitioned)
+    rows = write_batches([df], output_file, args.format, args.partitioned, **options)
+    snapshots.save(args.snapshot_dir)
+    if args.cube:
+        # Each quarter's delta rows are new account-quarters, so they are added to the existing cube
+        cube = PortfolioCube.load(CUBE_FILE) if os.path.exists(CUBE_FILE) and snapshots.quarter_index else PortfolioCube()
+        cube.add(df).save(CUBE_FILE)
+    print(f"Quarter {snapshots.quarter_index}: {rows} rows have been saved to {output_file}")
+    if args.validate:
+        # Later quarters move qbr_quarter on without restarting the contract
+        rules = [rule for rule in RULES if not (snapshots.quarter_index and rule.name == 'fiscal_period')]
+        print_report(Validator(rules).update(df).report())
+
+def write_relational(generator, args, options):
+    """Write the CRM, Jira and Zendesk source tables plus the QBR_DATA frame aggregated from them"""
+    from .relational import RelationalQBRGenerator, aggregate_qbr_data
+    
+    # The tables have their own schemas; only the aggregate follows QBR_SCHEMA
+    table_options = {key: value for key, value in options.items() if key != 'schema'}
+    directory = os.path.join('output', 'qbr_relational')
+    flat_batches = []
+    for part, tables in enumerate(RelationalQBRGenerator(generator).iter_tables(workers=args.workers)):
+        for name, table in tables.items():
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+            write_batches([table], output_path(os.path.join(directory, name), f'part-{part:05d}', args.format),
+                          args.format, **table_options)
+        flat_batches.append(aggregate_qbr_data(tables))
+    
+    output_file = output_path('output', 'qbr_sample_data', args.format, args.partitioned)
+    rows = write_batches(cube_batches(validated_batches(flat_batches, args), args), output_file, args.format, args.partitioned, **options)
+    print(f"Source tables have been saved to {directory}")
+    print(f"{rows} aggregated rows have been saved to {output_file}")
+
+def cube_batches(batches, args):
+    """The batches, rolled up into the portfolio cube on their way to the writer when --cube is given"""
+    if not args.cube:
+        yield from batches
+        return
+    cube = PortfolioCube()
+    yield from fold(batches, cube)
+    cube.save(CUBE_FILE)
+    print(f"Portfolio cube of {len(cube):,} accounts has been saved to {CUBE_FILE}")
+
+def validated_batches(batches, args):
+    """The batches, checked against the validation rules on their way to the writer when --validate is given"""
+    if not args.validate:
+        yield from batches
+        return
+    validator = Validator()
+    yield from validator.watch(batches)
+    print_report(validator.report())
 
 def main():
-    # Create generator and generate data
-    generator = QBRDataGenerator(num_records=750)
-    df = generator.generate_data()
+    parser = argparse.ArgumentParser(description='Generate synthetic QBR sample data')
+    parser.add_argument('--num-records', type=int, default=750,
+                        help='Number of records to generate (control records are added on top)')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='Use the NumPy column-at-a-time engine (recommended for large datasets)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Generate blocks of records in parallel on this many processes '
+                             '(implies --vectorized; output is identical for any worker count)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Root seed; the same seed always produces the same data')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Stream the vectorized engine to disk in batches of this many rows '
+                             'to keep memory flat regardless of --num-records')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv',
+                        help='Output format (default: csv)')
+    parser.add_argument('--partitioned', action='store_true',
+                        help='Write a directory partitioned by qbr_year/qbr_quarter instead of a single file')
+    parser.add_argument('--compression', default='zstd',
+                        help='Compression codec for parquet/arrow/feather output (default: zstd)')
+    parser.add_argument('--row-group-size', type=int, default=1000000,
+                        help='Maximum rows per Parquet row group (default: 1000000)')
+    parser.add_argument('--snapshot-dir', default=None,
+                        help='Snapshot mode: the first run writes the full initial load and saves the account '
+                             'state here; every later run appends one quarter and writes only the changed rows')
+    parser.add_argument('--relational', action='store_true',
+                        help='Generate event-level CRM, Jira and Zendesk source tables under output/qbr_relational '
+                             'and aggregate them into the QBR_DATA file')
+    parser.add_argument('--cube', action='store_true',
+                        help=f'Also build the portfolio rollup cube and save it to {CUBE_FILE}; in snapshot mode '
+                             'each quarter is added to the saved cube')
+    parser.add_argument('--correlated', action='store_true',
+                        help='Draw renewal probability, adoption, CSAT, SLA compliance, ticket volume and resolution '
+                             'time jointly through a Gaussian copula conditioned on deal stage and size')
+    parser.add_argument('--correlation', default=None,
+                        help='Correlation matrix of those six metrics, in that order, as a .json list of rows or a '
+                             'comma-separated file (implies --correlated)')
+    parser.add_argument('--validate', action='store_true',
+                        help='Check the generated rows against the generator invariants (src/validation.py) '
+                             'and print the violations')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the time spent in each generation stage (dates, names, metrics, DataFrame build, write)')
+    parser.add_argument('--trace-file', default=None,
+                        help='Append every timing span and counter to this JSON-lines file (implies --profile)')
+    parser.add_argument('--metrics-file', default=None,
+                        help='Write stage timings and counters in Prometheus text format to this file (implies --profile)')
+    args = parser.parse_args()
+    
+    if not (args.profile or args.trace_file or args.metrics_file):
+        generate(args)
+        return
+    
+    exporters = [JSONLinesExporter(args.trace_file)] if args.trace_file else []
+    metrics = PrometheusExporter() if args.metrics_file else None
+    instrumentation.enable(*exporters, *[metrics] if metrics else [])
+    try:
+        with instrumentation.span('generator.total'):
+            generate(args)
+    finally:
+        instrumentation.sample_memory('generator')
+        print_profile(instrumentation)
+        if metrics:
+            metrics.write(args.metrics_file)
+        instrumentation.disable()
+
+def print_profile(instrumentation):
+    """Print the aggregated span timings and counters"""
+    print(f"\n{'Stage':<24} {'Calls':>10} {'Total s':>10} {'Mean ms':>10} {'Max ms':>10}")
+    for stats in instrumentation.summary():
+        print(f"{stats['name']:<24} {stats['count']:>10,} {stats['total_seconds']:>10.3f} "
+              f"{stats['mean_seconds'] * 1000:>10.3f} {stats['max_seconds'] * 1000:>10.3f}")
+    for name, total in instrumentation.counters.items():
+        print(f"{name:<24} {total:>10,}")
+    for name, peak in instrumentation.memory.items():
+        print(f"{name + ' peak RSS (MB)':<24} {peak:>10,.1f}")
+
+def generate(args):
+    """Generate and write the dataset selected by the command line arguments"""
+    # Create generator
+    generator = QBRDataGenerator(
+        num_records=args.num_records, seed=args.seed, correlated=args.correlated,
+        correlation=load_correlation(args.correlation) if args.correlation else None
+    )
+    
+    options = {}
+    if args.format != 'csv':
+        options['compression'] = args.compression
+        options['schema'] = arrow_schema()
+    if args.format == 'parquet':
+        options['row_group_size'] = args.row_group_size
+    
+    if args.snapshot_dir:
+        write_snapshot(generator, args, options)
+        return
+    
+    if args.relational:
+        write_relational(generator, args, options)
+        return
+    
+    if args.batch_size:
+        batches = generator.iter_batches(args.batch_size, workers=args.workers)
+    elif args.workers:
+        df = generator.generate_data_vectorized(workers=args.workers)
+        batches = [df]
+    else:
+        df = generator.generate_data(vectorized=args.vectorized)
+        batches = [df]
+    
+    # Save to the selected format
+    output_file = output_path('output', 'qbr_sample_data', args.format, args.partitioned)
+    rows = write_batches(cube_batches(validated_batches(batches, args), args), output_file, args.format, args.partitioned, **options)
+    print(f"{rows} rows have been saved to {output_file}")
     
-    # Save to CSV
-    output_filename = 'qbr_sample_data.csv'
-    df.to_csv(f'output/{output_filename}', index=False)
-    print(f"Data has been saved to output/{output_filename}")
+    if args.batch_size:
+        return
     
     # Display info about the dataset
     print("\nFirst few rows of the dataset:")
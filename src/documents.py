@@ -0,0 +1,254 @@
+"""QBR documents and incremental re-embedding.
+
+render_documents() builds the same qbr_information text as Transformation #1
+in files/transformations.sql, column by column over the whole frame instead of
+row by row. refresh_embeddings() hashes every document, compares the hashes
+with the manifest of the previous run and sends only new or changed documents
+to the embedding backend, so a daily refresh costs in proportion to the
+accounts that changed rather than the size of the portfolio.
+
+An embedding backend is a callable embed(documents) returning one row per
+document: CortexEmbedder calls EMBED_TEXT_768 in Snowflake, HashingEmbedder is
+a deterministic local stand-in for running offline.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .embedding_store import EmbeddingStore
+from .instrumentation import instrumentation
+from .vector_index import embedding_matrix, normalize
+
+# (text before the value, column, text after the value), in the order of Transformation #1
+DOCUMENT_FIELDS = [
+    ('The company name is ', 'company_name', '.'),
+    (' The company ID is ', 'company_id', '.'),
+    (' This is a ', 'size', ' '),
+    ('', 'industry', ' company.'),
+    (' The contract started on ', 'contract_start_date', ''),
+    (' and expires on ', 'contract_expiration_date', '.'),
+    (' The annual contract value is $', 'contract_value', '.'),
+    (' The current deal stage is ', 'deal_stage', '.'),
+    (' The renewal probability is ', 'renewal_probability', '%.'),
+    (' The identified upsell opportunity is $', 'upsell_opportunity', '.'),
+    (' The number of active users is ', 'active_users', '.'),
+    (' The feature adoption rate is ', 'feature_adoption_rate', '%.'),
+    (' The number of custom integrations is ', 'custom_integrations', '.'),
+    (' The number of pending feature requests is ', 'pending_feature_requests', '.'),
+    (' The number of support tickets is ', 'ticket_volume', '.'),
+    (' The average resolution time is ', 'avg_resolution_time_hours', ' hours.'),
+    (' The CSAT score is ', 'csat_score', ' out of 5.'),
+    (' The SLA compliance rate is ', 'sla_compliance_rate', '%.'),
+    (' Success metrics defined: ', 'success_metrics_defined', '.'),
+    (' ROI calculated: ', 'roi_calculated', '.'),
+    (' Estimated ROI value: $', 'estimated_roi_value', '.'),
+    (' Economic buyer identified: ', 'economic_buyer_identified', '.'),
+    (' Executive sponsor engaged: ', 'executive_sponsor_engaged', '.'),
+    (' The decision maker level is ', 'decision_maker_level', '.'),
+    (' Decision process documented: ', 'decision_process_documented', '.'),
+    (' Next steps defined: ', 'next_steps_defined', '.'),
+    (' Decision timeline clear: ', 'decision_timeline_clear', '.'),
+    (' Technical criteria met: ', 'technical_criteria_met', '.'),
+    (' Business criteria met: ', 'business_criteria_met', '.'),
+    (' The success criteria is defined as ', 'success_criteria_defined', '.'),
+    (' The documented pain points are ', 'pain_points_documented', '.'),
+    (' The pain impact level is ', 'pain_impact_level', '.'),
+    (' The urgency level is ', 'urgency_level', '.'),
+    (' Champion identified: ', 'champion_identified', '.'),
+    (' The champion level is ', 'champion_level', '.'),
+    (' The champion engagement score is ', 'champion_engagement_score', ' out of 5.'),
+    (' The competitive situation is ', 'competitive_situation', '.'),
+    (' Our competitive position is ', 'competitive_position', '.'),
+    (' The overall health score is ', 'health_score', '.'),
+    (' This QBR covers ', 'qbr_quarter', ' '),
+    ('', 'qbr_year', '.')
+]
+
+# Rates rendered as ROUND(rate * 100, 1)
+PERCENT_COLUMNS = {'feature_adoption_rate', 'sla_compliance_rate'}
+
+def value_text(column):
+    """Values as an Arrow string array, formatted the way Snowflake's ::STRING renders them and 'unknown' for nulls"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = pa.array(column, from_pandas=True)
+    if pa.types.is_boolean(values.type):
+        text = pc.if_else(values, 'true', 'false')
+    elif pa.types.is_timestamp(values.type) or pa.types.is_date(values.type):
+        text = pc.strftime(values, format='%Y-%m-%d')
+    else:
+        # Arrow, like Snowflake, prints whole floats without a trailing .0
+        text = pc.cast(values, pa.string())
+    return pc.fill_null(text, 'unknown')
+
+def render_documents(df):
+    """qbr_information document of every row of a QBR_DATA frame (lower or upper case column names)"""
+    import pyarrow.compute as pc
+
+    df = df.rename(columns=str.lower)
+    with instrumentation.span('documents.render'):
+        parts = []
+        for before, column, after in DOCUMENT_FIELDS:
+            values = df[column]
+            if column in PERCENT_COLUMNS:
+                values = (values * 100).round(1)
+            parts += [before, value_text(values), after]
+        documents = pc.binary_join_element_wise(*[part for part in parts if len(part)], '')
+    return pd.Series(pd.arrays.ArrowStringArray(documents), index=df.index)
+
+def document_hashes(documents):
+    """64-bit content hash of each document"""
+    return pd.util.hash_pandas_object(documents, index=False).to_numpy()
+
+class DocumentManifest:
+    """Content hash of every embedded document, kept in a Parquet file between runs"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            manifest = pd.read_parquet(path)
+            self.hashes = pd.Series(manifest['CONTENT_HASH'].to_numpy(), index=pd.Index(manifest['DOCUMENT_ID']))
+        else:
+            self.hashes = pd.Series(np.empty(0, dtype=np.uint64), index=pd.Index([], dtype=object))
+
+    def diff(self, ids, hashes):
+        """Positions of new and of changed documents, and the previously embedded ids that are gone"""
+        positions = self.hashes.index.get_indexer(ids)
+        known = positions >= 0
+        previous = self.hashes.to_numpy()[np.where(known, positions, 0)] if len(self.hashes) else hashes
+        new = np.flatnonzero(~known)
+        changed = np.flatnonzero(known & (previous != hashes))
+        removed = self.hashes.index.difference(ids)
+        return new, changed, removed
+
+    def save(self, ids, hashes):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temporary = self.path + '.tmp'
+        pd.DataFrame({'DOCUMENT_ID': ids, 'CONTENT_HASH': hashes}).to_parquet(temporary, index=False)
+        os.replace(temporary, self.path)
+        self.hashes = pd.Series(hashes, index=pd.Index(ids))
+
+class HashingEmbedder:
+    """Deterministic offline stand-in for EMBED_TEXT_768.
+
+    Signed feature hashing of the lower-cased word unigrams and bigrams of each
+    document, so documents sharing more words and values get closer vectors.
+    """
+
+    def __init__(self, dim=768):
+        self.dim = dim
+
+    def __call__(self, documents):
+        documents = pd.Series(list(documents), dtype=object)
+        tokens = documents.str.lower().str.findall(r'[\w.$%-]+').explode().dropna()
+        rows = tokens.index.to_numpy()
+        words = tokens.to_numpy(dtype=object)
+        # A bigram joins each token with the next one of the same document
+        same_document = rows[1:] == rows[:-1]
+        bigrams = words[:-1][same_document] + ' ' + words[1:][same_document]
+        rows = np.concatenate([rows, rows[1:][same_document]])
+        hashes = pd.util.hash_array(np.concatenate([words, bigrams]).astype(object))
+        buckets = (hashes % np.uint64(self.dim)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        vectors = np.bincount(rows * self.dim + buckets, weights=signs, minlength=len(documents) * self.dim)
+        return normalize(vectors.reshape(len(documents), self.dim))
+
+class CortexEmbedder:
+    """Embeds documents with SNOWFLAKE.CORTEX.EMBED_TEXT_768, batch_size documents per query"""
+
+    def __init__(self, session, model='e5-base-v2', batch_size=100):
+        self.session = session
+        self.model = model
+        self.batch_size = batch_size
+
+    def __call__(self, documents):
+        documents = list(documents)
+        vectors = []
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            values = ', '.join(f"({i}, ?)" for i in range(len(batch)))
+            query = (
+                f"SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768(?, COLUMN2) FROM VALUES {values} ORDER BY COLUMN1"
+            )
+            rows = self.session.sql(query, params=[self.model, *batch]).collect()
+            vectors.append(embedding_matrix([row[0] for row in rows]))
+        return np.concatenate(vectors) if vectors else np.empty((0, 768), dtype=np.float32)
+
+def refresh_embeddings(df, manifest, embed, store, key='company_name', batch_size=1000, changed_output=None):
+    """Embed the new and changed documents of df into store and record their hashes in manifest.
+
+    Documents whose ids are no longer in df are removed from the store. With
+    changed_output, the re-embedded documents are also written to that
+    Parquet file, e.g. for a MERGE into QBR_DATA_VECTORS.
+    """
+    documents = render_documents(df)
+    ids = df.rename(columns=str.lower)[key].astype(str).to_numpy(dtype=object)
+    hashes = document_hashes(documents)
+    new, changed, removed = manifest.diff(ids, hashes)
+    pending = np.sort(np.concatenate([new, changed]))
+
+    with instrumentation.span('documents.embed'):
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            store.append(ids[batch], embed(documents.iloc[batch]))
+    store.remove(removed)
+    if changed_output:
+        pd.DataFrame({
+            'COMPANY_NAME': ids[pending], 'QBR_INFORMATION': documents.iloc[pending].to_numpy()
+        }).to_parquet(changed_output, index=False)
+    manifest.save(ids, hashes)
+    instrumentation.count('documents.embedded', len(pending))
+    return {
+        'documents': len(ids), 'new': len(new), 'changed': len(changed),
+        'removed': len(removed), 'unchanged': len(ids) - len(pending)
+    }
+
+def read_frame(path):
+    """QBR_DATA frame from a generated CSV or Parquet file"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    # 'None' is a competitive situation, not a missing value
+    return pd.read_csv(
+        path, parse_dates=['contract_start_date', 'contract_expiration_date'], keep_default_na=False, na_values=['']
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Embed new and changed QBR documents into an embedding store.')
+    parser.add_argument('input', help='Generated QBR data (.csv or .parquet)')
+    parser.add_argument('--store', default='output/qbr_embeddings', help='Embedding store directory')
+    parser.add_argument('--manifest', help='Content hash manifest (default: <store>/documents.parquet)')
+    parser.add_argument('--embedder', choices=['hashing', 'cortex'], default='hashing',
+                        help='Embedding backend (default: hashing, a local stand-in)')
+    parser.add_argument('--connection', default='default',
+                        help='Snowflake connection name for --embedder cortex (default: default)')
+    parser.add_argument('--model', default='e5-base-v2', help='Cortex embedding model (default: e5-base-v2)')
+    parser.add_argument('--quantization', choices=['none', 'int8', 'pq'], default='int8',
+                        help='Quantization of a new store (default: int8)')
+    parser.add_argument('--changed-output', help='Also write the re-embedded documents to this Parquet file')
+    args = parser.parse_args()
+
+    if args.embedder == 'cortex':
+        from .batch import connect
+        embed = CortexEmbedder(connect(args.connection), args.model)
+    else:
+        embed = HashingEmbedder()
+    store = EmbeddingStore(args.store, quantization=args.quantization)
+    manifest = DocumentManifest(args.manifest or os.path.join(args.store, 'documents.parquet'))
+
+    start = time.perf_counter()
+    stats = refresh_embeddings(read_frame(args.input), manifest, embed, store, changed_output=args.changed_output)
+    print(f"{stats['documents']:,} documents: {stats['new']:,} new, {stats['changed']:,} changed, "
+          f"{stats['removed']:,} removed, {stats['unchanged']:,} unchanged "
+          f"({time.perf_counter() - start:.2f} s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""Memory-mapped, append-only store of QBR document embeddings.
+
+Keeps the QBR_DATA_VECTORS embeddings on local disk so a large corpus (many
+quarters of documents) is neither re-pulled from the warehouse nor held in
+memory as float32 rows. Opening a store only reads meta.json and maps the
+files, so cold start is near-instant; searches scan the compact codes
+straight from the mapping and re-rank the best candidates against the
+full-precision vectors, which are only touched for those few rows.
+
+Layout of a store directory:
+    meta.json                  dim, quantization and the number of committed rows
+    vectors.f32                normalized float32 rows, used for re-ranking
+    codes.i8, scales.f32       int8 codes and per-row scales (quantization='int8')
+    codes.pq, codebooks.npy    product-quantization codes and codebooks (quantization='pq')
+    ids.bin, id_ends.u64       utf-8 ids and the end offset of each one
+    superseded.i64             rows replaced by a later append of the same id
+
+Rows are appended, never rewritten; meta.json is updated last, so an append
+interrupted half-way is discarded the next time the store is appended to.
+Compared to float32, int8 codes scan 4x less memory and PQ codes with
+pq_subvectors=dim/4 (the default) 16x less.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .instrumentation import instrumentation
+from .vector_index import normalize
+
+QUANTIZATIONS = ('none', 'int8', 'pq')
+
+# Rows scored per block, bounding the temporaries of a scan
+SCAN_BLOCK = 65536
+
+# Rows decoded at a time within a block; small enough for the decoded rows to stay in cache
+DECODE_BLOCK = 2048
+
+def kmeans(vectors, k, iterations=10, seed=42):
+    """Euclidean k-means centroids of vectors"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=column, minlength=k) for column in vectors.T], axis=1)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+class EmbeddingStore:
+    """Append-only embedding file set searched zero-copy through numpy memory maps"""
+
+    def __init__(self, path, dim=768, quantization='int8', pq_subvectors=None):
+        self.path = path
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        else:
+            if quantization not in QUANTIZATIONS:
+                raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {quantization!r}")
+            pq_subvectors = pq_subvectors or dim // 4
+            if quantization == 'pq' and dim % pq_subvectors:
+                raise ValueError(f"dim {dim} is not divisible by pq_subvectors {pq_subvectors}")
+            meta = {'dim': dim, 'quantization': quantization, 'pq_subvectors': pq_subvectors, 'count': 0}
+            os.makedirs(path, exist_ok=True)
+            self._write_meta(meta)
+        self.dim = meta['dim']
+        self.quantization = meta['quantization']
+        self.pq_subvectors = meta['pq_subvectors']
+        self.count = meta['count']
+        self._positions = None
+        self._maps = None
+        codebooks = self._file('codebooks.npy')
+        self.codebooks = np.load(codebooks) if os.path.exists(codebooks) else None
+        superseded = self._file('superseded.i64')
+        self.superseded = np.fromfile(superseded, dtype=np.int64) if os.path.exists(superseded) else np.empty(0, np.int64)
+
+    def __len__(self):
+        """Number of live (not superseded) embeddings"""
+        return self.count - len(np.unique(self.superseded))
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_meta(self, meta):
+        # Written to a temporary file and renamed, so readers never see a partial meta.json
+        temporary = self._file('meta.json.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._file('meta.json'))
+
+    def _map(self, name, dtype, columns=None):
+        shape = (self.count,) if columns is None else (self.count, columns)
+        if self.count == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode='r', shape=shape)
+
+    @property
+    def maps(self):
+        """Read-only memory maps of the committed rows, opened on first use"""
+        if self._maps is None:
+            maps = {'vectors': self._map('vectors.f32', np.float32, self.dim), 'id_ends': self._map('id_ends.u64', np.uint64)}
+            ids_size = int(maps['id_ends'][-1]) if self.count else 0
+            maps['ids'] = np.memmap(self._file('ids.bin'), dtype=np.uint8, mode='r', shape=(ids_size,)) if ids_size else b''
+            if self.quantization == 'int8':
+                maps['codes'] = self._map('codes.i8', np.int8, self.dim)
+                maps['scales'] = self._map('scales.f32', np.float32)
+            elif self.quantization == 'pq':
+                maps['codes'] = self._map('codes.pq', np.uint8, self.pq_subvectors)
+            self._maps = maps
+        return self._maps
+
+    def id_at(self, row):
+        """Id stored at row"""
+        ends = self.maps['id_ends']
+        start = int(ends[row - 1]) if row else 0
+        return bytes(self.maps['ids'][start:int(ends[row])]).decode('utf-8')
+
+    @property
+    def positions(self):
+        """id -> live row, built on first use by scanning the id file"""
+        if self._positions is None:
+            ends = self.maps['id_ends'].astype(np.int64)
+            data = bytes(self.maps['ids'])
+            starts = np.concatenate([[0], ends[:-1]])
+            # Superseded and removed rows are dead; each live id has exactly one row left
+            dead = set(np.unique(self.superseded).tolist())
+            self._positions = {
+                data[start:end].decode('utf-8'): row
+                for row, (start, end) in enumerate(zip(starts, ends)) if row not in dead
+            }
+        return self._positions
+
+    def vector(self, id_):
+        """Full-precision vector of id_"""
+        return np.array(self.maps['vectors'][self.positions[id_]])
+
+    def quantize(self, vectors):
+        """Codes (and per-row scales for int8) of normalized vectors"""
+        if self.quantization == 'int8':
+            scales = np.abs(vectors).max(axis=1) / 127
+            codes = np.round(vectors / np.where(scales == 0, 1, scales)[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        if self.quantization == 'pq':
+            width = self.dim // self.pq_subvectors
+            half_norms = 0.5 * (self.codebooks ** 2).sum(axis=2)
+            codes = np.empty((len(vectors), self.pq_subvectors), dtype=np.uint8)
+            for start in range(0, len(vectors), DECODE_BLOCK):
+                block = vectors[start:start + DECODE_BLOCK]
+                for j, codebook in enumerate(self.codebooks):
+                    part = block[:, j * width:(j + 1) * width]
+                    codes[start:start + len(block), j] = np.argmax(part @ codebook.T - half_norms[j], axis=1)
+            return codes, None
+        return None, None
+
+    def train(self, vectors, sample_size=16384, seed=42):
+        """Fit the PQ codebooks, one 256-centroid k-means per subvector, on a sample of vectors"""
+        vectors = normalize(vectors)
+        sample = vectors[np.random.default_rng(seed).permutation(len(vectors))[:sample_size]]
+        width = self.dim // self.pq_subvectors
+        self.codebooks = np.stack([
+            kmeans(sample[:, j * width:(j + 1) * width], 256, seed=seed + j) for j in range(self.pq_subvectors)
+        ])
+        np.save(self._file('codebooks.npy'), self.codebooks)
+
+    def _truncate(self):
+        """Drop bytes of an append that was interrupted before meta.json was updated"""
+        ids_size = int(self.maps['id_ends'][-1]) if self.count else 0
+        sizes = {'vectors.f32': 4 * self.dim, 'id_ends.u64': 8, 'codes.i8': self.dim, 'scales.f32': 4, 'codes.pq': self.pq_subvectors}
+        for name, row_size in sizes.items():
+            if os.path.exists(self._file(name)):
+                os.truncate(self._file(name), row_size * self.count)
+        if os.path.exists(self._file('ids.bin')):
+            os.truncate(self._file('ids.bin'), ids_size)
+
+    def _supersede(self, rows):
+        if len(rows):
+            rows = np.asarray(rows, dtype=np.int64)
+            with open(self._file('superseded.i64'), 'ab') as f:
+                f.write(rows.tobytes())
+            self.superseded = np.concatenate([self.superseded, rows])
+
+    def remove(self, ids):
+        """Drop ids from search results; their rows stay in the files"""
+        positions = self.positions
+        self._supersede([positions.pop(str(id_)) for id_ in ids if str(id_) in positions])
+
+    def append(self, ids, vectors):
+        """Append embeddings; an id that is already stored is superseded by its new row"""
+        ids = [str(id_) for id_ in ids]
+        vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        if self.quantization == 'pq' and self.codebooks is None:
+            self.train(vectors)
+        with instrumentation.span('embedding_store.append'):
+            self._truncate()
+            positions = self.positions
+            superseded = []
+            for offset, id_ in enumerate(ids):
+                if id_ in positions:
+                    superseded.append(positions[id_])
+                positions[id_] = self.count + offset
+
+            encoded = [id_.encode('utf-8') for id_ in ids]
+            ids_size = int(self.maps['id_ends'][-1]) if self.count else 0
+            ends = ids_size + np.cumsum([len(id_) for id_ in encoded], dtype=np.uint64)
+            codes, scales = self.quantize(vectors)
+            files = [('vectors.f32', vectors), ('ids.bin', b''.join(encoded)), ('id_ends.u64', ends)]
+            if self.quantization == 'int8':
+                files += [('codes.i8', codes), ('scales.f32', scales)]
+            elif self.quantization == 'pq':
+                files.append(('codes.pq', codes))
+            for name, data in files:
+                with open(self._file(name), 'ab') as f:
+                    f.write(data if isinstance(data, bytes) else np.ascontiguousarray(data).tobytes())
+            self._supersede(superseded)
+
+            self.count += len(ids)
+            self._write_meta({
+                'dim': self.dim, 'quantization': self.quantization, 'pq_subvectors': self.pq_subvectors, 'count': self.count
+            })
+            self._maps = None
+        instrumentation.count('embedding_store.rows', len(ids))
+
+    def _scores(self, query, start, stop):
+        """Approximate (or, unquantized, exact) scores of rows start..stop"""
+        maps = self.maps
+        if self.quantization == 'none':
+            return maps['vectors'][start:stop] @ query
+        scores = np.empty(stop - start, dtype=np.float32)
+        if self.quantization == 'int8':
+            decoded = np.empty((DECODE_BLOCK, self.dim), dtype=np.float32)
+            for offset in range(start, stop, DECODE_BLOCK):
+                codes = maps['codes'][offset:min(offset + DECODE_BLOCK, stop)]
+                np.copyto(decoded[:len(codes)], codes, casting='unsafe')
+                scores[offset - start:offset - start + len(codes)] = decoded[:len(codes)] @ query
+            return scores * maps['scales'][start:stop]
+        # PQ: per-query lookup table of subvector dot products, summed over each row's codes
+        width = self.dim // self.pq_subvectors
+        table = np.einsum('jcw,jw->jc', self.codebooks, query.reshape(self.pq_subvectors, width)).ravel()
+        # Codebooks trained on fewer than 256 vectors have fewer centroids
+        offsets = self.codebooks.shape[1] * np.arange(self.pq_subvectors)
+        for offset in range(start, stop, DECODE_BLOCK):
+            codes = maps['codes'][offset:min(offset + DECODE_BLOCK, stop)]
+            scores[offset - start:offset - start + len(codes)] = np.take(table, codes + offsets).sum(axis=1)
+        return scores
+
+    def search(self, query, k=10, exclude=(), rerank=4):
+        """Top-k (id, cosine similarity) pairs, best first.
+
+        The quantized codes select k * rerank candidates, which are re-scored
+        exactly against the full-precision vectors.
+        """
+        query = normalize(query).astype(np.float32)
+        excluded = [self.positions[id_] for id_ in exclude if id_ in self.positions]
+        dead = np.concatenate([self.superseded, np.asarray(excluded, dtype=np.int64)])
+        candidates = k * (rerank if self.quantization != 'none' else 1)
+        rows = []
+        with instrumentation.span('embedding_store.search', quantization=self.quantization):
+            for start in range(0, self.count, SCAN_BLOCK):
+                stop = min(start + SCAN_BLOCK, self.count)
+                block = self._scores(query, start, stop)
+                block_dead = dead[(dead >= start) & (dead < stop)] - start
+                block[block_dead] = -np.inf
+                live = len(block) - len(np.unique(block_dead))
+                top = np.argpartition(-block, candidates - 1)[:candidates] if live > candidates else np.flatnonzero(block > -np.inf)
+                rows.append(top + start)
+            rows = np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+            scores = np.asarray(self.maps['vectors'][rows] @ query)
+            order = np.argsort(-scores)[:k]
+        return [(self.id_at(int(rows[i])), float(scores[i])) for i in order]
+
+def export_vectors(session, store, batch_size=10000):
+    """Append the QBR_DATA_VECTORS embeddings of a Snowpark session to store, batch by batch"""
+    from .vector_index import embedding_matrix
+    frames = session.sql("SELECT COMPANY_NAME, QBR_EMBEDDINGS FROM QBR_DATA_VECTORS").to_pandas_batches()
+    for frame in frames:
+        for start in range(0, len(frame), batch_size):
+            part = frame.iloc[start:start + batch_size]
+            store.append(part['COMPANY_NAME'], embedding_matrix(part['QBR_EMBEDDINGS']))
+    return len(store)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query a memory-mapped QBR embedding store.')
+    parser.add_argument('path', help='Store directory')
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, default='int8',
+                        help='Codes scanned at search time, for a new store (default: int8)')
+    parser.add_argument('--pq-subvectors', type=int, help='PQ subvectors, for a new store (default: dim / 4)')
+    parser.add_argument('--connection', help='Snowflake connection name; export QBR_DATA_VECTORS into the store')
+    parser.add_argument('--stub', type=int, metavar='N', help='Append synthetic embeddings of N generated companies')
+    parser.add_argument('--query', help='Company whose nearest neighbours to print')
+    parser.add_argument('-k', type=int, default=10, help='Neighbours to print (default: 10)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = EmbeddingStore(args.path, quantization=args.quantization, pq_subvectors=args.pq_subvectors)
+    print(f"Opened {args.path} ({len(store):,} embeddings, {store.quantization}) in {time.perf_counter() - start:.3f} s")
+    if args.connection:
+        from .batch import connect
+        export_vectors(connect(args.connection), store)
+    if args.stub:
+        from .benchmark import stub_session
+        from .documents import HashingEmbedder
+        vectors = stub_session(args.stub).qbr_vectors
+        store.append(vectors['COMPANY_NAME'], HashingEmbedder()(vectors['QBR_INFORMATION']))
+    if args.connection or args.stub:
+        print(f"Store holds {len(store):,} embeddings")
+    if args.query:
+        start = time.perf_counter()
+        neighbours = store.search(store.vector(args.query), args.k, exclude=[args.query])
+        print(f"Searched in {1000 * (time.perf_counter() - start):.1f} ms")
+        for name, score in neighbours:
+            print(f"{score:.4f}  {name}")
+
+if __name__ == '__main__':
+    main()
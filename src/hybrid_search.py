@@ -0,0 +1,142 @@
+"""Hybrid lexical and vector company retrieval.
+
+HybridSearch asks a CompanySearchIndex (trigram name match and BM25 over the
+documents) and a VectorIndex over the document embeddings for candidates at
+the same time, and merges the ranked lists with reciprocal-rank fusion: a
+company scores sum(1 / (rank_constant + rank)) over the lists it appears in, so
+results found by several retrievers rise to the top without having to
+calibrate their scores against each other.
+
+Query embeddings and result lists are kept in LRU caches, so Streamlit reruns
+of the same search cost a dictionary lookup. A HybridSearch instance belongs
+to one snapshot of the data; build a new one when the tables change.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrumentation import instrumentation
+
+# Rank offset of reciprocal-rank fusion; 60 is the value from the original RRF paper
+RANK_CONSTANT = 60
+
+class LRUCache:
+    """Thread-safe least recently used cache with hit/miss counts"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+def reciprocal_rank_fusion(rankings, rank_constant=RANK_CONSTANT):
+    """{id: fused score} of ranked id lists"""
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (rank_constant + rank)
+    return scores
+
+class HybridSearch:
+    """Reciprocal-rank fusion of name, BM25 and embedding retrieval with cached queries and results.
+
+    embed(texts) returns one embedding per text in the space of the vector
+    index, e.g. documents.CortexEmbedder or, offline, documents.HashingEmbedder.
+    """
+
+    def __init__(self, search_index, vector_index, embed, candidates=50, cache_size=256):
+        self.search_index = search_index
+        self.vector_index = vector_index
+        self.embed = embed
+        self.candidates = candidates
+        self.embeddings = LRUCache(cache_size)
+        self.results = LRUCache(cache_size)
+        self._pool = ThreadPoolExecutor(2, thread_name_prefix='hybrid-search')
+
+    def query_embedding(self, query):
+        vector = self.embeddings.get(query)
+        if vector is None:
+            with instrumentation.span('hybrid_search.embed'):
+                vector = self.embed([query])[0]
+            self.embeddings.put(query, vector)
+        return vector
+
+    def lexical(self, query, filters):
+        """Name matches and BM25 matches, each as a ranked list of company names"""
+        names = self.search_index.names
+        with instrumentation.span('hybrid_search.lexical'):
+            rankings = [
+                [names[i] for i, _ in self.search_index.by_name.search(query, self.candidates)],
+                [names[i] for i, _ in self.search_index.by_content.search(query, self.candidates)]
+            ]
+        return [[name for name in ranking if self.matches(name, filters)] for ranking in rankings]
+
+    def semantic(self, query, filters):
+        """Companies ranked by embedding similarity to the query, or nothing when the query cannot be embedded"""
+        try:
+            vector = self.query_embedding(query)
+        except Exception:
+            instrumentation.count('hybrid_search.embed_errors')
+            return []
+        with instrumentation.span('hybrid_search.vector'):
+            return [name for name, _ in self.vector_index.search(vector, self.candidates, filters=filters)]
+
+    def matches(self, name, filters):
+        """Whether the metadata of name satisfies filters (column -> accepted values)"""
+        if not filters:
+            return True
+        row = self.vector_index.positions.get(name)
+        if row is None:
+            return False
+        return all(self.vector_index.metadata[column][row] in values for column, values in filters.items())
+
+    def search(self, query, k=10, filters=None):
+        """Top-k (company name, fused score, retrievers that found it), best first.
+
+        filters maps metadata columns of the vector index to accepted values,
+        e.g. {'INDUSTRY': ['Healthcare']}.
+        """
+        query = ' '.join(query.split())
+        if not query:
+            return []
+        filters = {column: tuple(values) for column, values in (filters or {}).items() if len(values)}
+        key = (query.lower(), k, tuple(sorted(filters.items())))
+        cached = self.results.get(key)
+        if cached is not None:
+            instrumentation.count('hybrid_search.cache_hits')
+            return cached
+
+        with instrumentation.span('hybrid_search.search'):
+            semantic = self._pool.submit(self.semantic, query, filters)
+            rankings = self.lexical(query, filters) + [semantic.result()]
+            sources = {}
+            for source, ranking in zip(['name', 'content', 'vector'], rankings):
+                for name in ranking:
+                    sources.setdefault(name, []).append(source)
+            scores = reciprocal_rank_fusion(rankings)
+            best = sorted(scores, key=scores.get, reverse=True)[:k]
+            results = [(name, scores[name], sources[name]) for name in best]
+        self.results.put(key, results)
+        return results
@@ -0,0 +1,254 @@
+"""Lightweight timing spans, counters and memory samples.
+
+Code is instrumented once with named spans and counters:
+
+    with instrumentation.span('generator.dates'):
+        ...
+    instrumentation.count('writer.rows', len(batch))
+
+While disabled (the default) span() hands back a shared no-op context manager
+and count()/sample_memory() return immediately, so instrumented hot paths cost
+next to nothing. Once enabled, every span, counter increment and memory sample
+is aggregated in memory (summary()) and passed to the registered exporters:
+JSONLinesExporter appends one JSON event per line, PrometheusExporter renders
+the aggregates in the Prometheus text exposition format.
+
+Spans are recorded per process; spans inside worker processes (generate_block
+with --workers) are not collected by the parent.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+class _NullSpan:
+    """Span returned while instrumentation is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, instrumentation, name, labels):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        stack = self.instrumentation._stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        self.instrumentation._stack().pop()
+        self.instrumentation._record(
+            self.name, self.parent, self.wall_start, seconds, exc_type is not None, self.labels
+        )
+        return False
+
+class Instrumentation:
+    """Registry of span timings, counters and memory samples with pluggable exporters"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.exporters = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def enable(self, *exporters):
+        """Start recording, sending events to exporters as well as the in-memory summary"""
+        self.exporters.extend(exporters)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters = []
+
+    def reset(self):
+        """Forget all aggregated spans, counters and memory samples"""
+        with self._lock:
+            self.spans = {}
+            self.counters = {}
+            self.memory = {}
+
+    def span(self, name, **labels):
+        """Context manager timing the enclosed block under name"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def timed(self, name):
+        """Decorator form of span()"""
+        def decorator(function):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Span(self, name, {}):
+                    return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration measured elsewhere (e.g. time to first token) like a finished span"""
+        if not self.enabled:
+            return
+        stack = self._stack()
+        self._record(name, stack[-1] if stack else None, time.time() - seconds, seconds, False, labels)
+
+    def count(self, name, value=1):
+        """Add value to the counter name"""
+        if not self.enabled:
+            return
+        with self._lock:
+            total = self.counters[name] = self.counters.get(name, 0) + value
+        self._export({'type': 'counter', 'name': name, 'value': value, 'total': total, 'time': time.time()})
+
+    def sample_memory(self, name):
+        """Record the peak resident memory of the process so far, in MB"""
+        if not self.enabled or resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_mb = round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+        with self._lock:
+            self.memory[name] = peak_mb
+        self._export({'type': 'memory', 'name': name, 'peak_rss_mb': peak_mb, 'time': time.time()})
+        return peak_mb
+
+    def summary(self):
+        """Aggregated spans as a list of dicts, slowest total first"""
+        with self._lock:
+            spans = [{'name': name, **stats} for name, stats in self.spans.items()]
+        for stats in spans:
+            stats['mean_seconds'] = stats['total_seconds'] / stats['count']
+        return sorted(spans, key=lambda stats: stats['total_seconds'], reverse=True)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name, parent, start, seconds, failed, labels):
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = {'count': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            stats['count'] += 1
+            stats['errors'] += failed
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        self._export({
+            'type': 'span',
+            'name': name,
+            'parent': parent,
+            'start': start,
+            'seconds': seconds,
+            'error': failed,
+            'thread': threading.current_thread().name,
+            **labels
+        })
+
+    def _export(self, event):
+        for exporter in self.exporters:
+            exporter.export(event)
+
+class JSONLinesExporter:
+    """Appends every event to a JSON-lines file"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def export(self, event):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class PrometheusExporter:
+    """Aggregates events and renders them in the Prometheus text exposition format.
+
+    Stands in for a /metrics endpoint: serve render() from a handler, or write()
+    the text to a file for the node exporter's textfile collector.
+    """
+
+    def __init__(self, namespace='qbr'):
+        self.namespace = namespace
+        self.spans = {}
+        self.counters = {}
+        self.memory = {}
+        self._lock = threading.Lock()
+
+    def export(self, event):
+        with self._lock:
+            if event['type'] == 'span':
+                count, total = self.spans.get(event['name'], (0, 0.0))
+                self.spans[event['name']] = (count + 1, total + event['seconds'])
+            elif event['type'] == 'counter':
+                self.counters[event['name']] = event['total']
+            else:
+                self.memory[event['name']] = event['peak_rss_mb']
+
+    def render(self):
+        ns = self.namespace
+        lines = [
+            f'# HELP {ns}_span_seconds Time spent in instrumented spans',
+            f'# TYPE {ns}_span_seconds summary'
+        ]
+        with self._lock:
+            for name, (count, total) in sorted(self.spans.items()):
+                lines.append(f'{ns}_span_seconds_sum{{span="{name}"}} {total:.6f}')
+                lines.append(f'{ns}_span_seconds_count{{span="{name}"}} {count}')
+            for name, total in sorted(self.counters.items()):
+                metric = f"{ns}_{_metric_name(name)}_total"
+                lines += [f'# TYPE {metric} counter', f'{metric} {total}']
+            if self.memory:
+                lines += [
+                    f'# HELP {ns}_peak_rss_megabytes Peak resident memory when sampled',
+                    f'# TYPE {ns}_peak_rss_megabytes gauge'
+                ]
+                for name, peak in sorted(self.memory.items()):
+                    lines.append(f'{ns}_peak_rss_megabytes{{sample="{name}"}} {peak}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Atomically replace path with the current metrics"""
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+    def close(self):
+        pass
+
+def _metric_name(name):
+    return ''.join(character if character.isalnum() else '_' for character in name)
+
+# Shared by the generator, the writers and the app
+instrumentation = Instrumentation(enabled=os.environ.get('QBR_INSTRUMENTATION', '') not in ('', '0'))
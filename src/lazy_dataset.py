@@ -0,0 +1,195 @@
+"""Random-access view of a generated QBR dataset.
+
+LazyQBRDataset never materializes the dataset. Every record's fields are
+derived from a counter-based Philox stream keyed on the record index, so any
+record or slice can be produced directly and always comes out the same for a
+given seed. Contract start dates are a running walk, so they are resolved
+through a prefix-sum index of the date increments per block of records.
+
+The view draws every column from QBR_SPEC, like QBRDataGenerator, through
+the entry's quantile function of the record's random words, and appends the
+same control records. Its values follow the same distributions but differ
+from the generator's for the same seed.
+"""
+import numpy as np
+import pandas as pd
+
+from .data_generator import COMPANY_SECTIONS, CONTROL_RECORDS, METRIC_SECTIONS
+from .names import CompanyNameEngine
+from .schema import QBR_COLUMNS, apply_schema, contract_date_columns
+from .spec import QBR_PLAN
+
+# Entries computed without random words: the company id, its name and formulas of other columns
+WORDLESS_KINDS = ('sequence', 'names', 'formula')
+
+def _record_fields(plan):
+    """The fields that own a random word, in spec order; an entry's default share takes one of its own"""
+    fields = []
+    for column, sampler in plan.samplers.items():
+        if sampler.kind in WORDLESS_KINDS:
+            continue
+        if sampler.default_share is not None:
+            fields.append(f'{column}.default')
+        fields.append(column)
+    return fields
+
+# Each record owns one 64-bit random word per field, in this order
+RECORD_FIELDS = _record_fields(QBR_PLAN)
+FIELD_WORD = {field: i for i, field in enumerate(RECORD_FIELDS)}
+# Philox produces four words per counter step
+COUNTERS_PER_RECORD = -(-len(RECORD_FIELDS) // 4)
+WORDS_PER_RECORD = COUNTERS_PER_RECORD * 4
+
+# Date increments are 0-3 days, so one word holds 32 of them as 2-bit fields
+INCREMENTS_PER_WORD = 32
+HIGH_BITS = np.uint64(0xAAAAAAAAAAAAAAAA)
+LOW_BITS = np.uint64(0x5555555555555555)
+INCREMENT_SHIFTS = np.arange(0, 64, 2, dtype=np.uint64)
+
+START_DATE = np.datetime64('2023-02-01')  # Starting with fiscal year 2023
+
+class LazyQBRDataset:
+    """Lazily generated QBR dataset supporting len(), indexing and slicing.
+
+    dataset[i] returns record i as a dict, dataset[i:j] (or any slice) and
+    dataset.take(indices) return DataFrames in the QBR schema. The control
+    records follow the generated records, as in QBRDataGenerator.
+    """
+
+    def __init__(self, num_records=750, seed=42, block_size=1 << 16):
+        if block_size % (4 * INCREMENTS_PER_WORD):
+            raise ValueError(f'block_size must be a multiple of {4 * INCREMENTS_PER_WORD}')
+        self.num_records = num_records
+        self.seed = seed
+        self.block_size = block_size
+        record_seed, date_seed = np.random.SeedSequence(seed).spawn(2)
+        self._record_key = record_seed.generate_state(2, np.uint64)
+        self._date_key = date_seed.generate_state(2, np.uint64)
+        self._block_offsets = None
+        self.name_engine = CompanyNameEngine(seed)
+
+    def __len__(self):
+        return self.num_records + len(CONTROL_RECORDS)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self._records(start, max(start, stop))
+            return self.take(np.arange(start, stop, step))
+
+        index = int(key)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'record {key} out of range for dataset of {len(self)} records')
+        return self._records(index, index + 1).iloc[0].to_dict()
+
+    def take(self, indices):
+        """Return the records at arbitrary indices, in the order given"""
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError(f'record indices out of range for dataset of {len(self)} records')
+
+        # Generate each run of consecutive indices in one go, then restore the requested order
+        unique = np.unique(indices)
+        if not len(unique):
+            return self._records(0, 0)
+        runs = np.split(unique, np.flatnonzero(np.diff(unique) != 1) + 1)
+        frame = pd.concat([self._records(run[0], run[-1] + 1) for run in runs], ignore_index=True)
+        return frame.iloc[np.searchsorted(unique, indices)].reset_index(drop=True)
+
+    def sample(self, n, seed=None):
+        """Return n distinct records chosen at random"""
+        rng = np.random.default_rng(seed)
+        return self.take(rng.choice(len(self), size=n, replace=False))
+
+    def get_company(self, company_id):
+        """Return the record for a company id such as 'COMP1234567'"""
+        return self[int(company_id.removeprefix('COMP'))]
+
+    def _record_words(self, start, stop):
+        """The random words of records start..stop, one row per record"""
+        bit_generator = np.random.Philox(key=self._record_key, counter=start * COUNTERS_PER_RECORD)
+        return bit_generator.random_raw((stop - start) * WORDS_PER_RECORD).reshape(stop - start, WORDS_PER_RECORD)
+
+    def _date_increments(self, block_index):
+        """The 0-3 day date increments of every record in one block"""
+        first_word = block_index * self.block_size // INCREMENTS_PER_WORD
+        bit_generator = np.random.Philox(key=self._date_key, counter=first_word // 4)
+        words = bit_generator.random_raw(self.block_size // INCREMENTS_PER_WORD)
+        return ((words[:, None] >> INCREMENT_SHIFTS) & np.uint64(3)).ravel().astype(np.int64)
+
+    def block_offsets(self):
+        """Days walked before the first record of each block (the prefix-sum date index)"""
+        if self._block_offsets is None:
+            num_blocks = -(-self.num_records // self.block_size)
+            words_per_block = self.block_size // INCREMENTS_PER_WORD
+            totals = []
+            # Sum the increments of many blocks at a time without unpacking them
+            for first_block in range(0, num_blocks, 256):
+                blocks = min(256, num_blocks - first_block)
+                bit_generator = np.random.Philox(key=self._date_key, counter=first_block * words_per_block // 4)
+                words = bit_generator.random_raw(blocks * words_per_block).reshape(blocks, words_per_block)
+                totals.append(
+                    2 * np.bitwise_count(words & HIGH_BITS).sum(axis=1, dtype=np.int64) +
+                    np.bitwise_count(words & LOW_BITS).sum(axis=1, dtype=np.int64)
+                )
+            totals = np.concatenate(totals) if totals else np.empty(0, dtype=np.int64)
+            self._block_offsets = np.concatenate([[0], np.cumsum(totals)[:-1]]).astype(np.int64)
+        return self._block_offsets
+
+    def _start_dates(self, start, stop):
+        """Contract start dates of generated records start..stop"""
+        offsets = self.block_offsets()
+        dates = []
+        for block_index in range(start // self.block_size, -(-stop // self.block_size)):
+            block_start = block_index * self.block_size
+            walk = offsets[block_index] + np.cumsum(self._date_increments(block_index))
+            dates.append(walk[max(start, block_start) - block_start:min(stop, block_start + self.block_size) - block_start])
+        return START_DATE + np.concatenate(dates)
+
+    def _records(self, start, stop):
+        """Records start..stop as a DataFrame in the QBR schema"""
+        frames = []
+        if start < min(stop, self.num_records):
+            frames.append(self._generated_records(start, min(stop, self.num_records)))
+        if stop > max(start, self.num_records):
+            frames.append(self._control_records(max(start, self.num_records), stop))
+        if not frames:
+            return apply_schema(pd.DataFrame(columns=QBR_COLUMNS))
+        return pd.concat(frames, ignore_index=True)
+
+    def _generated_records(self, start, stop):
+        words = self._record_words(start, stop)
+        index = np.arange(start, stop)
+        columns = _spec_columns(words, COMPANY_SECTIONS, index, name_engine=self.name_engine)
+        columns.update(contract_date_columns(self._start_dates(start, stop)))
+        columns.update(_spec_columns(words, METRIC_SECTIONS, index, columns))
+        return pd.DataFrame(columns, columns=QBR_COLUMNS)
+
+    def _control_records(self, start, stop):
+        records = CONTROL_RECORDS[start - self.num_records:stop - self.num_records]
+        control = {'company_id': [f'COMP{i:04d}' for i in range(start, stop)]}
+        control.update({key: [record[key] for record in records] for key in CONTROL_RECORDS[0]})
+        control.update(_spec_columns(self._record_words(start, stop), METRIC_SECTIONS, np.arange(start, stop)))
+        return apply_schema(pd.DataFrame(control))
+
+def _unit(words, field):
+    """Uniform floats in [0, 1) from the 53 high bits of a field's words"""
+    return (words[:, FIELD_WORD[field]] >> np.uint64(11)) * 2.0 ** -53
+
+def _spec_columns(words, sections, index, columns=None, name_engine=None):
+    """The columns of the QBR_SPEC sections for the records of words (formulas may use those in columns)"""
+    scope = dict(columns or {})
+    drawn = {}
+    for section in sections:
+        for sampler in QBR_PLAN.sections[section]:
+            if sampler.kind in WORDLESS_KINDS:
+                values = sampler.draw(None, scope, index, name_engine)
+            else:
+                default_u = _unit(words, f'{sampler.column}.default') if sampler.default_share is not None else None
+                values = sampler.at(_unit(words, sampler.column), scope, default_u)
+            drawn[sampler.column] = scope[sampler.column] = values
+    return drawn
@@ -0,0 +1,186 @@
+"""Combinatorial company-name synthesis.
+
+Names are "<prefix> [<qualifier>] <core> <suffix>", with core and suffix
+vocabularies per industry and an optional qualifier shared by all of them.
+Record index i is mapped to a name through a seeded affine permutation of the
+prefix x qualifier x core x suffix space (about 6.4 million names per
+industry), so every record gets a
+distinct name in O(1), without tracking the names handed out so far. This
+works the same in sequential, vectorized, sharded and random-access
+generation. Cores never repeat across industries, so names are unique across
+the whole dataset; indices past the size of the name space get a numbered
+variant ("Apex Ridge Cloud Labs 2").
+"""
+import math
+
+import numpy as np
+
+from .schema import INDUSTRIES
+
+NAME_PREFIXES = [
+    'Apex', 'Summit', 'Blue', 'Bright', 'Pioneer', 'Crest', 'North', 'Evergreen',
+    'Granite', 'Harbor', 'Horizon', 'Keystone', 'Liberty', 'Meridian', 'Noble', 'Oak',
+    'Pacific', 'Pinnacle', 'Prime', 'Redwood', 'Silver', 'Sterling', 'True', 'Vanguard',
+    'Atlas', 'Beacon', 'Cardinal', 'Clear', 'Delta', 'Eagle', 'Falcon', 'Frontier',
+    'Golden', 'Highland', 'Iron', 'Lakeside', 'Legacy', 'Metro', 'Nova', 'Orion',
+    'Premier', 'Riverstone', 'Sage', 'Skyline', 'Titan', 'Unity', 'Westbrook', 'Zenith',
+    'Alpine', 'Aurora', 'Bayview', 'Cascade', 'Coastal', 'Copper', 'Crystal', 'Everest',
+    'Fairway', 'Glacier', 'Heritage', 'Ironwood', 'Juniper', 'Magnolia', 'Polaris', 'Sierra'
+]
+
+# Optional second word, between the prefix and the core
+NAME_QUALIFIERS = [
+    'Ridge', 'Valley', 'Point', 'Bay', 'Peak', 'Creek', 'Stone', 'Field',
+    'Gate', 'Bridge', 'Lake', 'River', 'Park', 'Hill', 'Rock', 'Wood',
+    'Star', 'Sun', 'Moon', 'Wave', 'Path', 'Crown', 'Shield', 'Arrow',
+    'Lane', 'Brook', 'Cove', 'Mesa', 'Canyon', 'Forest', 'Meadow', 'Prairie',
+    'Island', 'Vista', 'Haven', 'Crossing', 'Landing', 'Spring', 'Grove', 'Glen',
+    'Hollow', 'Bluff', 'Cliff', 'Dale', 'Fjord', 'Heath', 'Knoll', 'Marsh',
+    'Pine', 'Cedar', 'Maple', 'Birch', 'Willow', 'Aspen', 'Elm', 'Spruce',
+    'Falls', 'Shore', 'Sound', 'Trail', 'Tower', 'Square', 'Compass', 'Anchor'
+]
+
+# Cores must not repeat across industries so generated names never collide
+INDUSTRY_NAME_CORES = {
+    'Technology': [
+        'Cloud', 'Cyber', 'Data', 'Quantum', 'Silicon', 'Binary', 'Network', 'Edge',
+        'Code', 'Byte', 'Pixel', 'Signal', 'Vector', 'Circuit', 'Compute', 'Digital',
+        'Neural', 'Software', 'Logic', 'Stack', 'Kernel', 'Cipher', 'Matrix', 'Packet',
+        'Fiber', 'Server', 'Sensor', 'Robotics', 'Photon', 'Protocol', 'Qubit', 'Algorithm',
+        'Laser', 'Orbit', 'Nano', 'Cortex', 'Syntax', 'Render', 'Socket', 'Script',
+        'Cache', 'Sprite', 'Voxel', 'Tensor', 'Relay', 'Beam', 'Grid', 'Spark'
+    ],
+    'Healthcare': [
+        'Medi', 'Health', 'Care', 'Wellness', 'Vitality', 'Bio', 'Clinic', 'Cardio',
+        'Neuro', 'Pharma', 'Therapy', 'Patient', 'Genome', 'Immuno', 'Ortho', 'Derma',
+        'Pulse', 'Remedy', 'Healing', 'Nursing', 'Diagnostic', 'Rehab', 'Dental', 'Vision',
+        'Lifeline', 'Cure', 'Vaccine', 'Telehealth', 'Surgical', 'Radiology', 'Pediatric', 'Hospice',
+        'Cellular', 'Helix', 'Spine', 'Lumen', 'Aesthetic', 'Hearing', 'Renal', 'Oncology',
+        'Allergy', 'Sleep', 'Hormone', 'Metabolic', 'Plasma', 'Enzyme', 'Marrow', 'Caregiver'
+    ],
+    'Finance': [
+        'Capital', 'Wealth', 'Finance', 'Investment', 'Asset', 'Equity', 'Ledger', 'Credit',
+        'Fund', 'Trust', 'Treasury', 'Savings', 'Portfolio', 'Fiscal', 'Yield', 'Dividend',
+        'Bond', 'Mortgage', 'Lending', 'Banking', 'Payment', 'Insurance', 'Annuity', 'Brokerage',
+        'Exchange', 'Reserve', 'Venture', 'Audit', 'Tax', 'Pension', 'Escrow', 'Clearing',
+        'Vault', 'Sovereign', 'Tally', 'Budget', 'Margin', 'Bullion', 'Actuary', 'Collateral',
+        'Custody', 'Remit', 'Coupon', 'Hedge', 'Liquidity', 'Underwriting', 'Receivables', 'Principal'
+    ],
+    'Manufacturing': [
+        'Industrial', 'Manufacturing', 'Production', 'Factory', 'Assembly', 'Machine', 'Forge', 'Foundry',
+        'Steel', 'Tooling', 'Fabrication', 'Precision', 'Alloy', 'Component', 'Casting', 'Welding',
+        'Plastics', 'Composite', 'Motion', 'Hydraulic', 'Automation', 'Engineering', 'Materials', 'Mill',
+        'Press', 'Gear', 'Turbine', 'Valve', 'Process', 'Metalworks', 'Polymer', 'Molding',
+        'Lathe', 'Rivet', 'Chassis', 'Bearing', 'Forging', 'Extrusion', 'Stamping', 'Boiler',
+        'Conveyor', 'Kiln', 'Smelter', 'Anvil', 'Piston', 'Sheetmetal', 'Coil', 'Crane'
+    ],
+    'Retail': [
+        'Retail', 'Commerce', 'Market', 'Store', 'Shop', 'Outlet', 'Mart', 'Goods',
+        'Bazaar', 'Boutique', 'Merchant', 'Trade', 'Cart', 'Basket', 'Emporium', 'Depot',
+        'Wholesale', 'Supply', 'Apparel', 'Grocer', 'Checkout', 'Shelf', 'Storefront', 'Catalog',
+        'Consumer', 'Brand', 'Fashion', 'Home', 'Gift', 'Mall', 'Pantry', 'Vendor',
+        'Aisle', 'Counter', 'Corner', 'Parcel', 'Bargain', 'Thrift', 'Closet', 'Wardrobe',
+        'Kiosk', 'Galleria', 'Provisions', 'Threads', 'Pavilion', 'Plaza', 'Stall', 'Register'
+    ]
+}
+
+INDUSTRY_NAME_SUFFIXES = {
+    'Technology': [
+        'Systems', 'Labs', 'Technologies', 'Networks', 'Solutions', 'Dynamics', 'Works', 'Analytics',
+        'Innovations', 'Platforms', 'Interactive', 'Computing', 'Security', 'Ventures', 'Group', 'Partners',
+        'Corp', 'Devices', 'Studios', 'Micro', 'Intelligence', 'Automation', 'Hub', 'Tech',
+        'Apps', 'Engines', 'IO', 'Cybernetics', 'Collective', 'Connect', 'Global', 'Research'
+    ],
+    'Healthcare': [
+        'Partners', 'Group', 'Solutions', 'Systems', 'Associates', 'Clinics', 'Labs', 'Sciences',
+        'Services', 'Network', 'Institute', 'Alliance', 'Centers', 'Analytics', 'Innovations', 'Medical',
+        'Therapeutics', 'Diagnostics', 'Pharmaceuticals', 'Biologics', 'Collective', 'Foundation', 'Practice', 'Connect',
+        'Providers', 'Specialists', 'Hospitals', 'Research', 'Lifesciences', 'Outcomes', 'Laboratories', 'Consultants'
+    ],
+    'Finance': [
+        'Partners', 'Group', 'Advisors', 'Holdings', 'Associates', 'Management', 'Securities', 'Financial',
+        'Analytics', 'Direct', 'Solutions', 'Bancorp', 'Markets', 'Services', 'Strategies', 'Consulting',
+        'Planning', 'Global', 'Alliance', 'Systems', 'Logic', 'Core', 'Metrics', 'Focus',
+        'Investors', 'Bank', 'Advisory', 'Brokers', 'Assurance', 'Ventures', 'Funding', 'Fiduciary'
+    ],
+    'Manufacturing': [
+        'Systems', 'Works', 'Industries', 'Solutions', 'Dynamics', 'Technologies', 'Corp', 'Group',
+        'Products', 'Plus', 'Pro', 'Logic', 'Core', 'Edge', 'Analytics', 'Labs',
+        'Company', 'Fabricators', 'Enterprises', 'Partners', 'Supply', 'Equipment', 'Holdings', 'Innovations',
+        'Mfg', 'Machining', 'Metals', 'Machinery', 'Controls', 'Tools', 'Plants', 'Ltd'
+    ],
+    'Retail': [
+        'Solutions', 'Pro', 'Systems', 'Dynamics', 'Logic', 'Focus', 'Analytics', 'Direct',
+        'Plus', 'Core', 'Matrix', 'Group', 'Brands', 'Collective', 'Company', 'Co',
+        'Outfitters', 'Exchange', 'Partners', 'Express', 'Hub', 'Works', 'Traders', 'Networks',
+        'Stores', 'Shops', 'Mercantile', 'Marketplace', 'Trading', 'Retailers', 'Lifestyle', 'Boutiques'
+    ]
+}
+
+class CompanyNameEngine:
+    """Maps (industry, record index) to a company name, one-to-one"""
+
+    def __init__(self, seed=42):
+        # The qualifier is optional: slot 0 leaves it out, the others carry their trailing space
+        qualifiers = [''] + [qualifier + ' ' for qualifier in NAME_QUALIFIERS]
+        self.industry_codes = {industry: code for code, industry in enumerate(INDUSTRIES)}
+        self.prefix_list = NAME_PREFIXES
+        self.qualifier_list = qualifiers
+        self.core_lists = [INDUSTRY_NAME_CORES[industry] for industry in INDUSTRIES]
+        self.suffix_lists = [INDUSTRY_NAME_SUFFIXES[industry] for industry in INDUSTRIES]
+        self.prefixes = np.array(NAME_PREFIXES)
+        self.qualifiers = np.array(qualifiers)
+        # Flattened per-industry vocabularies, indexed by industry code * vocabulary size
+        self.cores = np.array([core for cores in self.core_lists for core in cores])
+        self.suffixes = np.array([suffix for suffixes in self.suffix_lists for suffix in suffixes])
+        self.num_qualifiers = len(qualifiers)
+        self.num_cores = len(self.core_lists[0])
+        self.num_suffixes = len(self.suffix_lists[0])
+        self.capacity = len(self.prefixes) * self.num_qualifiers * self.num_cores * self.num_suffixes
+
+        # One affine permutation k -> (a * k + b) mod capacity per industry
+        rng = np.random.default_rng(seed)
+        multipliers = []
+        while len(multipliers) < len(INDUSTRIES):
+            a = int(rng.integers(1, self.capacity))
+            if math.gcd(a, self.capacity) == 1:
+                multipliers.append(a)
+        self.multipliers = np.array(multipliers, dtype=np.int64)
+        self.offsets = rng.integers(0, self.capacity, len(INDUSTRIES))
+        self.multiplier_list = multipliers
+        self.offset_list = self.offsets.tolist()
+
+    def names(self, industry_codes, indices):
+        """Company names for arrays of industry codes and record indices"""
+        industry_codes = np.asarray(industry_codes, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+        laps, position = np.divmod(indices, self.capacity)
+        position = (self.multipliers[industry_codes] * position + self.offsets[industry_codes]) % self.capacity
+
+        # Mixed-radix digits, the suffix least significant
+        position, suffix = np.divmod(position, self.num_suffixes)
+        position, core = np.divmod(position, self.num_cores)
+        prefix, qualifier = np.divmod(position, self.num_qualifiers)
+        names = np.strings.add(self.prefixes[prefix], ' ')
+        names = np.strings.add(names, self.qualifiers[qualifier])
+        names = np.strings.add(names, self.cores[industry_codes * self.num_cores + core])
+        names = np.strings.add(names, ' ')
+        names = np.strings.add(names, self.suffixes[industry_codes * self.num_suffixes + suffix])
+
+        # Numbered variants once the name space is exhausted
+        if laps.any():
+            names = np.strings.add(names, np.where(laps > 0, np.strings.add(' ', (laps + 1).astype(str)), ''))
+        return names
+
+    def name(self, industry, index):
+        """Company name for a single industry name and record index, the same as names() gives"""
+        # Plain integer arithmetic: the row engine calls this once per record
+        code = self.industry_codes[industry]
+        lap, position = divmod(index, self.capacity)
+        position = (self.multiplier_list[code] * position + self.offset_list[code]) % self.capacity
+        position, suffix = divmod(position, self.num_suffixes)
+        position, core = divmod(position, self.num_cores)
+        prefix, qualifier = divmod(position, self.num_qualifiers)
+        name = (f'{self.prefix_list[prefix]} {self.qualifier_list[qualifier]}'
+                f'{self.core_lists[code][core]} {self.suffix_lists[code][suffix]}')
+        return f'{name} {lap + 1}' if lap else name
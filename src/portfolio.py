@@ -0,0 +1,287 @@
+"""Portfolio rollup cube for manager-level dashboards.
+
+PortfolioCube keeps additive measures (accounts, at-risk accounts, health
+score sum and count, contract value and upsell opportunity totals) for every
+qbr_year x qbr_quarter x industry x size x deal_stage cell in one dense NumPy
+array. Because every measure is a sum, new rows (another batch, or the delta
+rows of a new quarter) are folded in with add() without rescanning any data,
+and rows can be taken out again with remove(). The year axis holds running
+totals, so a range of years is one subtraction; a slice-and-dice query then
+picks the selected members of the other dimensions and sums the axes that are
+not broken down, a few small array reductions regardless of how many accounts
+went into the cube.
+
+The cube is saved as a Parquet table of its non-empty cells, the same shape as
+CUBE_QUERY returns from QBR_DATA, so it can be built by the generator
+(--cube), by this module from generated files, or from the warehouse.
+
+    python3 src/portfolio.py output/qbr_sample_data.parquet --cube output/qbr_portfolio_cube.parquet
+    python3 src/portfolio.py --cube output/qbr_portfolio_cube.parquet --by industry --size Enterprise
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .instrumentation import instrumentation
+from .schema import COMPANY_SIZES, DEAL_STAGES, INDUSTRIES, QBR_QUARTERS
+
+# Dimensions after qbr_year, with their members in axis order
+DIMENSIONS = {
+    'qbr_quarter': QBR_QUARTERS,
+    'industry': INDUSTRIES,
+    'size': COMPANY_SIZES,
+    'deal_stage': DEAL_STAGES
+}
+MEASURES = [
+    'accounts', 'at_risk_accounts', 'health_score_sum', 'health_score_count', 'contract_value', 'upsell_opportunity'
+]
+
+CUBE_FILE = os.path.join('output', 'qbr_portfolio_cube.parquet')
+
+# An account is at risk when its deal stage is At Risk or its health score is below this
+AT_RISK_HEALTH_SCORE = 70
+
+# The cube's cells aggregated in the warehouse, one row per non-empty cell
+CUBE_QUERY = f"""
+    SELECT
+        QBR_YEAR,
+        QBR_QUARTER,
+        INDUSTRY,
+        SIZE,
+        DEAL_STAGE,
+        COUNT(*) AS ACCOUNTS,
+        SUM(CASE WHEN DEAL_STAGE = 'At Risk' OR HEALTH_SCORE < {AT_RISK_HEALTH_SCORE} THEN 1 ELSE 0 END) AS AT_RISK_ACCOUNTS,
+        SUM(HEALTH_SCORE) AS HEALTH_SCORE_SUM,
+        COUNT(HEALTH_SCORE) AS HEALTH_SCORE_COUNT,
+        SUM(CONTRACT_VALUE) AS CONTRACT_VALUE,
+        SUM(UPSELL_OPPORTUNITY) AS UPSELL_OPPORTUNITY
+    FROM QBR_DATA
+    GROUP BY QBR_YEAR, QBR_QUARTER, INDUSTRY, SIZE, DEAL_STAGE
+"""
+
+def _codes(values, members):
+    """Position of every value in members, -1 for values outside it"""
+    if isinstance(values.dtype, pd.CategoricalDtype) and list(values.cat.categories) == list(members):
+        return values.cat.codes.to_numpy()
+    return pd.Categorical(values, categories=members).codes
+
+def row_measures(df):
+    """The cube measures of every row of a QBR_DATA frame (lower or upper case columns), in MEASURES order"""
+    health = df['health_score'].to_numpy(dtype=np.float64, na_value=np.nan)
+    at_risk = (df['deal_stage'] == 'At Risk').to_numpy(dtype=bool) | (health < AT_RISK_HEALTH_SCORE)
+    return [
+        np.ones(len(df)),
+        at_risk.astype(np.float64),
+        np.nan_to_num(health),
+        (~np.isnan(health)).astype(np.float64),
+        df['contract_value'].to_numpy(dtype=np.float64, na_value=0),
+        df['upsell_opportunity'].to_numpy(dtype=np.float64, na_value=0)
+    ]
+
+class PortfolioCube:
+    """Dense rollup of the QBR measures by qbr_year x qbr_quarter x industry x size x deal_stage.
+
+    The year axis is stored as running totals (cumulative[i] sums the years
+    before years[i]), so the measures of any range of years are the difference
+    of two slices.
+    """
+
+    def __init__(self):
+        self.years = np.empty(0, dtype=np.int64)
+        self.cumulative = np.zeros((1, *(len(members) for members in DIMENSIONS.values()), len(MEASURES)))
+
+    def __len__(self):
+        """Number of accounts in the cube"""
+        return int(self.cumulative[-1, ..., 0].sum())
+
+    @property
+    def cells(self):
+        """Measures of every year x member cell"""
+        return np.diff(self.cumulative, axis=0)
+
+    def _year_positions(self, years):
+        """Positions of years on the year axis, growing the axis for years it does not have yet"""
+        years = np.asarray(years, dtype=np.int64)
+        known = np.union1d(self.years, years)
+        if len(known) != len(self.years):
+            if not len(self.years) or known[len(self.years) - 1] == self.years[-1]:
+                # New years after the last one carry the grand total forward
+                added = np.broadcast_to(self.cumulative[-1], (len(known) - len(self.years), *self.cumulative.shape[1:]))
+                self.cumulative = np.concatenate([self.cumulative, added])
+            else:
+                cells = np.zeros((len(known), *self.cumulative.shape[1:]))
+                cells[np.searchsorted(known, self.years)] = self.cells
+                self.cumulative = np.concatenate([self.cumulative[:1], np.cumsum(cells, axis=0)])
+            self.years = known
+        return np.searchsorted(self.years, years)
+
+    def _accumulate(self, years, codes, measures, sign=1.0):
+        valid = np.all([code >= 0 for code in codes], axis=0) if len(years) else np.empty(0, dtype=bool)
+        instrumentation.count('portfolio.unknown_members', int((~valid).sum()))
+        if not valid.any():
+            return
+        positions = self._year_positions(np.asarray(years)[valid])
+        first = positions.min()
+        shape = (len(self.years) - first, *self.cumulative.shape[1:-1])
+        index = np.ravel_multi_index([positions - first, *(code[valid] for code in codes)], shape)
+        # Sum duplicate cells first, then carry the change into the running totals of the touched years onwards
+        cells, inverse = np.unique(index, return_inverse=True)
+        delta = np.zeros((np.prod(shape), len(MEASURES)))
+        for m, values in enumerate(measures):
+            delta[cells, m] = sign * np.bincount(inverse, weights=np.asarray(values)[valid], minlength=len(cells))
+        self.cumulative[first + 1:] += np.cumsum(delta.reshape(*shape, len(MEASURES)), axis=0)
+
+    def add(self, df, sign=1.0):
+        """Fold the rows of a QBR_DATA frame into the cube"""
+        df = df.rename(columns=str.lower)
+        with instrumentation.span('portfolio.add'):
+            codes = [_codes(df[dimension], members) for dimension, members in DIMENSIONS.items()]
+            self._accumulate(df['qbr_year'].to_numpy(), codes, row_measures(df), sign)
+        return self
+
+    def remove(self, df):
+        """Take rows added earlier out of the cube, e.g. the previous version of corrected rows"""
+        return self.add(df, sign=-1.0)
+
+    def add_aggregates(self, cells):
+        """Fold pre-aggregated cells (CUBE_QUERY rows or a saved cube) into the cube"""
+        cells = cells.rename(columns=str.lower)
+        codes = [_codes(cells[dimension], members) for dimension, members in DIMENSIONS.items()]
+        measures = [cells[measure].to_numpy(dtype=np.float64, na_value=0) for measure in MEASURES]
+        self._accumulate(cells['qbr_year'].to_numpy(), codes, measures)
+        return self
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls().add(df)
+
+    @classmethod
+    def from_aggregates(cls, cells):
+        return cls().add_aggregates(cells)
+
+    def aggregates(self):
+        """The non-empty cells as a frame with the CUBE_QUERY columns"""
+        flat = self.cells.reshape(-1, len(MEASURES))
+        cells = np.flatnonzero(flat[:, 0])
+        positions = np.unravel_index(cells, self.cumulative.shape[:-1])
+        frame = pd.DataFrame({'QBR_YEAR': self.years[positions[0]]})
+        for (dimension, members), codes in zip(DIMENSIONS.items(), positions[1:]):
+            frame[dimension.upper()] = pd.Categorical.from_codes(codes, categories=members)
+        for m, measure in enumerate(MEASURES):
+            frame[measure.upper()] = flat[cells, m]
+        return frame
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = path + '.tmp'
+        self.aggregates().to_parquet(temporary, index=False)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_aggregates(pd.read_parquet(path))
+
+    def query(self, filters=None, by=()):
+        """Portfolio measures of the accounts matching filters, one row per combination of the by dimensions.
+
+        filters maps dimensions to accepted members; qbr_year also accepts a
+        (first, last) range. Columns: the by dimensions, accounts,
+        at_risk_accounts, avg_health_score, total_contract_value and
+        total_upsell_opportunity. Combinations without accounts are left out.
+        """
+        filters = {dimension: values for dimension, values in (filters or {}).items() if values is not None}
+        by = list(by)
+        with instrumentation.span('portfolio.query'):
+            selected = filters.get('qbr_year')
+            if selected is not None and not isinstance(selected, tuple):
+                keep = np.flatnonzero(np.isin(self.years, selected))
+                cells = self.cumulative[keep + 1] - self.cumulative[keep]
+                years = self.years[keep]
+                if 'qbr_year' not in by:
+                    cells = cells.sum(axis=0, keepdims=True)
+            else:
+                start, stop = 0, len(self.years)
+                if selected is not None:
+                    start = np.searchsorted(self.years, selected[0], side='left')
+                    stop = max(np.searchsorted(self.years, selected[1], side='right'), start)
+                if 'qbr_year' in by:
+                    cells = np.diff(self.cumulative[start:stop + 1], axis=0)
+                    years = self.years[start:stop]
+                else:
+                    cells = (self.cumulative[stop] - self.cumulative[start])[np.newaxis]
+            if 'qbr_year' not in by:
+                years = np.zeros(1, dtype=np.int64)
+
+            labels = {'qbr_year': years}
+            for axis, (dimension, members) in enumerate(DIMENSIONS.items(), start=1):
+                if dimension in filters:
+                    positions = [members.index(member) for member in filters[dimension] if member in members]
+                    cells = np.take(cells, positions, axis=axis)
+                    labels[dimension] = [members[position] for position in positions]
+                else:
+                    labels[dimension] = list(members)
+
+            dimensions = ['qbr_year', *DIMENSIONS]
+            kept = [dimension for dimension in dimensions if dimension in by]
+            summed = tuple(axis for axis, dimension in enumerate(dimensions) if dimension not in by)
+            totals = cells.sum(axis=summed).reshape(-1, len(MEASURES))
+            index = pd.MultiIndex.from_product([labels[dimension] for dimension in kept], names=kept) if kept else None
+            measures = pd.DataFrame(totals, columns=MEASURES, index=index)
+            result = pd.DataFrame({
+                'accounts': measures['accounts'].astype(np.int64),
+                'at_risk_accounts': measures['at_risk_accounts'].astype(np.int64),
+                'avg_health_score': measures['health_score_sum'] / measures['health_score_count'].where(
+                    measures['health_score_count'] > 0),
+                'total_contract_value': measures['contract_value'],
+                'total_upsell_opportunity': measures['upsell_opportunity']
+            })
+            return result[result['accounts'] > 0].reset_index(drop=not kept)
+
+def fold(batches, cube):
+    """Yield the batches unchanged, adding each to cube first, so the cube is built while the data is written"""
+    for batch in batches:
+        cube.add(batch)
+        yield batch
+
+def main():
+    from .documents import read_frame
+
+    parser = argparse.ArgumentParser(description='Build or update the portfolio rollup cube and query it.')
+    parser.add_argument('inputs', nargs='*', help='Generated QBR data (.csv or .parquet) to add to the cube')
+    parser.add_argument('--cube', default=CUBE_FILE, help=f'Cube file, updated in place (default: {CUBE_FILE})')
+    parser.add_argument('--rebuild', action='store_true', help='Start from an empty cube instead of the saved one')
+    parser.add_argument('--by', nargs='*', default=['industry'], choices=['qbr_year', *DIMENSIONS],
+                        help='Dimensions to break the query down by (default: industry)')
+    for dimension in DIMENSIONS:
+        parser.add_argument(f"--{dimension.replace('_', '-')}", nargs='+', default=None,
+                            help=f'Only these {dimension} members')
+    parser.add_argument('--years', type=int, nargs=2, default=None, metavar=('FIRST', 'LAST'),
+                        help='Only these QBR years')
+    args = parser.parse_args()
+
+    cube = PortfolioCube.load(args.cube) if os.path.exists(args.cube) and not args.rebuild else PortfolioCube()
+    if args.inputs:
+        start = time.perf_counter()
+        for path in args.inputs:
+            cube.add(read_frame(path))
+        cube.save(args.cube)
+        print(f"{len(cube):,} accounts in {args.cube} ({time.perf_counter() - start:.2f} s)")
+
+    filters = {dimension: getattr(args, dimension) for dimension in DIMENSIONS}
+    filters['qbr_year'] = tuple(args.years) if args.years else None
+    start = time.perf_counter()
+    result = cube.query(filters, args.by)
+    elapsed = time.perf_counter() - start
+    print(result.to_string(index=False))
+    print(f"Query took {elapsed * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""Relational multi-source QBR data at event scale.
+
+Instead of pre-aggregated columns, RelationalQBRGenerator emits normalized
+tables linked by company_id, as they would arrive from the CRM, Jira and
+Zendesk connectors:
+
+* accounts          - company and product usage attributes (one row per company)
+* contracts         - deal, renewal and qualitative MEDDICC attributes (one per company)
+* support_tickets   - Zendesk-style tickets with created/resolved timestamps
+* feature_requests  - Jira-style feature request issues
+* meddicc_events    - MEDDICC milestones and champion meetings
+
+Each block of the QBRDataGenerator dataset supplies the per-account rates;
+event counts are then drawn in bulk (Poisson counts per account) and every
+event's timestamp and attributes are drawn as whole arrays. The flat QBR_DATA
+frame is rebuilt from the tables by aggregation (aggregate_qbr_data).
+"""
+import numpy as np
+import pandas as pd
+
+from .schema import apply_schema
+from .spec import calculate_health_score
+
+# Upper bounds per company, so event ids are company index * stride + n
+# without any coordination between blocks
+TICKET_ID_STRIDE = 64
+ISSUE_ID_STRIDE = 32
+EVENT_ID_STRIDE = 16
+
+TICKET_PRIORITIES = ['Low', 'Normal', 'High', 'Urgent']
+ISSUE_STATUSES = ['Open', 'In Progress', 'Done']
+
+# One event per MEDDICC milestone reached; the flag is true when the event exists
+MEDDICC_MILESTONES = [
+    'success_metrics_defined', 'roi_calculated', 'economic_buyer_identified',
+    'executive_sponsor_engaged', 'decision_process_documented', 'next_steps_defined',
+    'decision_timeline_clear', 'technical_criteria_met', 'business_criteria_met',
+    'champion_identified'
+]
+CHAMPION_MEETING = 'champion_meeting'
+MEDDICC_EVENT_TYPES = MEDDICC_MILESTONES + [CHAMPION_MEETING]
+
+ACCOUNT_COLUMNS = [
+    'company_id', 'company_name', 'industry', 'size',
+    'active_users', 'feature_adoption_rate', 'custom_integrations'
+]
+CONTRACT_COLUMNS = [
+    'contract_id', 'company_id', 'contract_value', 'contract_start_date', 'contract_expiration_date',
+    'qbr_quarter', 'qbr_year', 'deal_stage', 'renewal_probability', 'upsell_opportunity', 'estimated_roi_value',
+    'decision_maker_level', 'success_criteria_defined', 'pain_points_documented', 'pain_impact_level',
+    'urgency_level', 'champion_level', 'competitive_situation', 'competitive_position'
+]
+
+# Distinguishes the per-block event streams from the generator's own streams
+RELATIONAL_STREAM = 2
+
+class RelationalQBRGenerator:
+    """Generates the normalized source tables block by block from a QBRDataGenerator"""
+
+    def __init__(self, generator):
+        self.generator = generator
+
+    def iter_tables(self, workers=None):
+        """Yield a dict of table name -> DataFrame for each block of companies, control records last"""
+        num_blocks = 0
+        for block_index, block in enumerate(self.generator.iter_blocks(workers)):
+            yield self.build_tables(block, block_index)
+            num_blocks += 1
+        yield self.build_tables(self.generator.generate_control_block(), num_blocks)
+
+    def generate_tables(self):
+        """All tables, each concatenated into one DataFrame"""
+        tables = {}
+        for block_tables in self.iter_tables():
+            for name, frame in block_tables.items():
+                tables.setdefault(name, []).append(frame)
+        return {name: pd.concat(frames, ignore_index=True) for name, frames in tables.items()}
+
+    def build_tables(self, accounts, block_index):
+        """Sample the event tables for one block of generated accounts"""
+        rng = np.random.default_rng(
+            np.random.SeedSequence(self.generator.seed, spawn_key=(RELATIONAL_STREAM, block_index))
+        )
+        company_index = accounts['company_id'].str.removeprefix('COMP').astype(np.int64).to_numpy()
+        quarter_start, quarter_days = fiscal_quarter_window(
+            accounts['qbr_year'].to_numpy(), accounts['qbr_quarter'].cat.codes.to_numpy()
+        )
+
+        contracts = accounts[CONTRACT_COLUMNS[1:]].copy()
+        contracts.insert(0, 'contract_id', 'CTR' + accounts['company_id'].str.removeprefix('COMP'))
+
+        return {
+            'accounts': accounts[ACCOUNT_COLUMNS].reset_index(drop=True),
+            'contracts': contracts.reset_index(drop=True),
+            'support_tickets': self.sample_tickets(rng, accounts, company_index, quarter_start, quarter_days),
+            'feature_requests': self.sample_feature_requests(rng, accounts, company_index, quarter_start, quarter_days),
+            'meddicc_events': self.sample_meddicc_events(rng, accounts, company_index, quarter_start, quarter_days)
+        }
+
+    def sample_tickets(self, rng, accounts, company_index, quarter_start, quarter_days):
+        """Support tickets opened during each company's QBR quarter"""
+        # Same 5-50 range as the flat ticket_volume column
+        counts = np.clip(rng.poisson(accounts['ticket_volume'].to_numpy()), 5, 50)
+        owner = np.repeat(np.arange(len(accounts)), counts)
+        size = len(owner)
+
+        # Per-ticket resolution times and ratings scatter around the company's averages
+        resolution_hours = np.round(np.clip(
+            accounts['avg_resolution_time_hours'].to_numpy()[owner] * rng.uniform(0.5, 1.5, size), 1, 48
+        ), 1)
+        created_at = _timestamps(rng, quarter_start[owner], quarter_days[owner])
+        return pd.DataFrame({
+            'ticket_id': company_index[owner] * TICKET_ID_STRIDE + _sequence(counts),
+            'company_id': accounts['company_id'].to_numpy()[owner],
+            'created_at': created_at,
+            'resolved_at': created_at + (resolution_hours * 3600).astype('timedelta64[s]'),
+            'resolution_time_hours': resolution_hours,
+            'priority': pd.Categorical.from_codes(
+                rng.choice(len(TICKET_PRIORITIES), size, p=[0.3, 0.4, 0.2, 0.1]), categories=TICKET_PRIORITIES
+            ),
+            'sla_met': rng.random(size) < accounts['sla_compliance_rate'].to_numpy()[owner],
+            'csat_rating': np.clip(
+                np.round(rng.normal(accounts['csat_score'].to_numpy()[owner], 0.6)), 1, 5
+            ).astype(np.int8)
+        })
+
+    def sample_feature_requests(self, rng, accounts, company_index, quarter_start, quarter_days):
+        """Feature request issues; the ones not Done are the pending requests"""
+        pending = np.clip(rng.poisson(accounts['pending_feature_requests'].to_numpy()), 0, 10)
+        done = np.clip(rng.poisson(3, len(accounts)), 0, ISSUE_ID_STRIDE - 1 - pending)
+        counts = pending + done
+        owner = np.repeat(np.arange(len(accounts)), counts)
+        size = len(owner)
+
+        # The first `pending` issues of each company are open or in progress
+        position = _sequence(counts)
+        is_pending = position < pending[owner]
+        status = np.where(is_pending, rng.integers(0, 2, size), ISSUE_STATUSES.index('Done'))
+        return pd.DataFrame({
+            'issue_id': company_index[owner] * ISSUE_ID_STRIDE + position,
+            'company_id': accounts['company_id'].to_numpy()[owner],
+            'created_at': _timestamps(rng, quarter_start[owner] - 180, quarter_days[owner] + 180),
+            'status': pd.Categorical.from_codes(status, categories=ISSUE_STATUSES),
+            'votes': rng.integers(1, 51, size, dtype=np.int16)
+        })
+
+    def sample_meddicc_events(self, rng, accounts, company_index, quarter_start, quarter_days):
+        """One event per MEDDICC milestone reached plus one per champion meeting"""
+        reached = np.column_stack([accounts[milestone].to_numpy() for milestone in MEDDICC_MILESTONES])
+        meetings = accounts['champion_engagement_score'].to_numpy().astype(np.int64)
+
+        milestone_owner, milestone_type = np.nonzero(reached)
+        meeting_owner = np.repeat(np.arange(len(accounts)), meetings)
+        owner = np.concatenate([milestone_owner, meeting_owner])
+        event_type = np.concatenate([milestone_type, np.full(len(meeting_owner), len(MEDDICC_MILESTONES))])
+
+        # Keep each company's events together so ids follow the company
+        order = np.argsort(owner, kind='stable')
+        owner, event_type = owner[order], event_type[order]
+        counts = np.bincount(owner, minlength=len(accounts))
+        return pd.DataFrame({
+            'event_id': company_index[owner] * EVENT_ID_STRIDE + _sequence(counts),
+            'company_id': accounts['company_id'].to_numpy()[owner],
+            'event_type': pd.Categorical.from_codes(event_type, categories=MEDDICC_EVENT_TYPES),
+            'occurred_at': _timestamps(rng, quarter_start[owner], quarter_days[owner])
+        })
+
+def fiscal_quarter_window(qbr_year, quarter_codes):
+    """First day (datetime64[D]) and length in days of each fiscal quarter (Feb 1 - Jan 31 fiscal year)"""
+    # Fiscal Q1 starts in February of the fiscal year
+    months = (qbr_year.astype(np.int64) - 1970) * 12 + 1 + quarter_codes.astype(np.int64) * 3
+    start = months.astype('datetime64[M]')
+    return start.astype('datetime64[D]'), ((start + 3).astype('datetime64[D]') - start.astype('datetime64[D]')).astype(np.int64)
+
+def _sequence(counts):
+    """0..count-1 for each group of a repeated array, e.g. [2, 3] -> [0, 1, 0, 1, 2]"""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+
+def _timestamps(rng, start_days, span_days):
+    """Uniform datetime64[s] timestamps within [start, start + span) days"""
+    seconds = (rng.random(len(start_days)) * span_days * 86400).astype(np.int64)
+    return start_days.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+
+def aggregate_qbr_data(tables):
+    """Rebuild the flat QBR_DATA frame from the relational tables"""
+    accounts = tables['accounts']
+    company_ids = accounts['company_id'].to_numpy()
+    position = pd.Index(company_ids)
+
+    def owner(frame):
+        return position.get_indexer(frame['company_id'])
+
+    size = len(accounts)
+    tickets = tables['support_tickets']
+    ticket_owner = owner(tickets)
+    ticket_volume = np.bincount(ticket_owner, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_resolution = np.bincount(ticket_owner, tickets['resolution_time_hours'], size) / ticket_volume
+        csat = np.bincount(ticket_owner, tickets['csat_rating'].astype(np.float64), size) / ticket_volume
+        sla = np.bincount(ticket_owner, tickets['sla_met'].astype(np.float64), size) / ticket_volume
+
+    issues = tables['feature_requests']
+    pending = np.bincount(owner(issues)[(issues['status'] != 'Done').to_numpy()], minlength=size)
+
+    events = tables['meddicc_events']
+    event_owner = owner(events)
+    event_counts = np.bincount(
+        event_owner * len(MEDDICC_EVENT_TYPES) + events['event_type'].cat.codes.to_numpy(),
+        minlength=size * len(MEDDICC_EVENT_TYPES)
+    ).reshape(size, len(MEDDICC_EVENT_TYPES))
+
+    flat = accounts.merge(tables['contracts'].drop(columns='contract_id'), on='company_id', how='left')
+
+    flat['ticket_volume'] = ticket_volume
+    flat['avg_resolution_time_hours'] = np.round(np.nan_to_num(avg_resolution, nan=1.0), 1)
+    flat['csat_score'] = np.round(np.clip(np.nan_to_num(csat, nan=5.0), 3.5, 5.0), 1)
+    flat['sla_compliance_rate'] = np.round(np.clip(np.nan_to_num(sla, nan=1.0), 0.8, 1.0), 2)
+    flat['pending_feature_requests'] = pending
+    for i, milestone in enumerate(MEDDICC_MILESTONES):
+        flat[milestone] = event_counts[:, i] > 0
+    flat['champion_engagement_score'] = event_counts[:, -1]
+    flat['health_score'] = calculate_health_score(
+        flat['renewal_probability'].to_numpy(),
+        flat['feature_adoption_rate'].to_numpy(),
+        flat['sla_compliance_rate'].to_numpy(),
+        flat['csat_score'].to_numpy()
+    )
+    return apply_schema(flat)
@@ -0,0 +1,119 @@
+"""Column schema of the generated QBR_DATA frame.
+
+Enumerated fields are pandas Categoricals over fixed value pools, integers are
+sized to their value ranges and contract dates are real datetimes. The
+generator builds its frames directly in this schema; writers and validators
+can reuse it.
+"""
+import numpy as np
+import pandas as pd
+
+# Value pools shared by the row-by-row and vectorized generators
+INDUSTRIES = ['Technology', 'Healthcare', 'Finance', 'Manufacturing', 'Retail']
+COMPANY_SIZES = ['Small', 'Medium', 'Enterprise']
+QBR_QUARTERS = ['Q1', 'Q2', 'Q3', 'Q4']
+DEAL_STAGES = ['Implementation', 'Live', 'At Risk', 'Stable']
+UPSELL_OPPORTUNITIES = [0, 5000, 10000, 15000, 20000]
+LEADERSHIP_LEVELS = ['C-Level', 'VP', 'Director', 'Manager']
+SUCCESS_CRITERIA = [
+    'Cost Reduction', 'Revenue Growth', 'Efficiency Gains',
+    'Risk Mitigation', 'Customer Satisfaction', 'Time Savings'
+]
+PAIN_POINTS = [
+    'Manual Processes', 'Data Accuracy', 'Reporting Delays',
+    'Customer Churn', 'Resource Constraints', 'Compliance Risk'
+]
+PRIORITY_LEVELS = ['High', 'Medium', 'Low']
+COMPETITIVE_SITUATIONS = ['Single', 'Multiple', 'None']
+COMPETITIVE_POSITIONS = ['Leader', 'Strong', 'Weak']
+
+# Unique per record, so stored as Arrow-backed strings rather than categories
+STRING = pd.StringDtype('pyarrow')
+# Second resolution keeps the far end of long contract date walks in range
+DATE = np.dtype('datetime64[s]')
+
+QBR_SCHEMA = {
+    # Company Information
+    'company_id': STRING,
+    'company_name': STRING,
+    'industry': pd.CategoricalDtype(INDUSTRIES),
+    'size': pd.CategoricalDtype(COMPANY_SIZES),
+    'contract_value': np.dtype('int32'),
+    'contract_start_date': DATE,
+    'contract_expiration_date': DATE,
+    'qbr_quarter': pd.CategoricalDtype(QBR_QUARTERS),
+    # The date walk of very large datasets runs well past year 32767
+    'qbr_year': np.dtype('int32'),
+
+    # Deal/Financial Data
+    'deal_stage': pd.CategoricalDtype(DEAL_STAGES),
+    'renewal_probability': np.dtype('int8'),
+    'upsell_opportunity': np.dtype('int16'),
+
+    # Product Usage Data
+    'active_users': np.dtype('int8'),
+    'feature_adoption_rate': np.dtype('float64'),
+    'custom_integrations': np.dtype('int8'),
+    'pending_feature_requests': np.dtype('int8'),
+
+    # Support Data
+    'ticket_volume': np.dtype('int8'),
+    'avg_resolution_time_hours': np.dtype('float64'),
+    'csat_score': np.dtype('float64'),
+    'sla_compliance_rate': np.dtype('float64'),
+
+    # MEDDICC Fields
+    'success_metrics_defined': np.dtype('bool'),
+    'roi_calculated': np.dtype('bool'),
+    'estimated_roi_value': np.dtype('int32'),
+    'economic_buyer_identified': np.dtype('bool'),
+    'executive_sponsor_engaged': np.dtype('bool'),
+    'decision_maker_level': pd.CategoricalDtype(LEADERSHIP_LEVELS),
+    'decision_process_documented': np.dtype('bool'),
+    'next_steps_defined': np.dtype('bool'),
+    'decision_timeline_clear': np.dtype('bool'),
+    'technical_criteria_met': np.dtype('bool'),
+    'business_criteria_met': np.dtype('bool'),
+    'success_criteria_defined': pd.CategoricalDtype(SUCCESS_CRITERIA),
+    'pain_points_documented': pd.CategoricalDtype(PAIN_POINTS),
+    'pain_impact_level': pd.CategoricalDtype(PRIORITY_LEVELS),
+    'urgency_level': pd.CategoricalDtype(PRIORITY_LEVELS),
+    'champion_identified': np.dtype('bool'),
+    'champion_level': pd.CategoricalDtype(LEADERSHIP_LEVELS),
+    'champion_engagement_score': np.dtype('int8'),
+    'competitive_situation': pd.CategoricalDtype(COMPETITIVE_SITUATIONS),
+    'competitive_position': pd.CategoricalDtype(COMPETITIVE_POSITIONS),
+
+    # Calculated Metrics
+    'health_score': np.dtype('float64')
+}
+QBR_COLUMNS = list(QBR_SCHEMA)
+
+# Contracts run for a year
+CONTRACT_DAYS = 365
+
+def contract_date_columns(start_dates):
+    """Contract and fiscal QBR period columns for an array of datetime64[D] contract start dates"""
+    # Adjust month for fiscal year (Feb = 1, Jan = 12)
+    month = start_dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    year = start_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    fiscal_month = (month - 2) % 12 + 1
+    fiscal_quarter = (fiscal_month - 1) // 3 + 1
+    
+    return {
+        'contract_start_date': start_dates.astype(QBR_SCHEMA['contract_start_date']),
+        'contract_expiration_date': (start_dates + CONTRACT_DAYS).astype(QBR_SCHEMA['contract_expiration_date']),
+        'qbr_quarter': pd.Categorical.from_codes(fiscal_quarter - 1, dtype=QBR_SCHEMA['qbr_quarter']),
+        'qbr_year': np.where(month >= 2, year, year - 1).astype(QBR_SCHEMA['qbr_year'])
+    }
+
+def apply_schema(df):
+    """Return df with its columns in schema order and cast to their schema dtypes"""
+    return df[QBR_COLUMNS].astype(QBR_SCHEMA)
+
+def arrow_schema():
+    """The schema as a pyarrow.Schema, for writers that need it up front"""
+    import pyarrow as pa
+
+    empty = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in QBR_SCHEMA.items()})
+    return pa.Schema.from_pandas(empty, preserve_index=False).remove_metadata()
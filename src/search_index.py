@@ -0,0 +1,151 @@
+"""In-memory company search over names and QBR documents.
+
+CompanySearchIndex combines two indexes built once over the whole table:
+
+- TrigramIndex over company names, for typo-tolerant name matching: a name
+  scores by the share of the query's character trigrams it contains, so a
+  partial name with a typo ("Higland") still finds the company. Names
+  containing the query verbatim rank first, and equal scores go to the name
+  closest to the query as a whole (trigram Jaccard similarity).
+- BM25Index, an inverted index over the words of the qbr_information
+  documents, ranked with Okapi BM25.
+
+Both are built with Arrow string kernels and stored as CSR posting arrays, so
+a query costs a few array operations instead of a table scan.
+"""
+import numpy as np
+import pandas as pd
+
+def _arrow_strings(values):
+    import pyarrow as pa
+
+    return pa.array(pd.Series(values, dtype=object).fillna(''), type=pa.string())
+
+def _postings(keys, docs):
+    """CSR posting lists: sorted unique keys, offsets into docs, and docs grouped by key"""
+    order = np.argsort(keys, kind='stable')
+    keys, docs = keys[order], docs[order]
+    unique, starts = np.unique(keys, return_index=True)
+    return unique, np.append(starts, len(keys)), docs
+
+def _lookup(unique, offsets, docs, key):
+    position = np.searchsorted(unique, key)
+    if position == len(unique) or unique[position] != key:
+        return docs[:0]
+    return docs[offsets[position]:offsets[position + 1]]
+
+def trigrams(texts):
+    """(text number, trigram code) of every distinct byte trigram of the lower-cased texts padded with spaces"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    padded = pc.binary_join_element_wise('  ', pc.utf8_lower(_arrow_strings(texts)), ' ', '')
+    padded = padded.cast(pa.binary())
+    offsets = np.frombuffer(padded.buffers()[1], dtype=np.int32)[padded.offset:padded.offset + len(padded) + 1]
+    data = np.frombuffer(padded.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]].astype(np.int64)
+    offsets = offsets - offsets[0]
+    owner = np.repeat(np.arange(len(padded)), np.diff(offsets))
+    # A trigram starts at every position at least three bytes before the end of its text
+    starts = np.flatnonzero(np.arange(len(data)) + 3 <= offsets[owner + 1]) if len(data) else np.empty(0, np.int64)
+    codes = (data[starts] << 16) | (data[starts + 1] << 8) | data[starts + 2]
+    pairs = np.unique((owner[starts] << 24) | codes)
+    return pairs >> 24, pairs & 0xFFFFFF
+
+class TrigramIndex:
+    """Fuzzy name lookup by the query trigrams each name contains"""
+
+    def __init__(self, names):
+        self.names = _arrow_strings(names)
+        docs, codes = trigrams(self.names)
+        self.sizes = np.bincount(docs, minlength=len(self.names))
+        self.unique, self.offsets, self.docs = _postings(codes, docs)
+
+    def search(self, query, k=10, min_score=0.5):
+        """Top-k (position, score) of names containing at least min_score of the query's trigrams;
+        verbatim substring matches score 1 + that share. A blank query matches nothing."""
+        import pyarrow.compute as pc
+
+        query = query.strip()
+        if not query:
+            return []
+        _, codes = trigrams([query])
+        matches = [_lookup(self.unique, self.offsets, self.docs, code) for code in codes]
+        shared = np.bincount(np.concatenate(matches), minlength=len(self.names))
+        contains = pc.match_substring(self.names, query, ignore_case=True).to_numpy(zero_copy_only=False)
+        scores = shared / len(codes) + contains
+        hits = np.flatnonzero(scores >= min_score)
+        # Ties (e.g. every name containing the query) go to the names closest to the query as a whole
+        similarity = shared[hits] / np.maximum(len(codes) + self.sizes[hits] - shared[hits], 1)
+        top = hits[np.lexsort((-similarity, -scores[hits]))[:k]]
+        return [(int(i), float(scores[i])) for i in top]
+
+# Stripped from both ends of whitespace-separated words
+PUNCTUATION = '.,:;!?()[]{}"\'$%'
+
+def words(texts):
+    """(text number, word) of every lower-cased word of the texts, as Arrow arrays"""
+    import pyarrow.compute as pc
+
+    split = pc.utf8_split_whitespace(pc.utf8_lower(_arrow_strings(texts)))
+    owner = np.repeat(np.arange(len(split)), np.diff(split.offsets.to_numpy()))
+    flat = pc.utf8_trim(split.flatten(), characters=PUNCTUATION)
+    keep = pc.not_equal(flat, '').to_numpy(zero_copy_only=False)
+    return owner[keep], flat.filter(keep)
+
+class BM25Index:
+    """Okapi BM25 ranking over an inverted index of the documents' words"""
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        import pyarrow.compute as pc
+
+        self.k1 = k1
+        self.b = b
+        count = max(len(documents), 1)
+        owner, tokens = words(documents)
+        encoded = pc.dictionary_encode(tokens)
+        self.vocabulary = {term: i for i, term in enumerate(encoded.dictionary.to_pylist())}
+        terms = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+        self.lengths = np.bincount(owner, minlength=len(documents)).astype(np.float64)
+        self.average_length = self.lengths.mean() if len(documents) else 0.0
+        # Term frequency of every distinct (term, document) pair, grouped by term
+        pairs, frequencies = np.unique(terms * count + owner, return_counts=True)
+        self.offsets = np.searchsorted(pairs // count, np.arange(len(self.vocabulary) + 1))
+        self.docs = pairs % count
+        self.frequencies = frequencies.astype(np.float64)
+        document_frequency = np.diff(self.offsets)
+        self.idf = np.log1p((len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def search(self, query, k=10):
+        """Top-k (position, score) of the documents best matching the words of query"""
+        _, tokens = words([query])
+        scores = np.zeros(len(self.lengths))
+        for token in set(tokens.to_pylist()):
+            term = self.vocabulary.get(token)
+            if term is None:
+                continue
+            postings = slice(self.offsets[term], self.offsets[term + 1])
+            docs, frequencies = self.docs[postings], self.frequencies[postings]
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[docs] / self.average_length)
+            scores[docs] += self.idf[term] * frequencies * (self.k1 + 1) / (frequencies + norm)
+        hits = np.flatnonzero(scores > 0)
+        top = hits[np.argsort(-scores[hits], kind='stable')[:k]]
+        return [(int(i), float(scores[i])) for i in top]
+
+class CompanySearchIndex:
+    """Name and document search over one snapshot of QBR_DATA_VECTORS"""
+
+    def __init__(self, names, documents):
+        self.names = list(names)
+        self.documents = list(documents)
+        self.by_name = TrigramIndex(self.names)
+        self.by_content = BM25Index(self.documents)
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query, k=3):
+        """Top-k (company name, document, match) results: name matches first, then documents ranked by BM25"""
+        results = [(i, 'name') for i, _ in self.by_name.search(query, k)]
+        found = {i for i, _ in results}
+        results += [(i, 'content') for i, _ in self.by_content.search(query, k + len(found)) if i not in found]
+        return [(self.names[i], self.documents[i], match) for i, match in results[:k]]
@@ -0,0 +1,129 @@
+"""Multi-quarter QBR histories with incremental (delta) generation.
+
+QBRSnapshotGenerator starts from a generated QBR_DATA frame (the initial full
+load) and keeps only the latest state of every account. Each append_quarter()
+call moves every account to its next fiscal quarter and evolves the accounts
+that saw activity that quarter: deal stage transitions, renewal probability,
+active users, CSAT and the health score derived from them. Only the rows of
+those accounts are returned, like an incremental sync, so adding a quarter
+costs one quarter's worth of work no matter how long the history is.
+
+The state (latest rows plus quarter counter) can be saved and loaded, so the
+next quarter can be appended in a later run.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .schema import DEAL_STAGES, QBR_QUARTERS, QBR_SCHEMA, apply_schema
+from .spec import calculate_health_score
+
+# Probability of moving from each deal stage (rows) to each deal stage (columns),
+# in DEAL_STAGES order: Implementation, Live, At Risk, Stable
+DEAL_STAGE_TRANSITIONS = np.array([
+    [0.55, 0.35, 0.05, 0.05],
+    [0.00, 0.60, 0.10, 0.30],
+    [0.00, 0.25, 0.55, 0.20],
+    [0.00, 0.10, 0.10, 0.80]
+])
+# Quarterly drift of renewal probability (points) and CSAT by the new deal stage
+RENEWAL_DRIFT = np.array([1.0, 2.0, -8.0, 3.0])
+CSAT_DRIFT = np.array([0.0, 0.05, -0.2, 0.05])
+
+# Distinguishes the per-quarter streams from the generator's per-block streams
+SNAPSHOT_STREAM = 1
+
+STATE_FILE = 'state.json'
+ACCOUNTS_FILE = 'accounts.parquet'
+
+class QBRSnapshotGenerator:
+    """Evolves a QBR dataset quarter over quarter, emitting only changed accounts"""
+
+    def __init__(self, accounts, seed=42, quarter_index=0, activity_rate=0.4):
+        self.accounts = apply_schema(accounts).reset_index(drop=True)
+        self.seed = seed
+        self.quarter_index = quarter_index
+        # Share of accounts with activity (and therefore a delta row) each quarter
+        self.activity_rate = activity_rate
+
+    @classmethod
+    def from_generator(cls, generator, activity_rate=0.4, workers=None):
+        """Start a history from the generator's dataset as the initial full load"""
+        accounts = generator.generate_data_vectorized(workers=workers)
+        return cls(accounts, seed=generator.seed, activity_rate=activity_rate)
+
+    def quarter_rng(self, quarter_index):
+        """Independent generator for one quarter, so replaying a quarter gives the same delta"""
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(SNAPSHOT_STREAM, quarter_index)))
+
+    def append_quarter(self):
+        """Advance every account one fiscal quarter and return the rows of the accounts that changed"""
+        self.quarter_index += 1
+        rng = self.quarter_rng(self.quarter_index)
+        accounts = self.accounts
+
+        # Every account moves on to its next fiscal quarter
+        quarter = accounts['qbr_quarter'].cat.codes.to_numpy() + 1
+        accounts['qbr_year'] = (accounts['qbr_year'].to_numpy() + (quarter == len(QBR_QUARTERS))).astype(
+            QBR_SCHEMA['qbr_year']
+        )
+        accounts['qbr_quarter'] = pd.Categorical.from_codes(quarter % len(QBR_QUARTERS), dtype=QBR_SCHEMA['qbr_quarter'])
+
+        # Only accounts with activity this quarter change
+        changed = np.flatnonzero(rng.random(len(accounts)) < self.activity_rate)
+        size = len(changed)
+        deal_stage = accounts['deal_stage'].cat.codes.to_numpy().copy()
+        renewal = accounts['renewal_probability'].to_numpy().copy()
+        users = accounts['active_users'].to_numpy().copy()
+        csat = accounts['csat_score'].to_numpy().copy()
+        health = accounts['health_score'].to_numpy().copy()
+
+        cumulative = DEAL_STAGE_TRANSITIONS.cumsum(axis=1)
+        stage = (rng.random(size)[:, None] > cumulative[deal_stage[changed]]).sum(axis=1)
+        stage = np.minimum(stage, len(DEAL_STAGES) - 1)
+        deal_stage[changed] = stage
+
+        renewal[changed] = np.clip(np.round(renewal[changed] + RENEWAL_DRIFT[stage] + rng.normal(0, 4, size)), 60, 100)
+        users[changed] = np.clip(np.round(users[changed] * rng.lognormal(0.02, 0.1, size)), 5, 100)
+        csat[changed] = np.round(np.clip(csat[changed] + CSAT_DRIFT[stage] + rng.normal(0, 0.15, size), 3.5, 5.0), 1)
+        health[changed] = calculate_health_score(
+            renewal[changed],
+            accounts['feature_adoption_rate'].to_numpy()[changed],
+            accounts['sla_compliance_rate'].to_numpy()[changed],
+            csat[changed]
+        )
+
+        accounts['deal_stage'] = pd.Categorical.from_codes(deal_stage, dtype=QBR_SCHEMA['deal_stage'])
+        accounts['renewal_probability'] = renewal
+        accounts['active_users'] = users
+        accounts['csat_score'] = csat
+        accounts['health_score'] = health
+
+        return accounts.iloc[changed].reset_index(drop=True)
+
+    def iter_history(self, num_quarters):
+        """Yield the current full state followed by num_quarters quarterly deltas"""
+        yield self.accounts.copy()
+        for _ in range(num_quarters):
+            yield self.append_quarter()
+
+    def save(self, directory):
+        """Persist the latest account state so append_quarter() can continue in a later run"""
+        os.makedirs(directory, exist_ok=True)
+        self.accounts.to_parquet(os.path.join(directory, ACCOUNTS_FILE), index=False, compression='zstd')
+        with open(os.path.join(directory, STATE_FILE), 'w') as f:
+            json.dump({
+                'seed': self.seed,
+                'quarter_index': self.quarter_index,
+                'activity_rate': self.activity_rate
+            }, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Restore a snapshot generator saved with save()"""
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            state = json.load(f)
+        accounts = pd.read_parquet(os.path.join(directory, ACCOUNTS_FILE))
+        return cls(accounts, **state)
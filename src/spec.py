@@ -0,0 +1,631 @@
+"""Declarative column spec of the generated data, compiled into vectorized samplers.
+
+A spec lists, section by section, how every column is drawn:
+
+    choice: [values]           one of the values; 'weights' makes the draw non-uniform
+    integers: [low, high]      uniform integer, both ends included
+    uniform: [low, high]       uniform float; 'round' gives the decimals kept
+    flag: probability          True with this probability
+    sequence: {prefix, width}  the record index, zero-padded after a prefix
+    names: column              a CompanyNameEngine company name for the industry (of INDUSTRIES) in column
+    formula: expression        computed from earlier columns, e.g. the health score; 'round' as above.
+                               Only arithmetic, comparisons, column names, numbers and calls of
+                               the NumPy functions in FORMULA_FUNCTIONS (np.minimum, ...) are allowed
+
+Drawn columns take an optional 'default' for some of the rows: the share in
+'default_share' at random, or the rows where the boolean column named in
+'when' is False. 'dtype' sets the column type when the schema has none. The
+'overrides' are extra records with fixed fields (the control records); their
+other columns are drawn like any record's.
+
+'copulas' draw groups of numeric columns jointly instead of independently. A
+Gaussian copula takes a correlation matrix over its columns and, for each
+'given' category column, shifts of the latent normal means per category (in
+standard deviations, one per column). One batched multivariate normal draw,
+z = standard_normal((n, k)) @ cholesky(correlation).T + shifts, is mapped
+through the normal CDF to uniforms and then through each column's own entry,
+so ranges and rounding stay as declared.
+
+SamplingPlan compiles a spec once. sample() draws whole columns for a batch of
+records with NumPy; fill_row() draws one record with the random module, for
+the row-by-row generator. Both draw the columns in spec order, so a batch
+depends only on the spec, the seed and the record indices. Specs can be kept
+in a JSON or YAML file (the latter needs PyYAML):
+
+    python3 src/spec.py customer_spec.yaml --num-records 10000000 --output output/customer.parquet
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .instrumentation import instrumentation
+from .schema import (
+    STRING, QBR_SCHEMA, INDUSTRIES, COMPANY_SIZES, DEAL_STAGES, UPSELL_OPPORTUNITIES, LEADERSHIP_LEVELS,
+    SUCCESS_CRITERIA, PAIN_POINTS, PRIORITY_LEVELS, COMPETITIVE_SITUATIONS, COMPETITIVE_POSITIONS
+)
+
+KINDS = ['choice', 'integers', 'uniform', 'flag', 'sequence', 'names', 'formula']
+
+# What a formula may contain. Specs can come from files, so anything else (attribute access,
+# subscripts, lambdas, other calls) is rejected before the formula is compiled
+FORMULA_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE
+)
+FORMULA_FUNCTIONS = {
+    'abs', 'ceil', 'clip', 'exp', 'floor', 'log', 'maximum', 'minimum', 'round', 'sqrt', 'where'
+}
+
+# The contract dates and fiscal QBR period are not in the spec: they come from
+# the generator's date walk, which runs on its own random stream
+QBR_SPEC = {
+    'sections': {
+        'company': {
+            'company_id': {'sequence': {'prefix': 'COMP', 'width': 4}},
+            'industry': {'choice': INDUSTRIES},
+            'company_name': {'names': 'industry'},
+            'size': {'choice': COMPANY_SIZES},
+            'contract_value': {'integers': [10000, 100000]}
+        },
+        'deal': {
+            'deal_stage': {'choice': DEAL_STAGES},
+            'renewal_probability': {'integers': [60, 100]},
+            'upsell_opportunity': {'choice': UPSELL_OPPORTUNITIES}
+        },
+        'usage': {
+            'active_users': {'integers': [5, 100]},
+            'feature_adoption_rate': {'uniform': [0.4, 0.95], 'round': 2},
+            'custom_integrations': {'integers': [0, 5]},
+            'pending_feature_requests': {'integers': [0, 10]}
+        },
+        'support': {
+            'ticket_volume': {'integers': [5, 50]},
+            'avg_resolution_time_hours': {'uniform': [1, 48], 'round': 1},
+            'csat_score': {'uniform': [3.5, 5.0], 'round': 1},
+            'sla_compliance_rate': {'uniform': [0.8, 1.0], 'round': 2}
+        },
+        'meddicc': {
+            # Metrics
+            'success_metrics_defined': {'flag': 0.5},
+            'roi_calculated': {'flag': 0.5},
+            'estimated_roi_value': {'integers': [50000, 500000], 'default': 0, 'default_share': 0.3},
+
+            # Economic Buyer
+            'economic_buyer_identified': {'flag': 0.5},
+            'executive_sponsor_engaged': {'flag': 0.5},
+            'decision_maker_level': {'choice': LEADERSHIP_LEVELS},
+
+            # Decision Process
+            'decision_process_documented': {'flag': 0.5},
+            'next_steps_defined': {'flag': 0.5},
+            'decision_timeline_clear': {'flag': 0.5},
+
+            # Decision Criteria
+            'technical_criteria_met': {'flag': 0.5},
+            'business_criteria_met': {'flag': 0.5},
+            'success_criteria_defined': {'choice': SUCCESS_CRITERIA},
+
+            # Identified Pain
+            'pain_points_documented': {'choice': PAIN_POINTS},
+            'pain_impact_level': {'choice': PRIORITY_LEVELS},
+            'urgency_level': {'choice': PRIORITY_LEVELS},
+
+            # Champion
+            'champion_identified': {'flag': 0.5},
+            'champion_level': {'choice': LEADERSHIP_LEVELS},
+            'champion_engagement_score': {'integers': [1, 5]},
+
+            # Competition
+            'competitive_situation': {'choice': COMPETITIVE_SITUATIONS},
+            'competitive_position': {'choice': COMPETITIVE_POSITIONS}
+        },
+        'calculated': {
+            'health_score': {
+                'formula': 'renewal_probability * 0.3 + feature_adoption_rate * 100 * 0.3 + '
+                           'sla_compliance_rate * 100 * 0.2 + (csat_score / 5 * 100) * 0.2',
+                'round': 1
+            }
+        }
+    },
+    # The control records; company ids continue after the generated records
+    'overrides': [
+        {
+            'company_name': name,
+            'industry': 'Technology',
+            'size': 'Small',
+            'contract_value': contract_value,
+            'contract_start_date': '2024-02-01',
+            'contract_expiration_date': '2025-01-31',
+            'qbr_quarter': 'Q4',
+            'qbr_year': 2024
+        }
+        for name, contract_value in [
+            ('Kohlleffel Inc', 150000),
+            ('Hrncir Inc', 160000),
+            ('Millman Inc', 170000),
+            ('Tony Kelly Inc', 180000),
+            ('Kai Lee Inc', 190000)
+        ]
+    ]
+}
+
+# Correlated metrics: healthy accounts renew, adopt and rate support well
+# together, while ticket volume and resolution time move against them. At Risk
+# accounts sit low on the first four and high on the last two.
+QBR_COPULA = {
+    'columns': [
+        'renewal_probability', 'feature_adoption_rate', 'csat_score', 'sla_compliance_rate',
+        'ticket_volume', 'avg_resolution_time_hours'
+    ],
+    'correlation': [
+        [1.0, 0.5, 0.6, 0.4, -0.3, -0.4],
+        [0.5, 1.0, 0.4, 0.3, -0.2, -0.2],
+        [0.6, 0.4, 1.0, 0.5, -0.4, -0.6],
+        [0.4, 0.3, 0.5, 1.0, -0.3, -0.7],
+        [-0.3, -0.2, -0.4, -0.3, 1.0, 0.4],
+        [-0.4, -0.2, -0.6, -0.7, 0.4, 1.0]
+    ],
+    'given': {
+        'deal_stage': {
+            'Implementation': [-0.2, -0.6, 0.0, 0.0, 0.4, 0.2],
+            'Live': [0.2, 0.2, 0.2, 0.1, 0.0, 0.0],
+            'At Risk': [-1.2, -0.8, -1.0, -0.6, 0.8, 0.8],
+            'Stable': [0.6, 0.5, 0.5, 0.4, -0.3, -0.3]
+        },
+        'size': {
+            'Small': [0.0, 0.0, 0.0, 0.0, -0.5, -0.2],
+            'Enterprise': [0.2, 0.1, 0.0, 0.2, 0.6, 0.2]
+        }
+    }
+}
+
+def correlated_spec(correlation=None, spec=QBR_SPEC, copula=QBR_COPULA):
+    """spec with its metrics drawn through copula, optionally with another correlation matrix"""
+    if correlation is not None:
+        copula = {**copula, 'correlation': np.asarray(correlation, dtype=float).tolist()}
+    return {**spec, 'copulas': [*spec.get('copulas', []), copula]}
+
+def _normal_cdf(z):
+    """Standard normal CDF through the Abramowitz-Stegun 7.1.26 erf approximation (error below 1.5e-7)"""
+    x = np.abs(z) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * x)
+    polynomial = t * 1.061405429
+    for coefficient in (-1.453152027, 1.421413741, -0.284496736, 0.254829592):
+        polynomial += coefficient
+        polynomial *= t
+    np.square(x, out=x)
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    polynomial *= x
+    np.subtract(1, polynomial, out=polynomial)
+    np.copysign(polynomial, z, out=polynomial)
+    polynomial += 1
+    polynomial *= 0.5
+    return polynomial
+
+def _parse_formula(formula, column):
+    """The checked syntax tree of a formula entry"""
+    tree = ast.parse(formula, f'<spec {column}>', 'eval')
+    # np.<function>(...) calls, whose np and attribute nodes are allowed only there
+    calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call)]
+    for call in calls:
+        function = call.func
+        if not (isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name)
+                and function.value.id == 'np' and function.attr in FORMULA_FUNCTIONS and not call.keywords):
+            raise ValueError(f"Spec entry '{column}' calls {ast.unparse(function)}; formulas may only call "
+                             f"np.{', np.'.join(sorted(FORMULA_FUNCTIONS))} with positional arguments")
+    functions = {id(node) for call in calls for node in (call, call.func, call.func.value, call.func.ctx)}
+    for node in ast.walk(tree):
+        if id(node) in functions:
+            continue
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError(f"Spec entry '{column}' has the constant {node.value!r}; formulas only take numbers")
+        if isinstance(node, ast.Name) and node.id == 'np':
+            raise ValueError(f"Spec entry '{column}' uses np other than to call one of its functions")
+        if not isinstance(node, FORMULA_NODES):
+            raise ValueError(f"Spec entry '{column}' has {type(node).__name__} syntax, which formulas do not allow")
+    return tree
+
+def _default_dtype(kind, entry):
+    if kind == 'choice':
+        values = entry['choice']
+        if all(isinstance(value, str) for value in values):
+            return pd.CategoricalDtype(values)
+        return np.asarray(values).dtype
+    if kind in ('sequence', 'names'):
+        return STRING
+    return np.dtype({'integers': 'int64', 'flag': 'bool'}.get(kind, 'float64'))
+
+def _typed(values, dtype):
+    """values as an array of dtype, without copying when it already is one"""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return values if isinstance(values, pd.Categorical) else pd.Categorical(values, dtype=dtype)
+    if isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return pd.array(values, dtype=dtype)
+    return np.asarray(values).astype(dtype, copy=False)
+
+class ColumnSampler:
+    """One compiled spec entry: draw(rng, columns, index) for a batch, draw_one(rand, record, index) for one record"""
+
+    def __init__(self, column, entry, dtype=None):
+        kinds = [kind for kind in KINDS if kind in entry]
+        if len(kinds) != 1:
+            raise ValueError(f"Spec entry '{column}' needs exactly one of {', '.join(KINDS)}, got {sorted(entry)}")
+        self.column = column
+        self.kind = kinds[0]
+        self.entry = entry
+        if dtype is None:
+            dtype = np.dtype(entry['dtype']) if 'dtype' in entry else _default_dtype(self.kind, entry)
+        self.dtype = dtype
+        self.decimals = entry.get('round')
+        self.default = entry.get('default')
+        self.default_share = entry.get('default_share')
+        self.when = entry.get('when')
+        self.depends = [self.when] if self.when else []
+
+        if self.kind == 'choice':
+            self.values = list(entry['choice'])
+            weights = entry.get('weights')
+            self.weights = None if weights is None else np.asarray(weights, dtype=float) / np.sum(weights)
+            if isinstance(self.dtype, pd.CategoricalDtype):
+                # Draws index the spec's values; the column stores codes of the dtype's categories
+                self.codes = self.dtype.categories.get_indexer(self.values)
+                if (self.codes < 0).any():
+                    raise ValueError(f"Spec entry '{column}' has values outside the column's categories")
+            else:
+                self.lookup = np.asarray(self.values, dtype=self.dtype)
+        elif self.kind in ('integers', 'uniform'):
+            self.low, self.high = entry[self.kind]
+        elif self.kind == 'flag':
+            self.probability = entry['flag']
+        elif self.kind == 'sequence':
+            self.prefix = entry['sequence'].get('prefix', '')
+            self.width = entry['sequence'].get('width', 0)
+        elif self.kind == 'names':
+            self.depends.append(entry['names'])
+        elif self.kind == 'formula':
+            tree = _parse_formula(entry['formula'], column)
+            self.code = compile(tree, f'<spec {column}>', 'eval')
+            self.depends.extend(sorted({node.id for node in ast.walk(tree) if isinstance(node, ast.Name)} - {'np'}))
+        self.draw_one = self._row_sampler()
+
+    def draw(self, rng, columns, index, name_engine=None):
+        size = len(index)
+        if self.when:
+            keep = np.asarray(columns[self.when], dtype=bool)
+        elif self.default_share is not None:
+            keep = rng.random(size) > self.default_share
+        else:
+            return _typed(self._draw(rng, columns, index, name_engine), self.dtype)
+        return _typed(np.where(keep, self._draw(rng, columns, index, name_engine), self.default), self.dtype)
+
+    def _draw(self, rng, columns, index, name_engine):
+        size = len(index)
+        if self.kind == 'choice':
+            drawn = (
+                rng.integers(0, len(self.values), size) if self.weights is None
+                else rng.choice(len(self.values), size, p=self.weights)
+            )
+            if isinstance(self.dtype, pd.CategoricalDtype):
+                return pd.Categorical.from_codes(self.codes[drawn], dtype=self.dtype)
+            return self.lookup[drawn]
+        if self.kind == 'integers':
+            return rng.integers(self.low, self.high + 1, size, dtype=self.dtype)
+        if self.kind == 'uniform':
+            values = rng.uniform(self.low, self.high, size)
+            return values if self.decimals is None else np.round(values, self.decimals)
+        if self.kind == 'flag':
+            return rng.random(size) < self.probability
+        if self.kind == 'sequence':
+            return np.strings.add(self.prefix, np.strings.zfill(np.asarray(index).astype(str), self.width))
+        if self.kind == 'names':
+            industries = columns[self.entry['names']]
+            if not (isinstance(industries, pd.Categorical) and list(industries.categories) == INDUSTRIES):
+                industries = pd.Categorical(industries, categories=INDUSTRIES)
+            return name_engine.names(industries.codes, np.asarray(index))
+        values = eval(self.code, {'__builtins__': {}, 'np': np}, columns)
+        return values if self.decimals is None else np.round(values, self.decimals)
+
+    def quantile(self, u):
+        """Values of this entry at the uniforms u in [0, 1): its inverse CDF, for copula draws"""
+        u = np.clip(u, 0, np.nextafter(1, 0))
+        if self.kind == 'integers':
+            return _typed(self.low + (u * (self.high - self.low + 1)).astype(np.int64), self.dtype)
+        if self.kind == 'uniform':
+            values = self.low + u * (self.high - self.low)
+            return values if self.decimals is None else np.round(values, self.decimals)
+        if self.kind == 'flag':
+            return u >= 1 - self.probability
+        if self.kind == 'choice':
+            if self.weights is None:
+                drawn = (u * len(self.values)).astype(np.int64)
+            else:
+                drawn = np.minimum(np.searchsorted(np.cumsum(self.weights), u, side='right'), len(self.values) - 1)
+            if isinstance(self.dtype, pd.CategoricalDtype):
+                return pd.Categorical.from_codes(self.codes[drawn], dtype=self.dtype)
+            return self.lookup[drawn]
+        raise ValueError(f"Spec entry '{self.column}' ({self.kind}) cannot be drawn through a copula")
+
+    def at(self, u, columns, default_u=None):
+        """Values of this entry at the uniforms u, with the default where the 'when' column is False
+        or where default_u (more uniforms) falls within 'default_share'; for draws from other streams"""
+        values = self.quantile(u)
+        if self.when:
+            values = np.where(np.asarray(columns[self.when], dtype=bool), values, self.default)
+        elif self.default_share is not None:
+            values = np.where(default_u > self.default_share, values, self.default)
+        return _typed(values, self.dtype)
+
+    def _row_sampler(self):
+        """draw_one for this entry, specialized once so that a row costs one call per field"""
+        if self.kind == 'choice':
+            values, weights = self.values, self.weights
+            if weights is None:
+                draw = lambda rand, record, index, name_engine: rand.choice(values)
+            else:
+                draw = lambda rand, record, index, name_engine: rand.choices(values, weights)[0]
+        elif self.kind == 'integers':
+            low, high = self.low, self.high
+            draw = lambda rand, record, index, name_engine: rand.randint(low, high)
+        elif self.kind == 'uniform':
+            low, high, decimals = self.low, self.high, self.decimals
+            if decimals is None:
+                draw = lambda rand, record, index, name_engine: rand.uniform(low, high)
+            else:
+                draw = lambda rand, record, index, name_engine: round(rand.uniform(low, high), decimals)
+        elif self.kind == 'flag':
+            probability = self.probability
+            draw = lambda rand, record, index, name_engine: rand.random() < probability
+        elif self.kind == 'sequence':
+            template = f'{self.prefix}{{:0{self.width}d}}'
+            draw = lambda rand, record, index, name_engine: template.format(index)
+        elif self.kind == 'names':
+            source = self.entry['names']
+            draw = lambda rand, record, index, name_engine: name_engine.name(record[source], index)
+        else:
+            code, decimals, scope = self.code, self.decimals, {'__builtins__': {}, 'np': np}
+            if decimals is None:
+                draw = lambda rand, record, index, name_engine: eval(code, scope, record)
+            else:
+                draw = lambda rand, record, index, name_engine: round(eval(code, scope, record), decimals)
+
+        default, when, share = self.default, self.when, self.default_share
+        if when:
+            return lambda rand, record, index, name_engine: (
+                draw(rand, record, index, name_engine) if record[when] else default
+            )
+        if share is not None:
+            return lambda rand, record, index, name_engine: (
+                draw(rand, record, index, name_engine) if rand.random() > share else default
+            )
+        return draw
+
+class GaussianCopula:
+    """Joint draw of some columns: correlated normals, shifted per given category, through each column's quantile"""
+
+    def __init__(self, spec, samplers, schema):
+        self.columns = list(spec['columns'])
+        missing = [column for column in self.columns if column not in samplers]
+        if missing:
+            raise ValueError(f"Copula columns {', '.join(missing)} have no spec entry")
+        self.samplers = [samplers[column] for column in self.columns]
+        for sampler in self.samplers:
+            if sampler.kind not in ('integers', 'uniform', 'flag', 'choice') or sampler.when or sampler.default_share:
+                raise ValueError(f"Spec entry '{sampler.column}' cannot be drawn through a copula")
+        correlation = np.asarray(spec['correlation'], dtype=float)
+        if correlation.shape != (len(self.columns), len(self.columns)):
+            raise ValueError(f"The correlation matrix must be {len(self.columns)} x {len(self.columns)}, "
+                             f"one row and column per copula column")
+        if not np.allclose(correlation, correlation.T) or not np.allclose(np.diag(correlation), 1):
+            raise ValueError("The correlation matrix must be symmetric with a unit diagonal")
+        try:
+            self.cholesky = np.linalg.cholesky(correlation)
+        except np.linalg.LinAlgError:
+            raise ValueError("The correlation matrix must be positive definite")
+        # given column -> (categories, mean shift per category with a zero row last for unknown values)
+        self.given = {}
+        for column, shifts in spec.get('given', {}).items():
+            dtype = schema.get(column)
+            categories = list(dtype.categories) if isinstance(dtype, pd.CategoricalDtype) else list(shifts)
+            table = np.zeros((len(categories) + 1, len(self.columns)))
+            for category, shift in shifts.items():
+                if category not in categories:
+                    raise ValueError(f"Copula shift for unknown {column} '{category}'")
+                table[categories.index(category)] = shift
+            self.given[column] = (categories, table)
+
+    def draw(self, rng, columns, size):
+        """The copula's columns for size records, given the columns drawn so far"""
+        latent = rng.standard_normal((size, len(self.columns))) @ self.cholesky.T
+        for column, (categories, table) in self.given.items():
+            values = columns[column]
+            if not (isinstance(values, pd.Categorical) and list(values.categories) == categories):
+                values = pd.Categorical(values, categories=categories)
+            latent += table[values.codes]
+        uniforms = _normal_cdf(latent)
+        return {sampler.column: sampler.quantile(uniforms[:, i]) for i, sampler in enumerate(self.samplers)}
+
+class SamplingPlan:
+    """A spec compiled into one ColumnSampler per column, in spec order"""
+
+    def __init__(self, spec, schema=None):
+        self.spec = spec
+        schema = schema or {}
+        self._schema = schema
+        self.sections = {
+            section: [ColumnSampler(column, entry, schema.get(column)) for column, entry in entries.items()]
+            for section, entries in spec['sections'].items()
+        }
+        self.overrides = spec.get('overrides', [])
+        self.samplers = {sampler.column: sampler for samplers in self.sections.values() for sampler in samplers}
+        self.schema = {column: sampler.dtype for column, sampler in self.samplers.items()}
+        self._row_samplers = {}
+        # Every dependency must be drawn earlier (or be fixed by all overrides)
+        available = set().union(*(override.keys() for override in self.overrides)) if self.overrides else set()
+        seen = set()
+        for column, sampler in self.samplers.items():
+            missing = [name for name in sampler.depends if name not in seen and name not in available]
+            if missing:
+                raise ValueError(f"Spec entry '{column}' depends on {', '.join(missing)}, which no earlier entry defines")
+            seen.add(column)
+        # Each copula is drawn when its first column comes up, after the columns it is conditioned on
+        self.copulas = {}
+        for copula_spec in spec.get('copulas', []):
+            copula = GaussianCopula(copula_spec, self.samplers, {**schema, **self.schema})
+            order = list(self.samplers)
+            first = min(order.index(column) for column in copula.columns)
+            late = [column for column in copula.given if column not in order[:first]]
+            if late:
+                raise ValueError(f"Copula given columns {', '.join(late)} must come before {order[first]}")
+            self.copulas[order[first]] = copula
+
+    def __reduce__(self):
+        # Compiled samplers hold closures and code objects; a plan travels as its spec and is compiled again
+        return SamplingPlan, (self.spec, self._schema)
+
+    def _samplers(self, sections):
+        for section in sections or self.sections:
+            yield from self.sections[section]
+
+    def sample(self, rng, index, sections=None, fixed=None, name_engine=None, given=None):
+        """Columns of the records at index (an integer array) drawn with a NumPy Generator.
+
+        Columns in fixed keep the given values instead of being drawn, and are
+        returned as well; sections limits the draw to those spec sections.
+        Columns in given were drawn earlier: entries may depend on them, but
+        they are not returned.
+        """
+        given = given or {}
+        columns = {
+            column: _typed(values, self.schema[column]) if column in self.schema else values
+            for column, values in (fixed or {}).items()
+        }
+        scope = {**given, **columns}
+        for sampler in self._samplers(sections):
+            if sampler.column in columns:
+                continue
+            if sampler.column in self.copulas:
+                drawn = self.copulas[sampler.column].draw(rng, scope, len(index))
+                drawn = {column: values for column, values in drawn.items() if column not in columns}
+            else:
+                drawn = {sampler.column: sampler.draw(rng, scope, index, name_engine)}
+            columns.update(drawn)
+            scope.update(drawn)
+        return columns
+
+    def fill_row(self, rand, index, record, sections=None, name_engine=None):
+        """Draw the fields record index does not have yet with the random module, in place; returns record"""
+        key = tuple(sections or self.sections)
+        if key not in self._row_samplers:
+            self._row_samplers[key] = [
+                (sampler.column, self._copula_row_sampler(sampler.column) if sampler.column in self.copulas
+                 else sampler.draw_one)
+                for sampler in self._samplers(key)
+            ]
+        for column, draw_one in self._row_samplers[key]:
+            if column not in record:
+                record[column] = draw_one(rand, record, index, name_engine)
+        return record
+
+    def _copula_row_sampler(self, column):
+        """draw_one for the first column of a copula: draws the whole group for one record and fills in the rest"""
+        copula = self.copulas[column]
+
+        def draw_one(rand, record, index, name_engine):
+            rng = np.random.default_rng(rand.getrandbits(64))
+            drawn = copula.draw(rng, {given: [record[given]] for given in copula.given}, 1)
+            values = {name: value[0].item() if hasattr(value[0], 'item') else value[0] for name, value in drawn.items()}
+            for name, value in values.items():
+                record.setdefault(name, value)
+            return values[column]
+
+        return draw_one
+
+    def derive(self, column, columns):
+        """The formula column computed from given arrays"""
+        return self.samplers[column].draw(None, columns, np.arange(0), None)
+
+    def override_columns(self):
+        """The overrides as fixed columns"""
+        if not self.overrides:
+            return {}
+        return {key: [override[key] for override in self.overrides] for key in self.overrides[0]}
+
+    def batches(self, num_records, batch_size=1000000, seed=42, name_engine=None):
+        """The spec's records as DataFrames of batch_size rows, followed by the overrides"""
+        seeds = np.random.SeedSequence(seed)
+        for start in range(0, num_records, batch_size):
+            index = np.arange(start, min(start + batch_size, num_records))
+            rng = np.random.default_rng(seeds.spawn(1)[0])
+            with instrumentation.span('spec.batch'):
+                yield pd.DataFrame(self.sample(rng, index, name_engine=name_engine))
+        if self.overrides:
+            index = np.arange(num_records, num_records + len(self.overrides))
+            rng = np.random.default_rng(seeds.spawn(1)[0])
+            columns = self.sample(rng, index, fixed=self.override_columns(), name_engine=name_engine)
+            # In spec order like the other batches, with any columns only the overrides have at the end
+            yield pd.DataFrame(columns, columns=[*self.samplers, *(column for column in columns if column not in self.samplers)])
+
+QBR_PLAN = SamplingPlan(QBR_SPEC, QBR_SCHEMA)
+
+def calculate_health_score(renewal_probability, feature_adoption_rate, sla_compliance_rate, csat_score):
+    """Weighted health score for whole NumPy columns, by the spec's health_score formula"""
+    return QBR_PLAN.derive('health_score', {
+        'renewal_probability': renewal_probability,
+        'feature_adoption_rate': feature_adoption_rate,
+        'sla_compliance_rate': sla_compliance_rate,
+        'csat_score': csat_score
+    })
+
+def load_spec(path):
+    """A spec from a .json, .yaml or .yml file"""
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML specs requires PyYAML: pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def load_correlation(path):
+    """A correlation matrix from a .json file (a list of rows) or a comma-separated text file"""
+    if path.endswith('.json'):
+        with open(path) as f:
+            return np.asarray(json.load(f), dtype=float)
+    return np.loadtxt(path, delimiter=',', ndmin=2)
+
+def main():
+    from .names import CompanyNameEngine
+    from .writers import WRITERS, write_batches
+
+    parser = argparse.ArgumentParser(description='Generate data from a declarative column spec.')
+    parser.add_argument('spec', help='Spec file (.json, .yaml or .yml)')
+    parser.add_argument('--num-records', type=int, default=1000, help='Records to generate, overrides on top')
+    parser.add_argument('--batch-size', type=int, default=1000000, help='Rows per batch (default: 1000000)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--output', default=os.path.join('output', 'spec_data.csv'),
+                        help=f"Output file; the extension picks the format ({', '.join(WRITERS)})")
+    args = parser.parse_args()
+
+    plan = SamplingPlan(load_spec(args.spec))
+    start = time.perf_counter()
+    output_format = os.path.splitext(args.output)[1].lstrip('.')
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    batches = plan.batches(args.num_records, args.batch_size, args.seed, CompanyNameEngine(args.seed))
+    rows = write_batches(batches, args.output, output_format)
+    print(f"{rows:,} rows have been saved to {args.output} in {time.perf_counter() - start:.2f} s")
+
+if __name__ == '__main__':
+    main()
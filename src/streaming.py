@@ -0,0 +1,85 @@
+"""Streaming completion output.
+
+A streaming backend is a callable stream(model, prompt) that yields the
+completion in text chunks as they are generated, like snowflake.cortex.Complete
+with stream=True. stream_completion() falls back to a blocking
+complete(model, prompt) call when no streaming backend is available or it fails
+before producing anything, and render_stream() draws the growing text into a
+Streamlit placeholder, so the first section shows up as soon as the first
+tokens arrive instead of after the whole QBR is generated.
+"""
+import time
+
+from .instrumentation import instrumentation
+
+class FakeStreamingBackend:
+    """Offline streaming backend yielding a canned response word by word with configurable latency"""
+
+    def __init__(self, response=None, first_chunk_latency=0.3, chunk_interval=0.02, words_per_chunk=3):
+        # A fixed string, or response(model, prompt) returning the text to stream
+        self.response = response
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_interval = chunk_interval
+        self.words_per_chunk = words_per_chunk
+
+    def __call__(self, model, prompt):
+        if callable(self.response):
+            text = self.response(model, prompt)
+        else:
+            text = self.response or fake_qbr(model)
+        words = text.split(' ')
+        time.sleep(self.first_chunk_latency)
+        for start in range(0, len(words), self.words_per_chunk):
+            if start:
+                time.sleep(self.chunk_interval)
+            chunk = ' '.join(words[start:start + self.words_per_chunk])
+            yield chunk if start + self.words_per_chunk >= len(words) else chunk + ' '
+
+def fake_qbr(model):
+    sections = [
+        'Executive Summary', 'Account Health', 'Adoption & Engagement', 'Support Trends', 'Recommendations'
+    ]
+    return '\n\n'.join(
+        f"## {section}\n\n- Placeholder insight generated by {model} for the {section.lower()} section."
+        for section in sections
+    )
+
+def stream_completion(model, prompt, stream=None, complete=None):
+    """Yield completion chunks from stream(), or one chunk from complete() when streaming is unavailable"""
+    if stream is not None:
+        chunks = iter(stream(model, prompt))
+        try:
+            first = next(chunks)
+        except StopIteration:
+            return
+        except Exception:
+            # Nothing shown yet, so the blocking call can still take over
+            if complete is None:
+                raise
+            instrumentation.count('streaming.fallbacks')
+        else:
+            yield first
+            yield from chunks
+            return
+    yield complete(model, prompt)
+
+def render_stream(chunks, placeholder, min_interval=0.05, cursor=' ▌'):
+    """Render chunks into placeholder as they arrive and return the full text.
+
+    Redraws are throttled to one per min_interval seconds; the time to the
+    first chunk is recorded as streaming.first_chunk.
+    """
+    text = ''
+    start = time.perf_counter()
+    last_drawn = None
+    with instrumentation.span('streaming.total'):
+        for chunk in chunks:
+            text += chunk
+            now = time.perf_counter()
+            if last_drawn is None:
+                instrumentation.observe('streaming.first_chunk', now - start)
+            if last_drawn is None or now - last_drawn >= min_interval:
+                placeholder.markdown(text + cursor)
+                last_drawn = now
+    placeholder.markdown(text)
+    return text
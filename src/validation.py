@@ -0,0 +1,356 @@
+"""Declarative validation of QBR_DATA frames.
+
+Every rule names the columns it reads and checks them column-at-a-time,
+returning which rows pass, so a batch of a million rows costs a handful of
+array operations. The rules cover the generator's invariants:
+
+- value ranges (RANGES) and allowed members (MEMBERS) of each column, and
+  formula columns such as the health score matching their formula, all
+  derived from QBR_SPEC,
+- contracts expiring 365 days after they start,
+- qbr_quarter and qbr_year being the fiscal period (February start) of the
+  contract start date,
+- the control records fixed by QBR_SPEC's overrides passing those two rules
+  as they are, like RANGES and MEMBERS include their values,
+- well-formed and unique company ids.
+
+Validator consumes batches one at a time, so files and generator output of any
+size are validated in bounded memory; uniqueness is checked across batches
+through 64-bit hashes of the ids. The report counts the violations of each rule
+and keeps a few sample rows of each.
+
+    python3 src/validation.py output/qbr_sample_data.parquet
+    python3 src/data_generator.py --num-records 10000000 --batch-size 1000000 --format parquet --validate
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .instrumentation import instrumentation
+from .schema import CONTRACT_DAYS, QBR_SCHEMA, contract_date_columns
+from .spec import QBR_PLAN
+
+def spec_ranges(plan):
+    """column -> (minimum, maximum) of the plan's integer and uniform entries, defaults and overrides included"""
+    ranges = {}
+    for column, sampler in plan.samplers.items():
+        if sampler.kind not in ('integers', 'uniform'):
+            continue
+        values = [sampler.low, sampler.high] + ([] if sampler.default is None else [sampler.default])
+        values += [override[column] for override in plan.overrides if column in override]
+        ranges[column] = (min(values), max(values))
+    return ranges
+
+def spec_members(plan, schema):
+    """column -> allowed values of the plan's choice entries, then of the other category columns in schema"""
+    members = {}
+    for column, sampler in plan.samplers.items():
+        if sampler.kind == 'choice':
+            values = sampler.values + ([] if sampler.default is None else [sampler.default])
+            values += [override[column] for override in plan.overrides if column in override]
+            members[column] = list(dict.fromkeys(values))
+    for column, dtype in schema.items():
+        if isinstance(dtype, pd.CategoricalDtype) and column not in members:
+            members[column] = list(dtype.categories)
+    return members
+
+# column -> (minimum, maximum) of the generated values
+RANGES = spec_ranges(QBR_PLAN)
+
+# column -> allowed values
+MEMBERS = spec_members(QBR_PLAN, QBR_SCHEMA)
+
+def _dates(values):
+    """datetime64[D] array of a date column, parsed when it holds strings; unparseable values become NaT"""
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, errors='coerce')
+    return values.to_numpy(dtype='datetime64[D]')
+
+def _numbers(values):
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+class Rule:
+    """A named constraint on some columns; check(df) is a boolean array, True for the rows that satisfy it"""
+
+    def __init__(self, name, columns, check, description):
+        self.name = name
+        self.columns = columns
+        self.check = check
+        self.description = description
+
+    def applies_to(self, columns):
+        return set(self.columns) <= set(columns)
+
+class UniqueRule(Rule):
+    """No value of column appears twice, across all batches.
+
+    The Validator keeps only 64-bit hashes and row numbers of each batch; the
+    duplicates are found with one sort at the end.
+    """
+
+    def __init__(self, name, column, description):
+        super().__init__(name, [column], None, description)
+
+    def hash(self, df):
+        # The values are (nearly) all distinct, so factorizing them before hashing would only cost time
+        return pd.util.hash_array(df[self.columns[0]].to_numpy(dtype=object), categorize=False)
+
+    @staticmethod
+    def duplicates(hashes, rows):
+        """(row, row of the first occurrence) of every repeated hash"""
+        # Sorting the hashes alone finds the repeated ones; only their rows are then looked up
+        ordered = np.sort(hashes)
+        repeated = np.unique(ordered[1:][ordered[1:] == ordered[:-1]])
+        matches = np.flatnonzero(np.isin(hashes, repeated))
+        _, first = np.unique(hashes[matches], return_index=True)
+        later = np.setdiff1d(np.arange(len(matches)), first)
+        firsts = dict(zip(hashes[matches[first]], rows[matches[first]]))
+        return rows[matches[later]], np.array([firsts[value] for value in hashes[matches[later]]], dtype=np.int64)
+
+def range_rule(column, low, high):
+    def check(df):
+        values = _numbers(df[column])
+        return (values >= low) & (values <= high)
+
+    return Rule(f'{column}_range', [column], check, f'{column} is between {low:,} and {high:,}')
+
+def member_rule(column, members):
+    return Rule(
+        f'{column}_values', [column],
+        lambda df: df[column].isin(members).to_numpy(dtype=bool),
+        f"{column} is one of {', '.join(map(str, members))}"
+    )
+
+def formula_rule(sampler, plan=QBR_PLAN):
+    """Rule that a formula entry's column holds its formula of the other columns, within the rounding"""
+    column = sampler.column
+    # Half a unit in the last kept decimal, as the inputs may have been rounded too
+    tolerance = (0 if sampler.decimals is None else 0.5 * 10 ** -sampler.decimals) + 1e-9
+
+    def check(df):
+        expected = plan.derive(column, {name: _numbers(df[name]) for name in sampler.depends})
+        return np.abs(_numbers(df[column]) - expected) <= tolerance
+
+    return Rule(f'{column}_formula', [column, *sampler.depends], check, f"{column} is {sampler.entry['formula']}")
+
+def _contract_term_matches(df):
+    term = _dates(df['contract_expiration_date']) - _dates(df['contract_start_date'])
+    return term == np.timedelta64(CONTRACT_DAYS, 'D')
+
+def _fiscal_period_matches(df):
+    start = _dates(df['contract_start_date'])
+    known = ~np.isnat(start)
+    period = contract_date_columns(np.where(known, start, np.datetime64(0, 'D')))
+    quarter = pd.Categorical(df['qbr_quarter'], dtype=QBR_SCHEMA['qbr_quarter']).codes
+    return known & (quarter == period['qbr_quarter'].codes) & (_numbers(df['qbr_year']) == period['qbr_year'])
+
+def _comparable(values, column):
+    """values of a QBR_DATA column as an array that compares alike across dtypes: dates, numbers or strings"""
+    dtype = QBR_SCHEMA.get(column)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return _dates(values)
+    if pd.api.types.is_numeric_dtype(dtype):
+        return _numbers(values)
+    return values.astype(str).to_numpy()
+
+def override_rule(rule, plan=QBR_PLAN):
+    """rule, passing the rows that equal one of the plan's overrides (the control records) on all of its columns"""
+    overrides = [override for override in plan.overrides if rule.applies_to(override)]
+    if not overrides:
+        return rule
+
+    def check(df):
+        passed = np.asarray(rule.check(df), dtype=bool)
+        values = {column: _comparable(df[column], column) for column in rule.columns}
+        for override in overrides:
+            matched = np.ones(len(df), dtype=bool)
+            for column in rule.columns:
+                matched &= values[column] == _comparable(pd.Series([override[column]]), column)[0]
+            passed = passed | matched
+        return passed
+
+    return Rule(rule.name, rule.columns, check, f'{rule.description}, except the control records')
+
+def _company_id_wellformed(df):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    # Arrow-backed columns convert without copying; object columns are converted once
+    ids = pa.array(df['company_id'], type=pa.string(), from_pandas=True)
+    return pc.match_substring_regex(ids, r'^COMP\d{4,}$').fill_null(False).to_numpy(zero_copy_only=False)
+
+RULES = [
+    *[range_rule(column, low, high) for column, (low, high) in RANGES.items()],
+    *[member_rule(column, members) for column, members in MEMBERS.items()],
+    *[formula_rule(sampler) for sampler in QBR_PLAN.samplers.values() if sampler.kind == 'formula'],
+    override_rule(Rule(
+        'contract_term', ['contract_start_date', 'contract_expiration_date'], _contract_term_matches,
+        f'contracts expire {CONTRACT_DAYS} days after they start'
+    )),
+    override_rule(Rule(
+        'fiscal_period', ['contract_start_date', 'qbr_quarter', 'qbr_year'], _fiscal_period_matches,
+        'qbr_quarter and qbr_year are the fiscal period (February start) of contract_start_date'
+    )),
+    Rule('company_id_format', ['company_id'], _company_id_wellformed, 'company_id is COMP followed by digits'),
+    UniqueRule('company_id_unique', 'company_id', 'company_id is unique')
+]
+
+def rules_for(columns, rules=RULES):
+    """The rules that only read the given columns (any case), e.g. those a fetched subset of QBR_DATA can satisfy"""
+    columns = {column.lower() for column in columns}
+    return [rule for rule in rules if rule.applies_to(columns)]
+
+class Validator:
+    """Runs rules over a stream of QBR_DATA batches and collects violation counts and sample rows"""
+
+    def __init__(self, rules=RULES, sample_size=5):
+        self.rules = list(rules)
+        self.sample_size = sample_size
+        self.rows = 0
+        self.violations = {rule.name: 0 for rule in self.rules}
+        self.samples = {rule.name: [] for rule in self.rules}
+        # UniqueRule name -> [(hashes, row numbers) of each batch]
+        self.hashes = {rule.name: [] for rule in self.rules if isinstance(rule, UniqueRule)}
+
+    def update(self, df):
+        """Check one batch; row numbers in the samples count from the first row of the first batch"""
+        df = df.set_axis(df.columns.str.lower(), axis=1, copy=False)
+        with instrumentation.span('validation.batch'):
+            for rule in self.rules:
+                if not rule.applies_to(df.columns):
+                    continue
+                if isinstance(rule, UniqueRule):
+                    self.hashes[rule.name].append((rule.hash(df), np.arange(self.rows, self.rows + len(df))))
+                    continue
+                failed = np.flatnonzero(~np.asarray(rule.check(df), dtype=bool))
+                self.violations[rule.name] += len(failed)
+                room = self.sample_size - len(self.samples[rule.name])
+                if len(failed) and room > 0:
+                    sample = df.iloc[failed[:room]][rule.columns]
+                    self.samples[rule.name] += [
+                        {'row': self.rows + int(row), **record}
+                        for row, record in zip(failed[:room], sample.to_dict('records'))
+                    ]
+        self.rows += len(df)
+        instrumentation.count('validation.rows', len(df))
+        return self
+
+    def watch(self, batches):
+        """Yield the batches unchanged, checking each on the way, e.g. while the generator writes them"""
+        for batch in batches:
+            self.update(batch)
+            yield batch
+
+    def report(self):
+        """Violation count and samples per rule so far, including the cross-batch rules"""
+        violations = dict(self.violations)
+        samples = {name: list(rule_samples) for name, rule_samples in self.samples.items()}
+        for rule in self.rules:
+            if isinstance(rule, UniqueRule) and self.hashes[rule.name]:
+                hashes, rows = (np.concatenate(arrays) for arrays in zip(*self.hashes[rule.name]))
+                rows, firsts = rule.duplicates(hashes, rows)
+                violations[rule.name] += len(rows)
+                samples[rule.name] += [
+                    {'row': int(row), 'first_row': int(first)} for row, first in zip(rows[:self.sample_size], firsts)
+                ]
+        return ValidationReport(self.rules, self.rows, violations, samples)
+
+class ValidationReport:
+    """Outcome of a validation run"""
+
+    def __init__(self, rules, rows, violations, samples):
+        self.rules = rules
+        self.rows = rows
+        self.violations = violations
+        self.samples = samples
+
+    @property
+    def ok(self):
+        return not any(self.violations.values())
+
+    def failed(self):
+        """The rules with violations"""
+        return [rule for rule in self.rules if self.violations[rule.name]]
+
+    def summary(self):
+        """One row per rule: name, description, violations and their share of the rows"""
+        return pd.DataFrame({
+            'rule': [rule.name for rule in self.rules],
+            'description': [rule.description for rule in self.rules],
+            'violations': [self.violations[rule.name] for rule in self.rules],
+            'share': [self.violations[rule.name] / self.rows if self.rows else 0.0 for rule in self.rules]
+        })
+
+def validate(batches, rules=RULES, sample_size=5):
+    """ValidationReport of a DataFrame or an iterable of DataFrame batches"""
+    validator = Validator(rules, sample_size)
+    for batch in [batches] if isinstance(batches, pd.DataFrame) else batches:
+        validator.update(batch)
+    return validator.report()
+
+def print_report(report):
+    print(f"{report.rows:,} rows checked against {len(report.rules)} rules")
+    for rule in report.rules:
+        violations = report.violations[rule.name]
+        print(f"  {'FAIL' if violations else 'ok  '} {rule.name:<32} {violations:>12,}  {rule.description}")
+    for rule in report.failed():
+        print(f"\n{rule.name}: {report.violations[rule.name]:,} violations, e.g.")
+        for sample in report.samples[rule.name]:
+            print(f"  {sample}")
+
+def read_batches(path, batch_size=1000000, columns=None):
+    """Generated QBR data (.csv or .parquet) as DataFrame batches of about batch_size rows, optionally only some columns"""
+    if path.endswith('.parquet') or os.path.isdir(path):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(path, partitioning='hive' if os.path.isdir(path) else None)
+        if columns is not None:
+            columns = [column for column in dataset.schema.names if column in set(columns)]
+        # Record batches stop at row group boundaries; they are combined so every rule runs once per batch_size rows
+        pending, rows = [], 0
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_size, batch_readahead=0, fragment_readahead=1):
+            pending.append(batch)
+            rows += batch.num_rows
+            if rows >= batch_size:
+                yield pa.Table.from_batches(pending).to_pandas()
+                pending, rows = [], 0
+        if pending:
+            yield pa.Table.from_batches(pending).to_pandas()
+        return
+    dates = ['contract_start_date', 'contract_expiration_date']
+    if columns is not None:
+        dates = [column for column in dates if column in set(columns)]
+    # 'None' is a competitive situation, not a missing value
+    yield from pd.read_csv(
+        path, chunksize=batch_size, usecols=(lambda column: column in set(columns)) if columns is not None else None,
+        parse_dates=dates, keep_default_na=False, na_values=['']
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate generated QBR data against the generator invariants.')
+    parser.add_argument('input', help='Generated QBR data (.csv, .parquet or a partitioned directory)')
+    parser.add_argument('--batch-size', type=int, default=1000000, help='Rows per batch (default: 1000000)')
+    parser.add_argument('--skip', nargs='+', default=[], help='Names of rules to leave out')
+    parser.add_argument('--samples', type=int, default=5, help='Sample rows kept per rule (default: 5)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rules = [rule for rule in RULES if rule.name not in args.skip]
+    # Only the columns some rule reads are loaded
+    columns = {column for rule in rules for column in rule.columns}
+    report = validate(read_batches(args.input, args.batch_size, columns), rules, args.samples)
+    print_report(report)
+    print(f"\nValidated in {time.perf_counter() - start:.2f} s")
+    sys.exit(0 if report.ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""In-process vector index over the QBR document embeddings.
+
+VectorIndex keeps L2-normalized float32 vectors in one growable matrix, so a
+cosine top-k query is a single matrix-vector product followed by
+argpartition. IVFIndex adds an inverted-file layout for large portfolios: the
+vectors are clustered by spherical k-means and a query only scores the
+vectors of the nprobe clusters closest to it.
+
+Both support metadata filters (e.g. industry, size, qbr_quarter), upserts of
+ids that are already indexed and incremental inserts; IVFIndex assigns new
+vectors to their nearest cluster without retraining.
+"""
+import json
+
+import numpy as np
+
+# Below this many vectors exact search is fast enough that clustering does not pay off
+IVF_MIN_VECTORS = 50000
+
+def normalize(vectors):
+    """Rows scaled to unit length (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def embedding_matrix(column):
+    """float32 matrix from a column of embeddings (arrays, lists, JSON strings as returned for VECTOR columns or float32 bytes)"""
+    values = list(column)
+    if values and isinstance(values[0], str):
+        values = [json.loads(value) for value in values]
+    elif values and isinstance(values[0], bytes):
+        return np.frombuffer(b''.join(values), dtype=np.float32).reshape(len(values), -1)
+    return np.asarray(values, dtype=np.float32)
+
+class VectorIndex:
+    """Exact cosine similarity search with metadata filters and incremental inserts"""
+
+    def __init__(self, dim=768):
+        self.dim = dim
+        self.size = 0
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=object)
+        self.metadata = {}
+        self.positions = {}
+
+    def __len__(self):
+        return self.size
+
+    def add(self, ids, vectors, metadata=None):
+        """Insert vectors under ids, replacing the vectors and metadata of ids already in the index"""
+        vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        metadata = metadata or {}
+        rows = np.empty(len(vectors), dtype=np.int64)
+        new_size = self.size
+        for i, id_ in enumerate(ids):
+            row = self.positions.get(id_)
+            if row is None:
+                row = self.positions[id_] = new_size
+                new_size += 1
+            rows[i] = row
+        self._reserve(new_size)
+
+        self.vectors[rows] = vectors
+        self.ids[rows] = list(ids)
+        for column in set(self.metadata) | set(metadata):
+            if column not in self.metadata:
+                self.metadata[column] = np.full(len(self.ids), None, dtype=object)
+            values = metadata.get(column)
+            self.metadata[column][rows] = None if values is None else list(values)
+        self.size = new_size
+        return rows
+
+    def _reserve(self, size):
+        """Grow the buffers geometrically so repeated inserts stay amortized O(1) per vector"""
+        if size <= len(self.vectors):
+            return
+        capacity = max(size, 2 * len(self.vectors), 1024)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        self.vectors = vectors
+        self.ids = np.concatenate([self.ids[:self.size], np.full(capacity - self.size, None, dtype=object)])
+        for column, values in self.metadata.items():
+            self.metadata[column] = np.concatenate([values[:self.size], np.full(capacity - self.size, None, dtype=object)])
+
+    def vector(self, id_):
+        """The normalized vector stored under id_"""
+        return self.vectors[self.positions[id_]]
+
+    def _candidates(self, query):
+        """Rows worth scoring for query, or None for all of them"""
+        return None
+
+    def search(self, query, k=10, filters=None, exclude=()):
+        """Top-k (id, cosine similarity) pairs, best first.
+
+        filters maps metadata columns to a value or a list of accepted values;
+        ids in exclude are never returned.
+        """
+        query = normalize(query)
+        rows = self._candidates(query)
+        if rows is None:
+            scores = self.vectors[:self.size] @ query
+            rows = np.arange(self.size)
+        else:
+            scores = self.vectors[rows] @ query
+
+        keep = np.ones(len(rows), dtype=bool)
+        for column, accepted in (filters or {}).items():
+            accepted = accepted if isinstance(accepted, (list, tuple, set)) else [accepted]
+            keep &= np.isin(self.metadata[column][rows], list(accepted))
+        for id_ in exclude:
+            keep &= rows != self.positions.get(id_, -1)
+        rows, scores = rows[keep], scores[keep]
+
+        k = min(k, len(rows))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: exact search until min_train_size vectors, then search only the nprobe nearest clusters"""
+
+    def __init__(self, dim=768, nlist=None, nprobe=16, min_train_size=IVF_MIN_VECTORS, seed=42):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.lists = []
+
+    def train(self, iterations=10, sample_per_list=64):
+        """Cluster the indexed vectors with spherical k-means and build the inverted lists"""
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or max(1, int(np.sqrt(self.size)))
+        sample = self.vectors[rng.choice(self.size, min(self.size, sample_per_list * nlist), replace=False)]
+        centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=len(centroids)) == 0
+            # Reseed empty clusters with random sample vectors
+            sums[empty] = sample[rng.choice(len(sample), empty.sum())]
+            centroids = normalize(sums)
+        self.centroids = centroids
+        self.assignments = self._assign(self.vectors[:self.size])
+        order = np.argsort(self.assignments, kind='stable')
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(centroids) + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(centroids))]
+
+    def _assign(self, vectors, chunk_size=65536):
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk_size] @ self.centroids.T, axis=1).astype(np.int32)
+            for start in range(0, len(vectors), chunk_size)
+        ]) if len(vectors) else np.empty(0, dtype=np.int32)
+
+    def add(self, ids, vectors, metadata=None):
+        old_size = self.size
+        rows = super().add(ids, vectors, metadata)
+        if self.centroids is None:
+            if self.size >= self.min_train_size:
+                self.train()
+            return rows
+
+        # Move updated rows out of their old lists, then file every row under its nearest centroid;
+        # an id given twice in one call maps to one row, which is filed once
+        filed = np.unique(rows)
+        updated = filed[filed < old_size]
+        if len(updated):
+            for cluster in np.unique(self.assignments[updated]):
+                self.lists[cluster] = np.setdiff1d(self.lists[cluster], updated, assume_unique=True)
+        labels = self._assign(self.vectors[filed])
+        self.assignments = np.concatenate([self.assignments, np.zeros(self.size - old_size, dtype=np.int32)])
+        self.assignments[filed] = labels
+        for cluster in np.unique(labels):
+            self.lists[cluster] = np.concatenate([self.lists[cluster], filed[labels == cluster]])
+        return rows
+
+    def _candidates(self, query):
+        if self.centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[cluster] for cluster in probe])
+
+def build_index(ids, vectors, metadata=None, dim=768, ivf_min_vectors=IVF_MIN_VECTORS):
+    """Exact index for small portfolios, IVF index beyond ivf_min_vectors"""
+    index = VectorIndex(dim) if len(ids) < ivf_min_vectors else IVFIndex(dim, min_train_size=ivf_min_vectors)
+    index.add(ids, vectors, metadata)
+    return index
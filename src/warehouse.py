@@ -0,0 +1,221 @@
+"""Data access for the QBR app: Snowflake, or a local embedded database.
+
+The app runs its queries through a warehouse instead of a Snowpark session:
+
+- SnowflakeWarehouse sends them to Snowflake through a session, with the
+  parameters bound server side.
+- LocalWarehouse answers the same statements from an SQLite database loaded
+  from the generator's output (QBR_DATA, and QBR_DATA_VECTORS with rendered
+  documents and HashingEmbedder embeddings). COMPANY_NAME, company_id and
+  (qbr_year, qbr_quarter) are indexed, connections come from a pool that lives
+  as long as the warehouse, and each pooled connection keeps its compiled
+  statements, so a repeated lookup skips parsing and planning.
+
+Both provide query(sql, params) -> DataFrame, execute(sql, params) -> rows (the
+CompletionCache backend interface), sync_marker(), context(), complete(model,
+prompt) and embedder(model). Statements are written in the subset of SQL both
+databases share, with ? placeholders.
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    __package__ = 'src'
+
+from .documents import CortexEmbedder, HashingEmbedder, read_frame, render_documents
+from .instrumentation import instrumentation
+from .streaming import fake_qbr
+
+# (index name, table, columns) of the local database
+LOCAL_INDEXES = [
+    ('QBR_DATA_COMPANY_NAME', 'QBR_DATA', 'COMPANY_NAME'),
+    ('QBR_DATA_COMPANY_ID', 'QBR_DATA', 'COMPANY_ID'),
+    ('QBR_DATA_PERIOD', 'QBR_DATA', 'QBR_YEAR, QBR_QUARTER'),
+    ('QBR_DATA_VECTORS_COMPANY_NAME', 'QBR_DATA_VECTORS', 'COMPANY_NAME')
+]
+
+class SnowflakeWarehouse:
+    """Runs the app's statements in Snowflake through a Snowpark session"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def query(self, sql, params=()):
+        return self.session.sql(sql, params=list(params) or None).to_pandas()
+
+    def execute(self, sql, params=()):
+        return [tuple(row) for row in self.session.sql(sql, params=list(params) or None).collect()]
+
+    def sync_marker(self):
+        """Last change to QBR_DATA"""
+        rows = self.execute("""
+            SELECT LAST_ALTERED
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = CURRENT_SCHEMA() AND TABLE_NAME = 'QBR_DATA'
+        """)
+        return str(rows[0][0]) if rows else None
+
+    def context(self):
+        """(database, schema) the session works in"""
+        rows = self.execute("SELECT CURRENT_DATABASE(), CURRENT_SCHEMA()")
+        return tuple(rows[0]) if rows else ("Not available", "Not available")
+
+    def complete(self, model, prompt):
+        """SNOWFLAKE.CORTEX.COMPLETE for one prompt"""
+        return self.execute("SELECT SNOWFLAKE.CORTEX.COMPLETE(?, ?) AS response", [model, prompt])[0][0]
+
+    def embedder(self, model):
+        return CortexEmbedder(self.session, model)
+
+class LocalWarehouse:
+    """QBR_DATA and QBR_DATA_VECTORS in an SQLite file, served from a pool of connections.
+
+    complete(model, prompt) answers Cortex completions, by default with a
+    placeholder QBR; documents are embedded with HashingEmbedder.
+    """
+
+    def __init__(self, path, pool_size=8, complete=None, cached_statements=256):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.session = None
+        self.cached_statements = cached_statements
+        self._complete = complete
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._write_lock = threading.Lock()
+        with self.connection() as connection:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS QBR_SYNC (LAST_ALTERED VARCHAR)")
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False, cached_statements=self.cached_statements
+        )
+        connection.execute("PRAGMA synchronous = NORMAL")
+        instrumentation.count('warehouse.connections')
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection, returned to the pool afterwards (or closed when the pool is full)"""
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        try:
+            yield connection
+        finally:
+            try:
+                self._pool.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def query(self, sql, params=()):
+        with self.connection() as connection, instrumentation.span('warehouse.query'):
+            cursor = connection.execute(sql, tuple(params))
+            columns = [column[0] for column in cursor.description]
+            return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+    def execute(self, sql, params=()):
+        """Rows of sql, committed; writes are serialized so concurrent writers never wait on SQLite's busy timeout"""
+        with self.connection() as connection, self._write_lock, connection:
+            return connection.execute(sql, tuple(params)).fetchall()
+
+    def load(self, df, embed=None, batch_size=10000):
+        """Replace QBR_DATA and QBR_DATA_VECTORS with a generated frame and build the indexes"""
+        embed = embed or HashingEmbedder()
+        qbr_data = df.rename(columns=str.upper)
+        for column in qbr_data.columns:
+            if pd.api.types.is_datetime64_any_dtype(qbr_data[column]):
+                qbr_data[column] = qbr_data[column].dt.strftime('%Y-%m-%d')
+        documents = render_documents(df)
+        with self.connection() as connection, self._write_lock, instrumentation.span('warehouse.load'):
+            with connection:
+                for table in ['QBR_DATA', 'QBR_DATA_VECTORS']:
+                    connection.execute(f"DROP TABLE IF EXISTS {table}")
+                qbr_data.head(0).to_sql('QBR_DATA', connection, index=False)
+                placeholders = ', '.join('?' * len(qbr_data.columns))
+                connection.executemany(
+                    f"INSERT INTO QBR_DATA VALUES ({placeholders})",
+                    qbr_data.astype(object).where(qbr_data.notna(), None).itertuples(index=False)
+                )
+                connection.execute(
+                    "CREATE TABLE QBR_DATA_VECTORS (COMPANY_NAME VARCHAR, QBR_INFORMATION TEXT, QBR_EMBEDDINGS BLOB)"
+                )
+                names = qbr_data['COMPANY_NAME'].to_numpy(dtype=object)
+                for start in range(0, len(df), batch_size):
+                    batch = slice(start, start + batch_size)
+                    vectors = np.asarray(embed(documents.iloc[batch]), dtype=np.float32)
+                    connection.executemany(
+                        "INSERT INTO QBR_DATA_VECTORS VALUES (?, ?, ?)",
+                        zip(names[batch], documents.iloc[batch], (vector.tobytes() for vector in vectors))
+                    )
+                for name, table, columns in LOCAL_INDEXES:
+                    connection.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+                connection.execute("DELETE FROM QBR_SYNC")
+                connection.execute("INSERT INTO QBR_SYNC VALUES (?)", (pd.Timestamp.now().isoformat(),))
+            connection.execute("ANALYZE")
+        instrumentation.count('warehouse.rows_loaded', len(df))
+
+    @classmethod
+    def from_file(cls, data_path, path=None, **options):
+        """Warehouse over generated data (.csv or .parquet), reloaded only when the file is newer than the database"""
+        path = path or os.path.splitext(data_path)[0] + '.sqlite'
+        stale = not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(data_path)
+        warehouse = cls(path, **options)
+        if stale or warehouse.sync_marker() is None:
+            warehouse.load(read_frame(data_path))
+        return warehouse
+
+    def sync_marker(self):
+        """Time of the last load"""
+        rows = self.execute("SELECT LAST_ALTERED FROM QBR_SYNC")
+        return rows[0][0] if rows else None
+
+    def context(self):
+        return (os.path.basename(self.path), 'main')
+
+    def complete(self, model, prompt):
+        return self._complete(model, prompt) if self._complete else fake_qbr(model)
+
+    def embedder(self, model):
+        """HashingEmbedder, the embedding space of the stored QBR_EMBEDDINGS whatever the model"""
+        return HashingEmbedder()
+
+def main():
+    parser = argparse.ArgumentParser(description='Load generated QBR data into a local warehouse and time lookups.')
+    parser.add_argument('input', help='Generated QBR data (.csv or .parquet)')
+    parser.add_argument('--database', help='SQLite database (default: the input path with a .sqlite extension)')
+    parser.add_argument('--lookups', type=int, default=1000, help='Company lookups to time (default: 1000)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    warehouse = LocalWarehouse.from_file(args.input, args.database)
+    print(f"{warehouse.path} ready in {time.perf_counter() - start:.2f} s")
+
+    names = warehouse.query("SELECT COMPANY_NAME FROM QBR_DATA")['COMPANY_NAME'].to_numpy()
+    lookups = np.random.default_rng(0).choice(names, args.lookups)
+    start = time.perf_counter()
+    for name in lookups:
+        warehouse.query("SELECT * FROM QBR_DATA WHERE COMPANY_NAME = ?", [name])
+    elapsed = time.perf_counter() - start
+    print(f"{args.lookups:,} company lookups: {elapsed / args.lookups * 1000:.3f} ms each")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Output sinks for generated QBR data.
+
+Every writer consumes an iterable of DataFrame batches (a single DataFrame in a
+list works too) so the full dataset never has to be held in memory.
+"""
+import itertools
+import os
+
+from .instrumentation import instrumentation
+
+# Columns used to lay out partitioned output directories (qbr_year=2024/qbr_quarter=Q4/...)
+PARTITION_COLUMNS = ['qbr_year', 'qbr_quarter']
+
+FILE_EXTENSIONS = {
+    'csv': 'csv',
+    'parquet': 'parquet',
+    'arrow': 'arrow',
+    'feather': 'feather'
+}
+
+def _record_batches(batches, schema=None):
+    """Convert DataFrame batches to Arrow record batches of one schema.
+
+    Without an explicit schema (e.g. schema.arrow_schema()) the schema of the
+    first batch is used.
+    """
+    import pyarrow as pa
+
+    tables = (pa.Table.from_pandas(batch, preserve_index=False) for batch in batches)
+    first = next(tables)
+    if schema is None:
+        schema = first.schema.remove_metadata()
+    record_batches = (
+        batch
+        for table in itertools.chain([first], tables)
+        for batch in table.cast(schema).to_batches()
+    )
+    return schema, record_batches
+
+def write_csv(batches, path, **options):
+    """Append each batch to a CSV file as it arrives, writing the header once"""
+    rows = 0
+    for batch in batches:
+        batch.to_csv(path, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+        rows += len(batch)
+    return rows
+
+def write_parquet(batches, path, compression='zstd', row_group_size=1000000, schema=None, **options):
+    """Write a single Parquet file with dictionary-encoded columns, one or more row groups per batch"""
+    import pyarrow.parquet as pq
+
+    schema, record_batches = _record_batches(batches, schema)
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression=compression, use_dictionary=True) as writer:
+        for batch in record_batches:
+            writer.write_batch(batch, row_group_size=row_group_size)
+            rows += batch.num_rows
+    return rows
+
+def write_arrow(batches, path, compression='zstd', schema=None, **options):
+    """Write an Arrow IPC file (the Feather v2 format)"""
+    import pyarrow as pa
+
+    schema, record_batches = _record_batches(batches, schema)
+    rows = 0
+    write_options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema, options=write_options) as writer:
+        for batch in record_batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+def write_partitioned(batches, path, format='parquet', compression='zstd', row_group_size=1000000,
+                      schema=None, partition_columns=PARTITION_COLUMNS):
+    """Write a hive-style directory tree keyed on partition_columns (qbr_year=2024/qbr_quarter=Q4/)"""
+    import pyarrow.dataset as ds
+
+    schema, record_batches = _record_batches(batches, schema)
+    if format == 'parquet':
+        file_format = ds.ParquetFileFormat()
+        file_options = file_format.make_write_options(compression=compression, use_dictionary=True)
+    elif format in ('arrow', 'feather'):
+        file_format = ds.IpcFileFormat()
+        file_options = file_format.make_write_options(compression=compression)
+    else:
+        file_format = ds.CsvFileFormat()
+        file_options = None
+
+    rows = 0
+
+    def counted(record_batches):
+        nonlocal rows
+        for batch in record_batches:
+            rows += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        counted(record_batches),
+        path,
+        schema=schema,
+        format=file_format,
+        file_options=file_options,
+        partitioning=partition_columns,
+        partitioning_flavor='hive',
+        basename_template=f'part-{{i}}.{FILE_EXTENSIONS[format]}',
+        max_rows_per_group=row_group_size,
+        # The contract date walk spans many fiscal years for large datasets
+        max_partitions=1 << 20,
+        existing_data_behavior='delete_matching'
+    )
+    return rows
+
+WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+    'arrow': write_arrow,
+    'feather': write_arrow
+}
+
+def output_path(directory, name, format='csv', partitioned=False):
+    """Path of the output file, or of the output directory for partitioned layouts"""
+    if partitioned:
+        return os.path.join(directory, f'{name}_{format}')
+    return os.path.join(directory, f'{name}.{FILE_EXTENSIONS[format]}')
+
+def write_batches(batches, path, format='csv', partitioned=False, **options):
+    """Write batches to path with the sink registered for format, returning the number of rows written"""
+    if format not in WRITERS:
+        raise ValueError(f"Unknown output format '{format}', expected one of {sorted(WRITERS)}")
+    with instrumentation.span(f'writer.{format}', partitioned=partitioned):
+        if partitioned:
+            rows = write_partitioned(batches, path, format=format, **options)
+        else:
+            rows = WRITERS[format](batches, path, **options)
+    instrumentation.count('writer.rows', rows)
+    return rows
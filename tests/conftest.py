@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the package as src, like the benchmark and the app do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,130 @@
+import threading
+
+import pytest
+
+from src.batch import (
+    BatchQBRRunner, JSONLinesStore, TableStore, TransientCompletionError, call_with_retries, is_transient
+)
+from src.completion_cache import CompletionCache, SQLiteBackend
+from src.warehouse import LocalWarehouse
+
+
+def failing(errors):
+    calls = []
+
+    def function(value):
+        calls.append(value)
+        if errors:
+            raise errors.pop(0)
+        return value
+    return function, calls
+
+
+def test_transient_errors_are_retried():
+    function, calls = failing([TransientCompletionError('throttled'), RuntimeError('HTTP 429 Too Many Requests')])
+    assert call_with_retries(function, 'ok', backoff=0) == 'ok'
+    assert len(calls) == 3
+
+
+def test_other_errors_are_raised_at_once():
+    function, calls = failing([ValueError("SQL compilation error: invalid identifier 'COMPANY'")])
+    with pytest.raises(ValueError):
+        call_with_retries(function, 'ok', backoff=0)
+    assert len(calls) == 1
+
+
+def test_retries_give_up_after_max_retries():
+    function, calls = failing([TimeoutError()] * 3)
+    with pytest.raises(TimeoutError):
+        call_with_retries(function, 'ok', max_retries=2, backoff=0)
+    assert len(calls) == 3
+
+
+@pytest.mark.parametrize('error, transient', [
+    (ConnectionError('reset by peer'), True),
+    (RuntimeError('Request timed out'), True),
+    (RuntimeError('Rate limit exceeded, try again later'), True),
+    (PermissionError('Insufficient privileges to operate on table'), False),
+    (RuntimeError('Authentication token has expired'), False)
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+
+def test_runner_resumes_from_the_store(tmp_path):
+    store = JSONLinesStore(str(tmp_path / 'qbrs.jsonl'))
+    companies = [f'Company {i}' for i in range(20)]
+
+    def generate(company, complete):
+        return None if company == 'Company 3' else complete('model', company)
+
+    runner = BatchQBRRunner(generate, store, workers=4, requests_per_minute=60000, backoff=0)
+    stats = runner.run(companies, lambda model, prompt: f'QBR for {prompt}')
+    assert (stats['succeeded'], stats['failed'], stats['failed_companies']) == (19, 1, ['Company 3'])
+
+    stats = runner.run(companies, lambda model, prompt: f'QBR for {prompt}')
+    assert (stats['skipped'], stats['succeeded'], stats['failed']) == (19, 0, 1)
+    assert store.completed() == set(companies) - {'Company 3'}
+
+
+def test_runner_resumes_after_an_interrupted_write(tmp_path):
+    path = tmp_path / 'qbrs.jsonl'
+    store = JSONLinesStore(str(path))
+    runner = BatchQBRRunner(lambda company, complete: f'QBR for {company}', store, workers=2, metadata={'model': 'm'})
+    runner.run(['Acme', 'Globex'], None)
+    # The run was killed half-way through its next line
+    with open(path, 'a') as f:
+        f.write('{"company_name": "Init')
+    assert store.completed() == {'Acme', 'Globex'}
+
+    stats = runner.run(['Acme', 'Globex', 'Initech', 'Initech'], None)
+    assert (stats['total'], stats['skipped'], stats['succeeded']) == (3, 2, 1)
+    assert 'Initech' in store.completed()
+
+
+def test_table_store_resumes_per_run(tmp_path):
+    warehouse = LocalWarehouse(str(tmp_path / 'qbr.sqlite'))
+    metadata = {'template': 'Executive', 'view_type': 'Summary', 'model': 'm'}
+
+    def generate(company, complete):
+        return complete('m', company)
+
+    first = BatchQBRRunner(generate, TableStore(warehouse, 'run-1'), workers=2, metadata=metadata, backoff=0)
+    assert first.run(['Acme', 'Globex'], lambda model, prompt: prompt)['succeeded'] == 2
+    assert first.run(['Acme', 'Globex', 'Initech'], lambda model, prompt: prompt)['skipped'] == 2
+    # Another run id starts over
+    assert TableStore(warehouse, 'run-2').completed() == set()
+    assert TableStore(warehouse, 'run-1').completed() == {'Acme', 'Globex', 'Initech'}
+
+
+def test_runner_initializer_runs_in_every_worker(tmp_path):
+    initialized = set()
+
+    def generate(company, complete):
+        # A worker that skipped the initializer fails the company
+        assert threading.current_thread().name in initialized
+        return 'QBR'
+
+    runner = BatchQBRRunner(
+        generate, JSONLinesStore(str(tmp_path / 'qbrs.jsonl')), workers=3,
+        initializer=lambda: initialized.add(threading.current_thread().name)
+    )
+    stats = runner.run([f'Company {i}' for i in range(30)], None)
+    assert (stats['succeeded'], stats['failed']) == (30, 0)
+
+
+def test_completion_cache_counts_from_many_threads(tmp_path):
+    cache = CompletionCache(SQLiteBackend(str(tmp_path / 'cache.sqlite')))
+    cache.put('model', 'cached', 'response')
+
+    def lookups():
+        for _ in range(50):
+            cache.get('model', 'cached')
+            cache.get('model', 'missing')
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 400
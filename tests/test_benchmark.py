@@ -0,0 +1,30 @@
+from src.benchmark import compare
+
+def result(rows_per_sec, peak_rss_mb=100.0, benchmark='csv_write', num_records=1000):
+    return {
+        'benchmark': benchmark,
+        'num_records': num_records,
+        'rows': num_records,
+        'seconds': 0.0 if rows_per_sec is None else num_records / rows_per_sec,
+        'rows_per_sec': rows_per_sec,
+        'peak_rss_mb': peak_rss_mb,
+        'memory_increase_mb': 0.0
+    }
+
+def test_compare_flags_throughput_and_memory_regressions():
+    baseline = {'results': [result(1000.0)]}
+    assert compare([result(1000.0)], baseline) == []
+    assert len(compare([result(500.0)], baseline)) == 1
+    assert len(compare([result(1000.0, peak_rss_mb=200.0)], baseline)) == 1
+
+def test_compare_skips_throughput_of_untimed_runs():
+    assert compare([result(None)], {'results': [result(1000.0)]}) == []
+    assert compare([result(1000.0)], {'results': [result(None)]}) == []
+    # Memory is still compared
+    assert len(compare([result(None, peak_rss_mb=200.0)], {'results': [result(None)]})) == 1
+
+def test_compare_ignores_skipped_and_new_cases():
+    skipped = {'benchmark': 'generate_data', 'num_records': 1000, 'skipped': 'row-at-a-time case'}
+    baseline = {'results': [skipped, result(1000.0)]}
+    assert compare([dict(skipped), result(10.0, benchmark='generate_data')], baseline) == []
+    assert compare([result(10.0, num_records=5)], baseline) == []
@@ -0,0 +1,35 @@
+from src.completion_cache import CompletionCache, SQLiteBackend
+
+
+def test_completion_cache_expires_and_evicts(tmp_path):
+    cache = CompletionCache(SQLiteBackend(str(tmp_path / 'cache.sqlite')), max_entries=3)
+    for i in range(5):
+        cache.put('model', f'prompt {i}', f'response {i}')
+    assert cache.stats()['entries'] == 3
+    assert cache.get('model', 'prompt 0') is None
+    assert cache.get('model', 'prompt 4') == 'response 4'
+    # The parameters are part of the key
+    assert cache.get('model', 'prompt 4', {'temperature': 0.5}) is None
+
+    calls = []
+
+    def complete(model, prompt):
+        calls.append(prompt)
+        return f'fresh {prompt}'
+
+    assert cache.get_or_complete('model', 'prompt 4', complete) == ('response 4', True)
+    assert cache.get_or_complete('model', 'prompt 4', complete, bypass=True) == ('fresh prompt 4', False)
+    assert cache.get('model', 'prompt 4') == 'fresh prompt 4'
+    assert calls == ['prompt 4']
+
+    expired = CompletionCache(SQLiteBackend(str(tmp_path / 'cache.sqlite')), ttl=-1)
+    assert expired.get('model', 'prompt 4') is None
+    expired.clear()
+    assert expired.stats()['entries'] == 0
+
+
+def test_completion_cache_evicts_by_size(tmp_path):
+    cache = CompletionCache(SQLiteBackend(str(tmp_path / 'cache.sqlite')), max_bytes=250)
+    for i in range(5):
+        cache.put('model', f'prompt {i}', str(i) * 100)
+    assert cache.stats() == {'entries': 2, 'bytes': 200, 'hits': 0, 'misses': 0}
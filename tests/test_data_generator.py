@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.data_generator import QBRDataGenerator
+from src.schema import QBR_COLUMNS, QBR_SCHEMA, arrow_schema
+from src.spec import QBR_COPULA, QBR_SPEC, load_correlation
+
+CONTROL_NAMES = [override['company_name'] for override in QBR_SPEC['overrides']]
+
+
+def test_row_engine_output():
+    df = QBRDataGenerator(num_records=300, seed=1).generate_data()
+    assert len(df) == 300 + len(CONTROL_NAMES)
+    assert list(df.columns) == QBR_COLUMNS
+    assert df['company_id'].is_unique
+    assert df['company_name'].tail(len(CONTROL_NAMES)).tolist() == CONTROL_NAMES
+    assert all(df[column].dtype == dtype for column, dtype in QBR_SCHEMA.items())
+
+
+def test_vectorized_output_matches_the_schema():
+    df = QBRDataGenerator(num_records=300, seed=1, block_size=128).generate_data_vectorized()
+    assert len(df) == 300 + len(CONTROL_NAMES)
+    assert list(df.columns) == QBR_COLUMNS
+    assert df['company_id'].is_unique
+    assert df['company_name'].is_unique
+    assert all(df[column].dtype == dtype for column, dtype in QBR_SCHEMA.items())
+
+
+def test_vectorized_output_depends_on_the_seed():
+    first = QBRDataGenerator(num_records=500, seed=1).generate_data_vectorized()
+    assert first.equals(QBRDataGenerator(num_records=500, seed=1).generate_data_vectorized())
+    assert not first.equals(QBRDataGenerator(num_records=500, seed=2).generate_data_vectorized())
+
+
+def test_vectorized_output_is_identical_for_any_worker_count_or_batch_size():
+    generator = QBRDataGenerator(num_records=2500, seed=5, block_size=1000)
+    expected = generator.generate_data_vectorized()
+    assert generator.generate_data_vectorized(workers=2).equals(expected)
+    for batch_size in (300, 1000, 4000):
+        batches = list(generator.iter_batches(batch_size=batch_size))
+        assert all(len(batch) <= batch_size for batch in batches)
+        assert pd.concat(batches, ignore_index=True).equals(expected)
+    assert pd.concat(generator.iter_batches(batch_size=700, workers=2), ignore_index=True).equals(expected)
+
+
+@pytest.mark.parametrize('batch_size', [700, 1000, 3000])
+def test_arrow_batches_match_dataframe_batches(batch_size):
+    # 700 rows per batch do not divide 1000-row blocks, so batches span two blocks
+    generator = QBRDataGenerator(num_records=2500, seed=1, block_size=1000)
+    batches = list(generator.iter_batches(batch_size=batch_size, arrow=True))
+    assert all(isinstance(batch, pa.RecordBatch) for batch in batches)
+    assert all(batch.num_rows <= batch_size for batch in batches)
+    table = pa.Table.from_batches(batches)
+    assert table.schema.equals(arrow_schema())
+    expected = pd.concat(generator.iter_batches(batch_size=batch_size), ignore_index=True)
+    assert table.equals(pa.Table.from_pandas(expected, preserve_index=False))
+
+
+def spearman(df, a, b):
+    return df[a].rank().corr(df[b].rank())
+
+
+def test_correlated_metrics_follow_the_copula():
+    independent = QBRDataGenerator(num_records=20000, seed=1).generate_data_vectorized()
+    correlated = QBRDataGenerator(num_records=20000, seed=1, correlated=True).generate_data_vectorized()
+    assert abs(spearman(independent, 'renewal_probability', 'csat_score')) < 0.05
+    assert spearman(correlated, 'renewal_probability', 'csat_score') > 0.4
+    assert spearman(correlated, 'sla_compliance_rate', 'avg_resolution_time_hours') < -0.4
+    # The copula changes the joint distribution, not the columns' ranges
+    for column in QBR_COPULA['columns']:
+        assert correlated[column].min() >= independent[column].min()
+        assert correlated[column].max() <= independent[column].max()
+    # At Risk accounts renew less often
+    by_stage = correlated.groupby('deal_stage', observed=True)['renewal_probability'].mean()
+    assert by_stage['At Risk'] < by_stage['Stable']
+
+
+def test_custom_correlation_matrix(tmp_path):
+    identity = np.eye(len(QBR_COPULA['columns']))
+    path = tmp_path / 'correlation.json'
+    path.write_text(json.dumps(identity.tolist()))
+    np.savetxt(tmp_path / 'correlation.csv', identity, delimiter=',')
+    assert np.array_equal(load_correlation(str(path)), identity)
+    assert np.array_equal(load_correlation(str(tmp_path / 'correlation.csv')), identity)
+
+    df = QBRDataGenerator(num_records=20000, seed=1, correlation=load_correlation(str(path))).generate_data_vectorized()
+    # Only the deal stage and size shifts couple the columns
+    assert abs(spearman(df, 'sla_compliance_rate', 'avg_resolution_time_hours')) < 0.2
+
+
+@pytest.mark.parametrize('correlation, message', [
+    (np.eye(3), 'must be 6 x 6'),
+    (np.eye(6) + np.triu(np.full((6, 6), 0.1), 1), 'symmetric'),
+    (np.eye(6) * 2, 'unit diagonal'),
+    (np.full((6, 6), -0.5) + np.eye(6) * 1.5, 'positive definite')
+])
+def test_invalid_correlation_matrices(correlation, message):
+    with pytest.raises(ValueError, match=message):
+        QBRDataGenerator(num_records=10, correlation=correlation)
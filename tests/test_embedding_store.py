@@ -0,0 +1,132 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.embedding_store import EmbeddingStore
+from src.vector_index import normalize
+
+DIM = 32
+
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def exact_top(vectors, query, k):
+    scores = normalize(vectors) @ normalize(query)
+    return [f'id{i}' for i in np.argsort(-scores)[:k]]
+
+
+@pytest.mark.parametrize('quantization', ['none', 'int8', 'pq'])
+def test_search_finds_the_exact_neighbours(tmp_path, quantization):
+    vectors = random_vectors(1000)
+    store = EmbeddingStore(str(tmp_path / 'store'), dim=DIM, quantization=quantization, pq_subvectors=8)
+    store.append([f'id{i}' for i in range(1000)], vectors)
+    assert len(store) == 1000
+    recall = []
+    for i in range(20):
+        results = store.search(vectors[i], k=10)
+        assert results[0] == (f'id{i}', pytest.approx(1.0, abs=1e-5))
+        recall.append(len({id_ for id_, _ in results} & set(exact_top(vectors, vectors[i], 10))) / 10)
+    # Re-ranking against the full vectors recovers most of what the codes miss
+    assert np.mean(recall) >= (1.0 if quantization == 'none' else 0.8)
+
+
+def test_store_reopens_with_its_rows_and_settings(tmp_path):
+    path = str(tmp_path / 'store')
+    vectors = random_vectors(300)
+    store = EmbeddingStore(path, dim=DIM, quantization='pq', pq_subvectors=8)
+    store.append([f'id{i}' for i in range(200)], vectors[:200])
+    store.append([f'id{i}' for i in range(200, 300)], vectors[200:])
+
+    reopened = EmbeddingStore(path, quantization='int8')
+    assert (reopened.dim, reopened.quantization, len(reopened)) == (DIM, 'pq', 300)
+    np.testing.assert_allclose(reopened.vector('id250'), normalize(vectors[250]), rtol=1e-6)
+    assert reopened.search(vectors[250], k=1)[0][0] == 'id250'
+
+
+def test_appending_an_id_again_supersedes_its_row(tmp_path):
+    path = str(tmp_path / 'store')
+    vectors = random_vectors(100)
+    store = EmbeddingStore(path, dim=DIM)
+    store.append([f'id{i}' for i in range(100)], vectors)
+    # id7 moves to where id8 is, and an id repeated within one append keeps its last row
+    store.append(['id7', 'new', 'new'], np.stack([vectors[8], *random_vectors(2, seed=1)]))
+    assert len(store) == 101
+    for reopened in (store, EmbeddingStore(path)):
+        assert [id_ for id_, _ in reopened.search(vectors[7], k=100)].count('id7') <= 1
+        assert reopened.search(vectors[8], k=2)[1][1] == pytest.approx(1.0, abs=1e-5)
+        assert {id_ for id_, _ in reopened.search(vectors[8], k=2)} == {'id7', 'id8'}
+        first, last = random_vectors(2, seed=1)
+        assert reopened.search(last, k=1)[0] == ('new', pytest.approx(1.0, abs=1e-5))
+        assert reopened.search(first, k=1)[0][1] < 0.99
+
+
+def test_remove_and_exclude(tmp_path):
+    vectors = random_vectors(100)
+    store = EmbeddingStore(str(tmp_path / 'store'), dim=DIM)
+    store.append([f'id{i}' for i in range(100)], vectors)
+    store.remove(['id3', 'unknown'])
+    assert len(store) == 99
+    assert 'id3' not in [id_ for id_, _ in store.search(vectors[3], k=99)]
+    assert store.search(vectors[4], k=1, exclude=['id4'])[0][0] != 'id4'
+    assert len(store.search(vectors[4], k=200)) == 99
+
+
+def test_removed_ids_stay_removed_after_reopening(tmp_path):
+    path = str(tmp_path / 'store')
+    vectors = random_vectors(100)
+    store = EmbeddingStore(path, dim=DIM)
+    store.append([f'id{i}' for i in range(100)], vectors)
+    store.append(['id7'], vectors[8:9])
+    store.remove(['id3'])
+
+    reopened = EmbeddingStore(path)
+    assert len(reopened) == 99
+    assert 'id3' not in reopened.positions
+    assert len(reopened.positions) == 99
+    with pytest.raises(KeyError):
+        reopened.vector('id3')
+    # The superseded row of id7 is dead too; its id maps to the appended row
+    assert reopened.positions['id7'] == 100
+    np.testing.assert_allclose(reopened.vector('id7'), normalize(vectors[8]), rtol=1e-6)
+
+    # Removing it again records nothing new
+    reopened.remove(['id3'])
+    assert len(EmbeddingStore(path).superseded) == 2
+    assert len(EmbeddingStore(path)) == 99
+
+    reopened.append(['id3'], vectors[3:4])
+    again = EmbeddingStore(path)
+    assert (len(again), again.positions['id3']) == (100, 101)
+    assert again.search(vectors[3], k=1)[0][0] == 'id3'
+
+
+def test_interrupted_append_is_discarded(tmp_path):
+    path = str(tmp_path / 'store')
+    vectors = random_vectors(60)
+    store = EmbeddingStore(path, dim=DIM)
+    store.append([f'id{i}' for i in range(50)], vectors[:50])
+    # A crash after the data files were written but before meta.json was updated
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    store.append([f'lost{i}' for i in range(5)], vectors[50:55])
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    store = EmbeddingStore(path)
+    assert len(store) == 50
+    store.append([f'id{i}' for i in range(50, 60)], vectors[50:])
+    assert len(store) == 60
+    assert os.path.getsize(os.path.join(path, 'vectors.f32')) == 60 * DIM * 4
+    assert store.id_at(55) == 'id55'
+    assert store.search(vectors[55], k=1)[0][0] == 'id55'
+
+
+def test_invalid_settings(tmp_path):
+    with pytest.raises(ValueError, match='quantization'):
+        EmbeddingStore(str(tmp_path / 'a'), dim=DIM, quantization='int4')
+    with pytest.raises(ValueError, match='divisible'):
+        EmbeddingStore(str(tmp_path / 'b'), dim=DIM, quantization='pq', pq_subvectors=5)
@@ -0,0 +1,100 @@
+import pytest
+
+from src.documents import HashingEmbedder
+from src.hybrid_search import HybridSearch, LRUCache, reciprocal_rank_fusion
+from src.search_index import CompanySearchIndex
+from src.vector_index import build_index
+
+NAMES = ['Highland Forge Systems', 'Acme Corp', 'Northwind Traders', 'Island Analytics', 'Kohlleffel Inc']
+DOCUMENTS = [
+    'Healthcare account at risk. Support tickets doubled and csat dropped.',
+    'Retail account, stable renewal with strong feature adoption.',
+    'Healthcare account, live deployment, champion engaged at the c-level.',
+    'Technology account at risk after a compliance review.',
+    'Technology account, stable, expanding into a second region.'
+]
+INDUSTRIES = ['Healthcare', 'Retail', 'Healthcare', 'Technology', 'Technology']
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__(dim=64)
+        self.calls = 0
+
+    def __call__(self, documents):
+        self.calls += 1
+        return super().__call__(documents)
+
+
+def hybrid(embed=None, cache_size=256):
+    embed = embed or CountingEmbedder()
+    index = build_index(NAMES, HashingEmbedder(64)(DOCUMENTS), {'INDUSTRY': INDUSTRIES}, dim=64)
+    return HybridSearch(CompanySearchIndex(NAMES, DOCUMENTS), index, embed, cache_size=cache_size)
+
+
+def test_reciprocal_rank_fusion():
+    scores = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'a'], ['b']], rank_constant=1)
+    assert scores == pytest.approx({'a': 1 / 2 + 1 / 3, 'b': 1 / 3 + 1 / 2 + 1 / 2, 'c': 1 / 4})
+    assert max(scores, key=scores.get) == 'b'
+    assert reciprocal_rank_fusion([]) == {}
+
+
+def test_lru_cache_evicts_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert (cache.get('b'), cache.get('a'), cache.get('c')) == (None, 1, 3)
+    assert (cache.hits, cache.misses, len(cache)) == (3, 1, 2)
+    disabled = LRUCache(maxsize=0)
+    disabled.put('a', 1)
+    assert disabled.get('a') is None
+
+
+def test_results_found_by_several_retrievers_rank_first():
+    results = hybrid().search('retail renewal adoption', k=3)
+    name, score, sources = results[0]
+    assert name == 'Acme Corp'
+    assert sources == ['content', 'vector']
+    assert [score for _, score, _ in results] == sorted((score for _, score, _ in results), reverse=True)
+
+
+def test_misspelled_names_are_found():
+    assert hybrid().search('kohleffel', k=1)[0][0] == 'Kohlleffel Inc'
+
+
+def test_filters_apply_to_every_retriever():
+    results = hybrid().search('account at risk', k=5, filters={'INDUSTRY': ['Healthcare']})
+    assert results
+    assert {name for name, _, _ in results} <= {'Highland Forge Systems', 'Northwind Traders'}
+    results = hybrid().search('acme', filters={'INDUSTRY': ['Healthcare']})
+    assert 'Acme Corp' not in [name for name, _, _ in results]
+
+
+def test_queries_and_results_are_cached():
+    embed = CountingEmbedder()
+    search = hybrid(embed)
+    first = search.search('stable  renewal')
+    assert search.search(' Stable renewal') == first
+    assert embed.calls == 1
+    search.search('stable renewal', k=2)
+    # A new k is a new result list, but the query embedding is reused
+    assert embed.calls == 1
+    assert search.results.hits == 1
+
+
+@pytest.mark.parametrize('query', ['', '   '])
+def test_blank_queries_return_nothing(query):
+    embed = CountingEmbedder()
+    assert hybrid(embed).search(query) == []
+    assert embed.calls == 0
+
+
+def test_embedding_errors_fall_back_to_lexical_results():
+    def failing(texts):
+        raise RuntimeError('EMBED_TEXT_768 is not available')
+
+    results = hybrid(failing).search('northwind')
+    assert results[0][0] == 'Northwind Traders'
+    assert all('vector' not in sources for _, _, sources in results)
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from src.instrumentation import _NULL_SPAN, Instrumentation, JSONLinesExporter, PrometheusExporter
+
+
+def test_disabled_instrumentation_records_nothing():
+    instrumentation = Instrumentation()
+    assert instrumentation.span('generator.dates') is _NULL_SPAN
+    with instrumentation.span('generator.dates'):
+        instrumentation.count('generator.rows', 10)
+    assert instrumentation.sample_memory('peak') is None
+    assert (instrumentation.summary(), instrumentation.counters) == ([], {})
+
+
+def test_spans_counters_and_nesting(tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    instrumentation = Instrumentation().enable(JSONLinesExporter(str(path)))
+
+    @instrumentation.timed('writer.csv')
+    def write():
+        """Write a batch"""
+        with instrumentation.span('writer.batch', format='csv'):
+            instrumentation.count('writer.rows', 5)
+
+    write()
+    write()
+    with pytest.raises(ValueError):
+        with instrumentation.span('writer.csv'):
+            raise ValueError('disk full')
+    instrumentation.observe('app.first_token', 0.25)
+    instrumentation.disable()
+
+    assert write.__doc__ == 'Write a batch'
+    summary = {stats['name']: stats for stats in instrumentation.summary()}
+    assert (summary['writer.csv']['count'], summary['writer.csv']['errors']) == (3, 1)
+    assert summary['writer.batch']['count'] == 2
+    assert summary['app.first_token']['total_seconds'] == 0.25
+    assert instrumentation.counters == {'writer.rows': 10}
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    spans = [event for event in events if event['type'] == 'span']
+    assert [event['name'] for event in spans][:2] == ['writer.batch', 'writer.csv']
+    assert spans[0]['parent'] == 'writer.csv' and spans[0]['format'] == 'csv'
+    assert [event['total'] for event in events if event['type'] == 'counter'] == [5, 10]
+
+    instrumentation.reset()
+    assert instrumentation.summary() == []
+
+
+def test_prometheus_rendering(tmp_path):
+    exporter = PrometheusExporter(namespace='qbr')
+    instrumentation = Instrumentation().enable(exporter)
+    with instrumentation.span('generator.names'):
+        pass
+    instrumentation.count('writer.rows', 3)
+    instrumentation.count('writer.rows', 4)
+    instrumentation.sample_memory('after_write')
+
+    text = exporter.render()
+    assert 'qbr_span_seconds_count{span="generator.names"} 1' in text
+    assert 'qbr_writer_rows_total 7' in text
+    assert 'qbr_peak_rss_megabytes{sample="after_write"}' in text
+    path = tmp_path / 'qbr.prom'
+    exporter.write(str(path))
+    assert path.read_text() == text
@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from src.lazy_dataset import LazyQBRDataset
+from src.schema import QBR_COLUMNS
+from src.spec import QBR_SPEC
+
+CONTROL_NAMES = [override['company_name'] for override in QBR_SPEC['overrides']]
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return LazyQBRDataset(3000, seed=3, block_size=1024)
+
+
+@pytest.fixture(scope='module')
+def full(dataset):
+    return dataset[:]
+
+
+def test_full_slice(dataset, full):
+    assert len(dataset) == len(full) == 3000 + len(CONTROL_NAMES)
+    assert list(full.columns) == QBR_COLUMNS
+    assert full['company_id'].tolist()[:2] == ['COMP0000', 'COMP0001']
+    assert full['company_id'].is_unique
+    assert full['company_name'].tail(len(CONTROL_NAMES)).tolist() == CONTROL_NAMES
+    # Contract dates walk forward across block boundaries
+    assert full['contract_start_date'].iloc[:3000].is_monotonic_increasing
+
+
+@pytest.mark.parametrize('key', [slice(1000, 1100), slice(1020, 2100), slice(2990, None), slice(-3, None), slice(0, 0)])
+def test_slices_match_the_full_dataset(dataset, full, key):
+    pd.testing.assert_frame_equal(dataset[key], full[key].reset_index(drop=True))
+
+
+def test_strided_slices_and_take(dataset, full):
+    pd.testing.assert_frame_equal(dataset[5:2000:97], full.iloc[5:2000:97].reset_index(drop=True))
+    indices = [2500, 3, 3, -1, 1024, 1023]
+    pd.testing.assert_frame_equal(dataset.take(indices), full.iloc[indices].reset_index(drop=True))
+    assert dataset.take([]).columns.tolist() == QBR_COLUMNS
+
+
+def test_single_records(dataset, full):
+    record = dataset[1500]
+    assert record == full.iloc[1500].to_dict()
+    assert dataset.get_company(record['company_id']) == record
+    assert dataset[-1]['company_name'] == CONTROL_NAMES[-1]
+    with pytest.raises(IndexError):
+        dataset[len(dataset)]
+    with pytest.raises(IndexError):
+        dataset.take([0, len(dataset)])
+
+
+def test_records_do_not_depend_on_what_else_is_generated():
+    # Only the seed fixes a record; the number of records and the slice asked for do not
+    small = LazyQBRDataset(2000, seed=3, block_size=1024)
+    large = LazyQBRDataset(1_000_000_000, seed=3, block_size=1024)
+    pd.testing.assert_frame_equal(small[100:1900], large[100:1900])
+    assert large[999_999_999]['company_id'] == 'COMP999999999'
+    assert not small[:100].equals(LazyQBRDataset(2000, seed=4, block_size=1024)[:100])
+
+
+def test_sample(dataset):
+    sample = dataset.sample(50, seed=1)
+    assert len(sample) == 50
+    assert sample['company_id'].is_unique
+    pd.testing.assert_frame_equal(sample, dataset.sample(50, seed=1))
+
+
+def test_block_size_must_align():
+    with pytest.raises(ValueError, match='multiple'):
+        LazyQBRDataset(100, block_size=1000)
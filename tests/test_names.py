@@ -0,0 +1,27 @@
+import numpy as np
+
+from src.names import INDUSTRY_NAME_CORES, CompanyNameEngine
+from src.schema import INDUSTRIES
+
+
+def test_scalar_names_match_vectorized_names():
+    engine = CompanyNameEngine(seed=7)
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, len(INDUSTRIES), 5000)
+    # Include indices past the name space, which get numbered variants
+    indices = rng.integers(0, 3 * engine.capacity, 5000)
+    names = engine.names(codes, indices)
+    assert [engine.name(INDUSTRIES[code], int(index)) for code, index in zip(codes, indices)] == names.tolist()
+
+
+def test_names_are_unique_and_unnumbered_at_millions_of_records():
+    engine = CompanyNameEngine()
+    count = 2000000
+    names = engine.names(np.arange(count) % len(INDUSTRIES), np.arange(count))
+    assert len(set(names.tolist())) == count
+    assert not np.strings.isdigit(np.strings.rpartition(names, ' ')[2]).any()
+
+
+def test_cores_do_not_repeat_across_industries():
+    cores = [core for industry in INDUSTRIES for core in INDUSTRY_NAME_CORES[industry]]
+    assert len(set(cores)) == len(cores)
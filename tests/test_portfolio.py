@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_generator import QBRDataGenerator
+from src.portfolio import AT_RISK_HEALTH_SCORE, PortfolioCube, fold
+
+
+@pytest.fixture(scope='module')
+def df():
+    # Enough records for the contract walk to span several fiscal years
+    return QBRDataGenerator(num_records=3000, seed=11, block_size=1000).generate_data_vectorized()
+
+
+def expected(df, by):
+    frame = df.assign(
+        at_risk=(df['deal_stage'] == 'At Risk') | (df['health_score'] < AT_RISK_HEALTH_SCORE),
+        qbr_quarter=df['qbr_quarter'].astype(str), industry=df['industry'].astype(str)
+    )
+    grouped = frame.groupby(by).agg(
+        accounts=('company_id', 'size'), at_risk_accounts=('at_risk', 'sum'),
+        avg_health_score=('health_score', 'mean'), total_contract_value=('contract_value', 'sum')
+    )
+    return grouped.sort_index()
+
+
+def check(result, expected_frame, by):
+    result = result.astype({dimension: str for dimension in by if dimension != 'qbr_year'}).set_index(by).sort_index()
+    assert result.index.tolist() == expected_frame.index.tolist()
+    assert result['accounts'].tolist() == expected_frame['accounts'].tolist()
+    assert result['at_risk_accounts'].tolist() == expected_frame['at_risk_accounts'].tolist()
+    np.testing.assert_allclose(result['avg_health_score'], expected_frame['avg_health_score'])
+    np.testing.assert_allclose(result['total_contract_value'], expected_frame['total_contract_value'])
+
+
+def test_query_matches_a_groupby(df):
+    cube = PortfolioCube.from_frame(df)
+    assert len(cube) == len(df)
+    for by in (['qbr_year'], ['industry', 'qbr_quarter']):
+        check(cube.query(by=by), expected(df, by), by)
+
+    total = cube.query()
+    assert total['accounts'].tolist() == [len(df)]
+    np.testing.assert_allclose(total['avg_health_score'], df['health_score'].mean())
+
+
+def test_filters_and_year_ranges(df):
+    cube = PortfolioCube.from_frame(df)
+    years = sorted(df['qbr_year'].unique())
+    assert len(years) >= 3
+    first, last = int(years[1]), int(years[-1])
+    selected = df[df['qbr_year'].between(first, last) & df['size'].isin(['Enterprise', 'Small'])]
+    check(cube.query({'qbr_year': (first, last), 'size': ['Enterprise', 'Small']}, by=['qbr_year']),
+          expected(selected, ['qbr_year']), ['qbr_year'])
+
+    listed = df[df['qbr_year'].isin([years[0], years[-1]]) & (df['qbr_quarter'] == 'Q2')]
+    check(cube.query({'qbr_year': [years[0], years[-1]], 'qbr_quarter': ['Q2']}, by=['industry']),
+          expected(listed, ['industry']), ['industry'])
+
+    assert cube.query({'industry': ['Not an industry']}).empty
+    assert cube.query({'qbr_year': (1900, 1901)}).empty
+
+
+def test_incremental_adds_and_removes(df):
+    whole = PortfolioCube.from_frame(df)
+    # Later years first, so the year axis grows at the front too
+    cube = PortfolioCube().add(df.iloc[2000:]).add(df.iloc[:1000]).add(df.iloc[1000:2000])
+    np.testing.assert_allclose(cube.cumulative, whole.cumulative)
+    cube.remove(df.iloc[1000:2000])
+    # The emptied years stay on the axis, so compare the non-empty cells
+    rest = PortfolioCube.from_frame(pd.concat([df.iloc[:1000], df.iloc[2000:]]))
+    pd.testing.assert_frame_equal(cube.aggregates(), rest.aggregates())
+
+
+def test_fold_builds_the_cube_while_passing_batches_through(df):
+    cube = PortfolioCube()
+    batches = [df.iloc[:1200], df.iloc[1200:]]
+    assert [len(batch) for batch in fold(batches, cube)] == [1200, len(df) - 1200]
+    np.testing.assert_allclose(cube.cells, PortfolioCube.from_frame(df).cells)
+
+
+def test_save_load_and_aggregates(tmp_path, df):
+    cube = PortfolioCube.from_frame(df)
+    path = str(tmp_path / 'cube.parquet')
+    cube.save(path)
+    loaded = PortfolioCube.load(path)
+    np.testing.assert_allclose(loaded.cells, cube.cells)
+    assert loaded.years.tolist() == cube.years.tolist()
+    # The warehouse returns the same cells with upper-case columns
+    aggregates = cube.aggregates()
+    assert aggregates['ACCOUNTS'].sum() == len(df)
+    np.testing.assert_allclose(PortfolioCube.from_aggregates(aggregates).cells, cube.cells)
+    # So do QBR_DATA rows
+    np.testing.assert_allclose(PortfolioCube.from_frame(df.rename(columns=str.upper)).cells, cube.cells)
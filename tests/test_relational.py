@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_generator import QBRDataGenerator
+from src.relational import (
+    MEDDICC_MILESTONES, RelationalQBRGenerator, aggregate_qbr_data, fiscal_quarter_window
+)
+from src.schema import QBR_COLUMNS
+from src.validation import validate
+
+
+@pytest.fixture(scope='module')
+def generator():
+    return QBRDataGenerator(num_records=1500, seed=2, block_size=512)
+
+
+@pytest.fixture(scope='module')
+def tables(generator):
+    return RelationalQBRGenerator(generator).generate_tables()
+
+
+def test_tables_are_linked_by_company_id(generator, tables):
+    flat = generator.generate_data_vectorized()
+    assert tables['accounts']['company_id'].tolist() == flat['company_id'].tolist()
+    assert tables['contracts']['company_id'].is_unique
+    known = set(tables['accounts']['company_id'])
+    for name, key in [('support_tickets', 'ticket_id'), ('feature_requests', 'issue_id'), ('meddicc_events', 'event_id')]:
+        assert set(tables[name]['company_id']) <= known
+        assert tables[name][key].is_unique
+
+
+def test_events_fall_in_the_qbr_quarter(tables):
+    contracts = tables['contracts'].set_index('company_id')
+    tickets = tables['support_tickets']
+    start, days = fiscal_quarter_window(
+        contracts['qbr_year'].to_numpy(), contracts['qbr_quarter'].cat.codes.to_numpy()
+    )
+    window = pd.DataFrame({'start': start, 'end': start + days}, index=contracts.index).loc[tickets['company_id']]
+    created = tickets['created_at'].to_numpy().astype('datetime64[D]')
+    assert (created >= window['start'].to_numpy()).all() and (created < window['end'].to_numpy()).all()
+    assert (tickets['resolved_at'] > tickets['created_at']).all()
+
+
+def test_aggregation_rebuilds_the_flat_table(generator, tables):
+    flat = aggregate_qbr_data(tables)
+    generated = generator.generate_data_vectorized()
+    assert sorted(flat.columns) == sorted(QBR_COLUMNS)
+    # Milestones and meetings are one event each, so they come back exactly
+    for column in [*MEDDICC_MILESTONES, 'champion_engagement_score', 'deal_stage', 'contract_value']:
+        assert flat[column].tolist() == generated[column].tolist(), column
+    tickets = tables['support_tickets'].groupby('company_id').size()
+    assert flat['ticket_volume'].tolist() == tickets.reindex(flat['company_id']).tolist()
+    # Rates and scores are re-derived from the events, and still pass the validation rules
+    report = validate(flat[QBR_COLUMNS])
+    assert report.ok, report.summary()
+
+
+def test_tables_are_reproducible(generator, tables):
+    again = RelationalQBRGenerator(QBRDataGenerator(num_records=1500, seed=2, block_size=512)).generate_tables()
+    for name, frame in tables.items():
+        pd.testing.assert_frame_equal(again[name], frame)
+
+
+def test_fiscal_quarter_window():
+    start, days = fiscal_quarter_window(np.array([2024, 2024, 2024]), np.array([0, 3, 2]))
+    assert start.tolist() == [np.datetime64('2024-02-01'), np.datetime64('2024-11-01'), np.datetime64('2024-08-01')]
+    assert days.tolist() == [90, 92, 92]
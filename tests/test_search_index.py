@@ -0,0 +1,54 @@
+import pytest
+
+from src.search_index import BM25Index, CompanySearchIndex, TrigramIndex
+
+NAMES = ['Highland Forge Systems', 'Acme Corp', 'Northwind Traders', 'Island Analytics', 'Kohlleffel Inc']
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Higland', 'Highland Forge Systems'),
+    ('acmee', 'Acme Corp'),
+    ('Northwnd', 'Northwind Traders'),
+    ('kohleffel', 'Kohlleffel Inc'),
+    ('highland forg', 'Highland Forge Systems')
+])
+def test_partial_names_with_typos_are_found(query, expected):
+    results = TrigramIndex(NAMES).search(query)
+    assert NAMES[results[0][0]] == expected
+
+
+def test_verbatim_matches_rank_first():
+    index = TrigramIndex(['Forge Works', 'Highland Forge Systems', 'Forgeworks Labs'])
+    results = index.search('forge')
+    assert all(score > 1 for _, score in results)
+    # Among names containing the query, the one closest to it as a whole comes first
+    assert results[0][0] == 0
+
+
+@pytest.mark.parametrize('query', ['', '   ', '\t'])
+def test_blank_queries_match_nothing(query):
+    assert TrigramIndex(NAMES).search(query) == []
+    assert CompanySearchIndex(NAMES, NAMES).search(query) == []
+
+
+def test_unrelated_queries_match_nothing():
+    assert TrigramIndex(NAMES).search('zzz') == []
+
+
+def test_bm25_ranks_documents_by_their_words():
+    documents = [
+        'The company is at risk. Support tickets doubled.',
+        'Stable renewal with strong adoption.',
+        'Tickets, tickets and more tickets: support is at risk.'
+    ]
+    results = BM25Index(documents).search('support tickets')
+    assert [i for i, _ in results] == [2, 0]
+
+
+def test_company_search_puts_name_matches_before_documents():
+    names = ['Acme Corp', 'Northwind Traders']
+    documents = ['Acme renewed early.', 'Northwind mentioned Acme as a competitor.']
+    assert CompanySearchIndex(names, documents).search('acme', k=2) == [
+        ('Acme Corp', documents[0], 'name'),
+        ('Northwind Traders', documents[1], 'content')
+    ]
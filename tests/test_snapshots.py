@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_generator import QBRDataGenerator
+from src.snapshots import QBRSnapshotGenerator
+from src.spec import calculate_health_score
+from src.validation import RULES, validate
+
+
+@pytest.fixture
+def snapshots():
+    return QBRSnapshotGenerator.from_generator(QBRDataGenerator(num_records=2000, seed=6), activity_rate=0.3)
+
+
+def test_quarters_advance_and_only_active_accounts_change(snapshots):
+    before = snapshots.accounts.copy()
+    delta = snapshots.append_quarter()
+    after = snapshots.accounts
+    assert 0.25 < len(delta) / len(after) < 0.35
+    assert set(delta['company_id']) <= set(after['company_id'])
+
+    # Every account moves on one fiscal quarter, Q4 rolling over into the next year
+    codes = before['qbr_quarter'].cat.codes.to_numpy()
+    assert (after['qbr_quarter'].cat.codes.to_numpy() == (codes + 1) % 4).all()
+    assert (after['qbr_year'].to_numpy() == before['qbr_year'].to_numpy() + (codes == 3)).all()
+
+    unchanged = ~after['company_id'].isin(delta['company_id']).to_numpy()
+    for column in ['deal_stage', 'renewal_probability', 'csat_score', 'health_score']:
+        assert after[column][unchanged].equals(before[column][unchanged])
+    # The delta rows are the accounts' new state, with the health score re-derived
+    pd.testing.assert_frame_equal(delta, after[~unchanged].reset_index(drop=True))
+    np.testing.assert_allclose(delta['health_score'], calculate_health_score(
+        delta['renewal_probability'].to_numpy(), delta['feature_adoption_rate'].to_numpy(),
+        delta['sla_compliance_rate'].to_numpy(), delta['csat_score'].to_numpy()
+    ))
+
+
+def test_history_stays_within_the_rules(snapshots):
+    history = list(snapshots.iter_history(4))
+    assert len(history) == 5
+    assert len(history[0]) == len(snapshots.accounts)
+    rules = [rule for rule in RULES if rule.name not in ('fiscal_period', 'company_id_unique')]
+    for delta in history[1:]:
+        report = validate(delta, rules)
+        assert report.ok, report.summary()
+
+
+def test_saved_state_continues_where_it_stopped(tmp_path, snapshots):
+    snapshots.append_quarter()
+    snapshots.save(str(tmp_path))
+    expected = snapshots.append_quarter()
+
+    restored = QBRSnapshotGenerator.load(str(tmp_path))
+    assert (restored.seed, restored.quarter_index, restored.activity_rate) == (6, 1, 0.3)
+    pd.testing.assert_frame_equal(restored.append_quarter(), expected)
+    pd.testing.assert_frame_equal(restored.accounts, snapshots.accounts)
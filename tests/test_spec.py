@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.lazy_dataset import LazyQBRDataset
+from src.spec import QBR_PLAN, QBR_SPEC, SamplingPlan
+from src.validation import RULES, Validator, formula_rule, spec_members, spec_ranges
+
+
+def formula_spec(formula):
+    return {'sections': {'metrics': {
+        'a': {'integers': [1, 10]},
+        'b': {'uniform': [0, 1], 'round': 2},
+        'c': {'formula': formula}
+    }}}
+
+
+@pytest.mark.parametrize('formula', ['a * 0.3 + b', 'np.minimum(a, 5) - (b > 0.5)', 'np.where(a > 5, b, 0) ** 2'])
+def test_formulas_of_arithmetic_comparisons_and_numpy_calls(formula):
+    plan = SamplingPlan(formula_spec(formula))
+    columns = plan.sample(np.random.default_rng(0), np.arange(100))
+    assert columns['c'].shape == (100,)
+    record = plan.fill_row(random.Random(0), 0, {})
+    assert np.isscalar(record['c']) or np.ndim(record['c']) == 0
+
+
+@pytest.mark.parametrize('formula', [
+    "__import__('os').system('true')",
+    'a.__class__',
+    'np.load(a)',
+    'np.minimum(a, b, out=a)',
+    "np.sys.modules",
+    'np',
+    'a[0]',
+    "'x' * 3",
+    '(lambda: 1)()',
+    '[a for a in b]'
+])
+def test_formulas_reject_anything_else(formula):
+    with pytest.raises(ValueError):
+        SamplingPlan(formula_spec(formula))
+
+
+def test_validation_rules_follow_the_spec():
+    ranges = spec_ranges(QBR_PLAN)
+    assert ranges['renewal_probability'] == tuple(QBR_SPEC['sections']['deal']['renewal_probability']['integers'])
+    # The default and the control records widen the generated ranges
+    assert ranges['estimated_roi_value'] == (0, 500000)
+    assert ranges['contract_value'] == (10000, 190000)
+    assert {rule.name for rule in RULES} >= {'health_score_formula', 'deal_stage_values', 'qbr_quarter_values'}
+
+    # A changed spec changes the rules built from it
+    spec = {**QBR_SPEC, 'sections': {**QBR_SPEC['sections'], 'deal': {
+        **QBR_SPEC['sections']['deal'], 'renewal_probability': {'integers': [0, 50]}
+    }}}
+    plan = SamplingPlan(spec, QBR_PLAN._schema)
+    assert spec_ranges(plan)['renewal_probability'] == (0, 50)
+    assert spec_members(plan, {})['deal_stage'] == QBR_SPEC['sections']['deal']['deal_stage']['choice']
+
+
+def test_formula_rule_catches_wrong_values():
+    plan = SamplingPlan(formula_spec('a * 2 + b'))
+    columns = plan.sample(np.random.default_rng(0), np.arange(10))
+    columns['c'] = columns['c'].copy()
+    columns['c'][3] += 1
+    rule = formula_rule(plan.samplers['c'], plan)
+    assert np.flatnonzero(~rule.check(pd.DataFrame(columns))).tolist() == [3]
+
+
+def test_lazy_dataset_passes_the_spec_rules():
+    dataset = LazyQBRDataset(5000, seed=3, block_size=1024)
+    report = Validator().update(dataset[:]).report()
+    assert report.ok, report.summary()
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_generator import QBRDataGenerator
+from src.schema import arrow_schema
+from src.validation import RULES, UniqueRule, Validator, read_batches, rules_for, validate
+from src.writers import write_batches
+
+CONTROL_RECORDS = 5
+
+
+@pytest.fixture(scope='module')
+def df():
+    return QBRDataGenerator(num_records=2000, seed=9, block_size=512).generate_data_vectorized()
+
+
+def test_generated_data_passes_every_rule(df):
+    report = validate(df)
+    assert report.rows == len(df)
+    assert report.ok
+
+
+def test_only_the_control_records_are_exempt_from_the_fiscal_period(df):
+    # The control records are labelled Q4 but start in February, as the spec's overrides fix them
+    controls = df.iloc[-CONTROL_RECORDS:].reset_index(drop=True)
+    assert validate(controls).ok
+    report = validate(controls.assign(qbr_year=2025))
+    assert [rule.name for rule in report.failed()] == ['fiscal_period']
+    assert report.violations['fiscal_period'] == CONTROL_RECORDS
+
+
+def test_broken_rows_are_counted_and_sampled(df):
+    broken = df.copy()
+    broken['renewal_probability'] = broken['renewal_probability'].astype('int64')
+    broken.loc[[3, 10], 'renewal_probability'] = 150
+    broken['company_id'] = broken['company_id'].astype(object)
+    broken.loc[7, 'company_id'] = 'ACME7'
+    broken['contract_expiration_date'] = broken['contract_expiration_date'].astype('datetime64[s]')
+    broken.loc[12, 'contract_expiration_date'] += pd.Timedelta(days=1)
+    report = Validator(sample_size=1).update(broken).report()
+    assert report.violations['renewal_probability_range'] == 2
+    assert report.samples['renewal_probability_range'] == [{'row': 3, 'renewal_probability': 150}]
+    assert report.violations['company_id_format'] == 1
+    assert report.violations['contract_term'] == 1
+    # The health score no longer matches the broken renewal probabilities
+    assert report.violations['health_score_formula'] == 2
+    summary = report.summary().set_index('rule')
+    assert summary.loc['contract_term', 'share'] == 1 / len(broken)
+
+
+def test_unique_rule_spans_batches(df):
+    batches = [df.iloc[:1000], df.iloc[1000:], df.iloc[[5, 1500]]]
+    validator = Validator([rule for rule in RULES if isinstance(rule, UniqueRule)])
+    assert sum(len(batch) for batch in validator.watch(batches)) == len(df) + 2
+    report = validator.report()
+    assert report.violations['company_id_unique'] == 2
+    assert report.samples['company_id_unique'] == [
+        {'row': len(df), 'first_row': 5},
+        {'row': len(df) + 1, 'first_row': 1500}
+    ]
+
+
+def test_unique_rule_duplicates():
+    hashes = np.array([7, 3, 7, 9, 3, 7], dtype=np.uint64)
+    rows, firsts = UniqueRule.duplicates(hashes, np.arange(6))
+    assert sorted(zip(rows.tolist(), firsts.tolist())) == [(2, 0), (4, 1), (5, 0)]
+
+
+def test_rules_for_a_subset_of_columns(df):
+    rules = rules_for(['COMPANY_ID', 'QBR_QUARTER', 'RENEWAL_PROBABILITY'])
+    assert {rule.name for rule in rules} == {
+        'company_id_format', 'company_id_unique', 'qbr_quarter_values', 'renewal_probability_range'
+    }
+    # Upper-case warehouse columns are checked like generated ones
+    subset = df[['company_id', 'qbr_quarter', 'renewal_probability']].rename(columns=str.upper)
+    assert validate(subset, rules).ok
+
+
+@pytest.mark.parametrize('format', ['csv', 'parquet'])
+def test_read_batches(tmp_path, df, format):
+    path = str(tmp_path / f'qbr.{format}')
+    options = {} if format == 'csv' else {'schema': arrow_schema(), 'row_group_size': 300}
+    write_batches([df], path, format, **options)
+    batches = list(read_batches(path, batch_size=700))
+    # Parquet batches are whole row groups combined up to at least batch_size rows
+    assert all(700 <= len(batch) < 1000 for batch in batches[:-1])
+    assert sum(len(batch) for batch in batches) == len(df)
+    report = validate(iter(batches))
+    assert report.ok
+
+    columns = list(read_batches(path, batch_size=700, columns=['company_id', 'qbr_year']))[0].columns
+    assert sorted(columns) == ['company_id', 'qbr_year']
+
+
+def test_read_batches_partitioned(tmp_path, df):
+    path = str(tmp_path / 'qbr_parquet')
+    write_batches([df], path, 'parquet', partitioned=True, schema=arrow_schema())
+    report = validate(read_batches(path, batch_size=700))
+    assert report.rows == len(df)
+    assert report.ok
+    assert report.violations['company_id_unique'] == 0
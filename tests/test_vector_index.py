@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from src.vector_index import IVFIndex, VectorIndex, build_index, embedding_matrix
+
+
+def random_vectors(count, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+
+def trained_ivf(count=400, dim=16):
+    index = IVFIndex(dim, nlist=8, nprobe=8, min_train_size=count)
+    index.add([f'id{i}' for i in range(count)], random_vectors(count, dim))
+    assert index.centroids is not None
+    return index
+
+
+def test_exact_search_ranks_by_cosine_similarity():
+    vectors = random_vectors(100)
+    index = VectorIndex(16)
+    index.add([f'id{i}' for i in range(100)], vectors)
+    results = index.search(vectors[7], k=5)
+    assert results[0][0] == 'id7'
+    assert results[0][1] == pytest.approx(1.0)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_filters_exclude_and_upserts():
+    vectors = random_vectors(50)
+    industries = ['Finance' if i % 2 else 'Retail' for i in range(50)]
+    index = VectorIndex(16)
+    index.add([f'id{i}' for i in range(50)], vectors, {'INDUSTRY': industries})
+    results = index.search(vectors[3], k=10, filters={'INDUSTRY': 'Finance'}, exclude=['id3'])
+    assert results and all(int(id_[2:]) % 2 == 1 and id_ != 'id3' for id_, _ in results)
+
+    # Upserting an id replaces its vector and metadata instead of adding a row
+    index.add(['id3'], vectors[4:5], {'INDUSTRY': ['Retail']})
+    assert len(index) == 50
+    assert index.search(vectors[4], k=2, filters={'INDUSTRY': 'Retail'})[0][1] == pytest.approx(1.0)
+
+
+def test_ivf_add_files_an_id_given_twice_once():
+    index = trained_ivf()
+    vector = random_vectors(1, seed=1)[0]
+    index.add(['new', 'new'], np.stack([vector, vector]))
+    assert len(index) == 401
+    assert sum(len(rows) for rows in index.lists) == 401
+    results = index.search(vector, k=3)
+    assert [id_ for id_, _ in results].count('new') == 1
+
+
+def test_ivf_updates_move_rows_between_lists():
+    index = trained_ivf()
+    vector = random_vectors(1, seed=2)[0]
+    index.add(['id5', 'id5'], np.stack([vector, vector]))
+    assert sum(len(rows) for rows in index.lists) == 400
+    assert index.search(vector, k=1)[0][0] == 'id5'
+
+
+def test_ivf_matches_exact_search_with_every_list_probed():
+    vectors = random_vectors(400)
+    ivf = trained_ivf()
+    exact = build_index([f'id{i}' for i in range(400)], vectors, dim=16)
+    for query in random_vectors(5, seed=3):
+        assert [id_ for id_, _ in ivf.search(query, k=5)] == [id_ for id_, _ in exact.search(query, k=5)]
+
+
+def test_embedding_matrix_reads_json_and_bytes():
+    vectors = random_vectors(3, dim=4)
+    assert np.allclose(embedding_matrix([str(list(map(float, row))) for row in vectors]), vectors)
+    assert np.array_equal(embedding_matrix([row.tobytes() for row in vectors]), vectors)
@@ -0,0 +1,52 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.data_generator import QBRDataGenerator
+from src.portfolio import CUBE_QUERY, PortfolioCube
+from src.vector_index import embedding_matrix
+from src.warehouse import LocalWarehouse
+
+
+def test_local_warehouse_serves_the_loaded_data(tmp_path):
+    df = QBRDataGenerator(num_records=400, seed=8).generate_data_vectorized()
+    warehouse = LocalWarehouse(str(tmp_path / 'qbr.sqlite'))
+    assert warehouse.sync_marker() is None
+    warehouse.load(df)
+    assert warehouse.sync_marker() is not None
+
+    row = warehouse.query("SELECT * FROM QBR_DATA WHERE COMPANY_NAME = ?", ['Kohlleffel Inc'])
+    assert row['CONTRACT_VALUE'].tolist() == [150000]
+    assert row['CONTRACT_START_DATE'].tolist() == ['2024-02-01']
+
+    vectors = warehouse.query("SELECT COMPANY_NAME, QBR_EMBEDDINGS FROM QBR_DATA_VECTORS")
+    assert len(vectors) == len(df)
+    assert embedding_matrix(vectors['QBR_EMBEDDINGS']).shape == (len(df), 768)
+
+    # The cube aggregated in the warehouse matches the one built from the frame
+    cells = warehouse.query(CUBE_QUERY)
+    np.testing.assert_allclose(PortfolioCube.from_aggregates(cells).cells, PortfolioCube.from_frame(df).cells)
+
+
+def test_from_file_reloads_only_changed_files(tmp_path):
+    data_path = str(tmp_path / 'qbr.csv')
+    QBRDataGenerator(num_records=100, seed=8).generate_data_vectorized().to_csv(data_path, index=False)
+    marker = LocalWarehouse.from_file(data_path).sync_marker()
+    assert LocalWarehouse.from_file(data_path).sync_marker() == marker
+
+    QBRDataGenerator(num_records=50, seed=9).generate_data_vectorized().to_csv(data_path, index=False)
+    future = time.time() + 10
+    os.utime(data_path, (future, future))
+    warehouse = LocalWarehouse.from_file(data_path)
+    assert warehouse.sync_marker() != marker
+    assert warehouse.query("SELECT COUNT(*) AS N FROM QBR_DATA")['N'].tolist() == [55]
+
+
+def test_concurrent_writes_are_serialized(tmp_path):
+    warehouse = LocalWarehouse(str(tmp_path / 'qbr.sqlite'), pool_size=4)
+    warehouse.execute("CREATE TABLE T (N INTEGER)")
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda n: warehouse.execute("INSERT INTO T VALUES (?)", [n]), range(200)))
+    assert warehouse.query("SELECT SUM(N) AS S FROM T")['S'].tolist() == [sum(range(200))]
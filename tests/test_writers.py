@@ -0,0 +1,81 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from src.data_generator import QBRDataGenerator
+from src.schema import QBR_SCHEMA, apply_schema, arrow_schema
+from src.writers import output_path, write_batches
+
+
+@pytest.fixture(scope='module')
+def generator():
+    return QBRDataGenerator(num_records=3000, seed=4, block_size=1000)
+
+
+@pytest.fixture(scope='module')
+def expected(generator):
+    return generator.generate_data_vectorized()
+
+
+def test_csv_round_trip(tmp_path, generator, expected):
+    path = str(tmp_path / 'qbr.csv')
+    assert write_batches(generator.iter_batches(batch_size=700), path) == len(expected)
+    # 'None' is a competitive situation, not a missing value
+    df = apply_schema(pd.read_csv(path, keep_default_na=False, na_values=['']))
+    pd.testing.assert_frame_equal(df, expected)
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow', 'feather'])
+def test_arrow_formats_round_trip(tmp_path, generator, expected, format):
+    path = output_path(str(tmp_path), 'qbr', format)
+    assert path.endswith(f'qbr.{format}')
+    rows = write_batches(generator.iter_batches(batch_size=700), path, format, schema=arrow_schema(), row_group_size=500)
+    assert rows == len(expected)
+    if format == 'parquet':
+        table = pq.read_table(path)
+        # Parquet has no second-resolution timestamps, the dates come back in milliseconds
+        assert table.schema.names == arrow_schema().names
+    else:
+        table = pa.ipc.open_file(path).read_all()
+        assert table.schema.equals(arrow_schema())
+    pd.testing.assert_frame_equal(apply_schema(table.to_pandas()), expected)
+
+
+def test_parquet_row_groups(tmp_path, generator):
+    path = str(tmp_path / 'qbr.parquet')
+    write_batches(generator.iter_batches(batch_size=1000), path, 'parquet', schema=arrow_schema(), row_group_size=400)
+    metadata = pq.ParquetFile(path).metadata
+    assert max(metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)) <= 400
+
+
+@pytest.mark.parametrize('format', ['parquet', 'csv'])
+def test_partitioned_layout(tmp_path, generator, expected, format):
+    path = output_path(str(tmp_path), 'qbr', format, partitioned=True)
+    rows = write_batches(generator.iter_batches(batch_size=700), path, format, partitioned=True, schema=arrow_schema())
+    assert rows == len(expected)
+    years = sorted(os.listdir(path))
+    assert years == sorted(f'qbr_year={year}' for year in expected['qbr_year'].unique())
+    assert all(name.startswith('qbr_quarter=Q') for name in os.listdir(os.path.join(path, years[0])))
+
+    dataset = ds.dataset(path, format=format, partitioning='hive')
+    df = dataset.to_table().to_pandas()
+    assert len(df) == len(expected)
+    assert sorted(df['company_id']) == sorted(expected['company_id'])
+    counts = df.groupby(['qbr_year', 'qbr_quarter'], observed=True).size()
+    expected_counts = expected.groupby(['qbr_year', 'qbr_quarter'], observed=True).size()
+    assert counts.to_dict() == {(int(year), str(quarter)): count for (year, quarter), count in expected_counts.items()}
+
+
+def test_unknown_format(tmp_path, expected):
+    with pytest.raises(ValueError, match='Unknown output format'):
+        write_batches([expected], str(tmp_path / 'qbr.xlsx'), 'xlsx')
+
+
+def test_schema_keeps_the_dtypes(expected):
+    assert all(expected[column].dtype == dtype for column, dtype in QBR_SCHEMA.items())
+    table = pa.Table.from_pandas(expected, preserve_index=False).cast(arrow_schema())
+    assert pa.types.is_dictionary(table.schema.field('industry').type)